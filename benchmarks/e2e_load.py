@@ -0,0 +1,98 @@
+"""Сквозной нагрузочный тест: настоящий polling бота против фейкового Bot API.
+
+В процессе поднимается benchmarks.fake_api с задержкой, лимитами Telegram,
+случайными 429 и заблокировавшими бота админами. Бот получает обновления через
+getUpdates, пользователи отправляют анонимные обращения, каждое рассылается
+всем админам. Итог — время обработки, отправки в секунду и сколько рассылок
+дошло, было приторможено 429 или отбито 403.
+
+Запуск из корня репозитория:
+    python -m benchmarks.e2e_load --users 20 --latency 0.05 --rate-429 0.02 --blocked-admins 3
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.harness import ADMIN_POOL, Updates
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+import main
+from benchmarks.fake_api import FakeBotAPI
+from config import BROADCAST_BURST, roles
+from utils.broadcast import broadcast_bucket
+
+
+async def wait_sent(api: FakeBotAPI, target: int, idle: float) -> None:
+    """Ждет target успешных отправок или паузы в idle секунд без новых"""
+    last, last_change = len(api.sent), time.monotonic()
+    while len(api.sent) < target:
+        await asyncio.sleep(0.05)
+        if len(api.sent) != last:
+            last, last_change = len(api.sent), time.monotonic()
+        elif time.monotonic() - last_change > idle:
+            break
+
+
+def feed(api: FakeBotAPI, updates) -> None:
+    api.add_updates([update.model_dump(mode="json", by_alias=True, exclude_none=True) for update in updates])
+
+
+async def run(args) -> None:
+    blocked = set(ADMIN_POOL[:args.blocked_admins])
+    admin_ids = roles.snapshot.admins
+    api = FakeBotAPI(latency=args.latency, jitter=args.latency / 2, rate_429=args.rate_429,
+                     retry_after=args.retry_after, blocked=blocked, global_rate=args.global_rate, seed=1)
+    runner = await api.start()
+    # Лимит рассылки бота — как в проде, а не снятый для офлайн-бенчмарков
+    broadcast_bucket.reset(args.broadcast_rate, BROADCAST_BURST)
+
+    bot = Bot(token="0:e2e", session=AiohttpSession(api=TelegramAPIServer.from_base(api.url)))
+    dp = main.create_dispatcher()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+
+    updates = Updates()
+    users = [3_000_000 + i for i in range(args.users)]
+    started = time.perf_counter()
+    feed(api, [updates.message(user_id, "💬 Анонимное обращение") for user_id in users])
+    await wait_sent(api, len(users), args.idle)
+    feed(api, [updates.message(user_id, f"Обращение от нагрузочного теста {user_id}") for user_id in users])
+    # Подсказка и подтверждение каждому пользователю плюс рассылка незаблокированным админам
+    target = len(users) * (2 + len(admin_ids - blocked))
+    await wait_sent(api, target, args.idle)
+    elapsed = time.perf_counter() - started
+
+    await dp.stop_polling()
+    await polling
+    await runner.cleanup()
+
+    errors = api.errors
+    print(f"Пользователей: {len(users)}, админов: {len(admin_ids)} (заблокировали бота: {len(blocked)})")
+    print(f"Отправлено {len(api.sent)} из {target} за {elapsed:.2f} с ({len(api.sent) / elapsed:.1f} сообщений/с)")
+    print(f"429: {sum(count for key, count in errors.items() if key.endswith(':429'))}, "
+          f"403: {sum(count for key, count in errors.items() if key.endswith(':403'))}")
+    print(f"Запросы: {dict(api.requests)}")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="пользователей, отправляющих обращение")
+    parser.add_argument("--latency", type=float, default=0.03, help="задержка ответа Bot API, сек")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля случайных 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--blocked-admins", type=int, default=0, help="сколько админов заблокировали бота")
+    parser.add_argument("--global-rate", type=float, default=30.0, help="лимит фейкового API, сообщений/с")
+    parser.add_argument("--broadcast-rate", type=float, default=25.0, help="лимит рассылки бота, сообщений/с")
+    parser.add_argument("--idle", type=float, default=5.0, help="остановиться после стольких секунд без отправок")
+    args = parser.parse_args()
+
+    # Ошибки отправки (403, 429 без повтора) видны в итоговых счетчиках
+    logging.disable(logging.ERROR)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,273 @@
+"""Локальная замена Telegram Bot API для интеграционных и нагрузочных тестов.
+
+aiohttp-сервер отвечает на методы, которыми пользуется бот, по адресу
+/bot<token>/<method> — как api.telegram.org. Бот подключается к нему через
+TELEGRAM_API_URL=http://127.0.0.1:8082 в .env.
+
+Что можно настроить:
+    --latency, --jitter   задержка ответа и ее случайный разброс, сек
+    --rate-429            доля запросов, получающих 429 с retry_after
+    --retry-after         retry_after в таких ответах, сек
+    --blocked             chat_id, для которых отправка дает 403 «bot was blocked by the user»
+    --chat-rate           сообщений в секунду в один чат (сверх лимита — 429), 0 — без лимита
+    --global-rate         сообщений в секунду на весь бот, 0 — без лимита
+
+Обновления для getUpdates кладутся POST-запросом на /_control/updates (JSON-объект
+или список), счетчики запросов — GET /_control/stats.
+
+Запуск из корня репозитория:
+    python -m benchmarks.fake_api --port 8082 --latency 0.05 --rate-429 0.01 --blocked 123
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+from aiohttp import web
+
+from utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "Студсовет", "username": "fake_studsovet_bot"}
+
+# Методы отправки: что положить в ответное сообщение
+SEND_METHODS = {
+    "sendmessage": None,
+    "sendphoto": "photo",
+    "sendsticker": "sticker",
+    "sendvideo": "video",
+    "senddocument": "document",
+    "sendvoice": "voice",
+    "sendanimation": "animation",
+}
+
+
+class FakeBotAPI:
+    """Состояние фейкового Bot API: очередь обновлений, счетчики сообщений, лимиты и сбои"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_429: float = 0.0,
+                 retry_after: int = 1, blocked: Optional[Set[int]] = None,
+                 chat_rate: float = 1.0, chat_burst: float = 3.0, global_rate: float = 30.0,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.blocked = set(blocked or ())
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate) if global_rate else None
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self.random = random.Random(seed)
+
+        self._updates: List[Dict] = []
+        self._update_ids = itertools.count(1)
+        self._updates_added = asyncio.Event()
+        self._message_ids: Dict[int, itertools.count] = defaultdict(lambda: itertools.count(1))
+
+        self.requests: Counter = Counter()
+        self.errors: Counter = Counter()
+        # Все успешно отправленные сообщения: (метод, chat_id, время)
+        self.sent: List[tuple] = []
+
+    # === Управление ===
+
+    def add_updates(self, updates: List[Dict]) -> None:
+        """Кладет обновления в очередь getUpdates; update_id проставляется, если его нет"""
+        for update in updates:
+            update.setdefault("update_id", next(self._update_ids))
+            self._updates.append(update)
+        self._updates_added.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": dict(self.requests), "errors": dict(self.errors),
+                "sent": len(self.sent), "pending_updates": len(self._updates)}
+
+    # === Ответы ===
+
+    @staticmethod
+    def ok(result: Any) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def error(code: int, description: str, **parameters) -> web.Response:
+        body = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            body["parameters"] = parameters
+        return web.json_response(body, status=code)
+
+    def _message(self, chat_id: int, **fields) -> Dict:
+        return {"message_id": next(self._message_ids[chat_id]), "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+                "from": BOT_USER, **fields}
+
+    def _throttle(self, chat_id: int, cost: int) -> Optional[web.Response]:
+        """429, если сообщение не укладывается в лимиты чата или бота.
+
+        Альбом в лимите чата — одно сообщение (иначе альбом больше chat_burst
+        не прошел бы никогда), в общем лимите бота — cost сообщений.
+        """
+        if self.rate_429 and self.random.random() < self.rate_429:
+            return self.error(429, f"Too Many Requests: retry after {self.retry_after}",
+                              retry_after=self.retry_after)
+        if self.chat_rate:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            if not bucket.try_acquire():
+                retry_after = max(1, math.ceil(1 / self.chat_rate))
+                return self.error(429, f"Too Many Requests: retry after {retry_after}", retry_after=retry_after)
+        if self.global_bucket and not self.global_bucket.try_acquire(cost):
+            return self.error(429, "Too Many Requests: retry after 1", retry_after=1)
+        return None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        self.requests[method] += 1
+        params = await self._params(request)
+
+        if method == "getupdates":
+            return self.ok(await self._get_updates(params))
+
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        response = await self._dispatch(method, params)
+        if response.status != 200:
+            self.errors[f"{method}:{response.status}"] += 1
+        return response
+
+    async def _dispatch(self, method: str, params: Dict[str, Any]) -> web.Response:
+        if method == "getme":
+            return self.ok(BOT_USER)
+        if method in ("deletewebhook", "setwebhook", "answercallbackquery"):
+            return self.ok(True)
+        if method == "editmessagetext":
+            if "inline_message_id" in params:
+                return self.ok(True)
+            chat_id = int(params["chat_id"])
+            message = self._message(chat_id, text=params.get("text", ""))
+            message["message_id"] = int(params["message_id"])
+            message["edit_date"] = message["date"]
+            return self.ok(message)
+
+        if method in SEND_METHODS or method == "sendmediagroup":
+            chat_id = int(params["chat_id"])
+            if chat_id in self.blocked:
+                return self.error(403, "Forbidden: bot was blocked by the user")
+            media = json.loads(params["media"]) if method == "sendmediagroup" else None
+            throttled = self._throttle(chat_id, len(media) if media else 1)
+            if throttled is not None:
+                return throttled
+            self.sent.append((method, chat_id, time.monotonic()))
+            if media is not None:
+                return self.ok([self._message(chat_id, photo=[self._photo(item["media"])]) for item in media])
+            return self.ok(self._message(chat_id, **self._content(method, params)))
+
+        return self.error(404, "Not Found: method not found")
+
+    @staticmethod
+    def _photo(file_id: str) -> Dict:
+        return {"file_id": file_id, "file_unique_id": file_id[:16], "width": 1280, "height": 960}
+
+    def _content(self, method: str, params: Dict[str, Any]) -> Dict:
+        field = SEND_METHODS[method]
+        if field is None:
+            return {"text": params.get("text", "")}
+        file_id = params.get(field, "file")
+        content = {"caption": params["caption"]} if params.get("caption") else {}
+        if field == "photo":
+            content["photo"] = [self._photo(file_id)]
+        elif field == "sticker":
+            content["sticker"] = {"file_id": file_id, "file_unique_id": file_id[:16], "type": "regular",
+                                  "width": 512, "height": 512, "is_animated": False, "is_video": False}
+        elif field == "voice":
+            content["voice"] = {"file_id": file_id, "file_unique_id": file_id[:16], "duration": 1}
+        elif field == "document":
+            content["document"] = {"file_id": file_id, "file_unique_id": file_id[:16]}
+        else:
+            content[field] = {"file_id": file_id, "file_unique_id": file_id[:16],
+                              "width": 640, "height": 480, "duration": 1}
+        return content
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict]:
+        """Long polling: подтверждает обновления до offset и ждет новых до timeout секунд"""
+        offset = int(params.get("offset") or 0)
+        if offset:
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        timeout = float(params.get("timeout") or 0)
+        if not self._updates and timeout:
+            self._updates_added.clear()
+            try:
+                await asyncio.wait_for(self._updates_added.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get("limit") or 100)]
+
+    @staticmethod
+    async def _params(request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        if request.method == "POST":
+            return dict(await request.post())
+        return dict(request.query)
+
+    # === Приложение ===
+
+    async def handle_control_updates(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.add_updates(body if isinstance(body, list) else [body])
+        return web.json_response({"ok": True, "pending_updates": len(self._updates)})
+
+    async def handle_control_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        app.router.add_post("/_control/updates", self.handle_control_updates)
+        app.router.add_get("/_control/stats", self.handle_control_stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+        """Запускает сервер; адрес — в self.url"""
+        runner = web.AppRunner(self.create_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return runner
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--blocked", default="", type=lambda value: {int(v) for v in value.split(",") if v})
+    parser.add_argument("--chat-rate", type=float, default=1.0)
+    parser.add_argument("--global-rate", type=float, default=30.0)
+    args = parser.parse_args()
+
+    api = FakeBotAPI(latency=args.latency, jitter=args.jitter, rate_429=args.rate_429,
+                     retry_after=args.retry_after, blocked=args.blocked,
+                     chat_rate=args.chat_rate, global_rate=args.global_rate)
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Фейковый Bot API на http://{args.host}:{args.port}")
+    web.run_app(api.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
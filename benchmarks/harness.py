@@ -0,0 +1,164 @@
+"""Общая обвязка офлайн-бенчмарков: окружение, фейковая сессия Bot API, апдейты и наполнение базы.
+
+Импортировать раньше config: модуль задает переменные окружения (временный
+DATA_DIR, админов, отключенные метрики, снятые лимиты рассылки и антифлуда — меряем
+сам бот, а не лимиты).
+"""
+import itertools
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ["DATA_DIR"] = os.environ.get("BENCH_DATA_DIR") or tempfile.mkdtemp(prefix="bot-bench-")
+os.environ["METRICS_PORT"] = "0"
+os.environ["BROADCAST_RATE"] = "1000000"
+os.environ["SLOW_UPDATE_THRESHOLD"] = "1000000"
+os.environ["THROTTLE_RATE"] = "0"
+os.environ.setdefault("CHAIRMAN_IDS", "900")
+os.environ.setdefault("DEPUTY_CHAIRMAN_IDS", "901")
+# Админы, от имени которых идут сценарии с FSM (у каждого одновременного пользователя свой)
+os.environ.setdefault("INFO_HEAD_IDS", ",".join(str(902 + i) for i in range(64)))
+
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.types import CallbackQuery, Message, Update, User  # noqa: E402
+
+from utils import database  # noqa: E402
+
+ADMIN_ID = 902
+ADMIN_POOL = [902 + i for i in range(64)]
+LEADER_ID = 900
+SEED_MESSAGE_BASE = 10_000_000
+
+
+class RecordingSession(AiohttpSession):
+    """AiohttpSession, которая ничего не отправляет: запоминает вызовы и отвечает правдоподобно"""
+
+    def __init__(self, keep_calls: int = 1000):
+        super().__init__()
+        self.calls: List[Any] = []
+        self.keep_calls = keep_calls
+        self.counts: Dict[str, int] = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout: Optional[int] = None):
+        name = method.__api_method__
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.calls.append(method)
+        if len(self.calls) > self.keep_calls * 2:
+            del self.calls[:-self.keep_calls]
+
+        if name == "getMe":
+            return User(id=0, is_bot=True, first_name="Bench", username="bench_bot")
+        if name == "sendMediaGroup":
+            return [self._message(method.chat_id, photo=True) for _ in method.media]
+        if method.__returning__ is bool:
+            return True
+        return self._message(getattr(method, "chat_id", None) or 0)
+
+    def _message(self, chat_id: int, photo: bool = False) -> Message:
+        data = {"message_id": next(self._message_ids), "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}}
+        if photo:
+            data["photo"] = [{"file_id": "p", "file_unique_id": "p", "width": 1, "height": 1}]
+        return Message.model_validate(data)
+
+    def find(self, api_method: str, predicate=lambda call: True):
+        """Последний вызов метода, подходящий под условие"""
+        return next((call for call in reversed(self.calls)
+                     if call.__api_method__ == api_method and predicate(call)), None)
+
+
+class Updates:
+    """Фабрика синтетических апдейтов с растущими update_id и message_id"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def _sender(self, user_id: int) -> Dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"Студент{user_id}", "username": f"user{user_id}"}
+
+    def message(self, user_id: int, text: Optional[str] = None, **extra) -> Update:
+        update_id = next(self._ids)
+        message = {"message_id": update_id, "date": int(time.time()),
+                   "chat": {"id": user_id, "type": "private"}, "from": self._sender(user_id)}
+        if text is not None:
+            message["text"] = text
+        message.update(extra)
+        return Update.model_validate({"update_id": update_id, "message": message})
+
+    def reply(self, user_id: int, text: str, reply_to_message_id: int) -> Update:
+        return self.message(user_id, text, reply_to_message={
+            "message_id": reply_to_message_id, "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"}, "text": "📬 Новое анонимное обращение",
+        })
+
+    def callback(self, user_id: int, data: str, message_text: str) -> Update:
+        update_id = next(self._ids)
+        return Update(update_id=update_id, callback_query=CallbackQuery.model_validate({
+            "id": str(update_id), "from": self._sender(user_id), "chat_instance": "bench", "data": data,
+            "message": {"message_id": update_id, "date": int(time.time()),
+                        "chat": {"id": user_id, "type": "private"}, "text": message_text},
+        }))
+
+
+def student_name(index: int) -> str:
+    return f"Студентов{index} Иван{index % 97} Петрович{index % 13}"
+
+
+def seed(users_from: int, users_to: int) -> List[int]:
+    """Добавляет пользователей, обращения (по одному на пользователя, с сообщением
+    у ADMIN_ID для reply) и одобренные достижения (на каждого десятого).
+    Возвращает номера добавленных обращений"""
+    now = datetime.now()
+    users = range(users_from, users_to)
+    with database.transaction("stats") as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO user_stats "
+            "(user_id, first_name, username, messages_count, first_seen, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(1_000_000 + i, f"Студент{i}", f"user{i}", 1 + i % 50,
+              (now - timedelta(days=i % 365)).isoformat(), (now - timedelta(minutes=i)).isoformat())
+             for i in users]
+        )
+    with database.transaction("appeals") as conn:
+        last = conn.execute("SELECT value FROM sequences WHERE name = 'appeals'").fetchone()
+        start = last[0] if last else 0
+        rows = []
+        for offset, i in enumerate(users, 1):
+            created = (now - timedelta(minutes=len(users) - offset)).isoformat()
+            status = "answered" if i % 3 == 0 else "new"
+            rows.append((str(start + offset).zfill(4), 1_000_000 + i, f"user{i}", f"Студент{i}",
+                         f"Обращение номер {i} про общежитие и расписание", created, status))
+        conn.executemany(
+            "INSERT INTO appeals (appeal_id, user_id, username, first_name, text, created_at, status) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        conn.executemany(
+            "INSERT INTO appeal_messages (admin_id, message_id, appeal_id) VALUES (?, ?, ?)",
+            [(ADMIN_ID, SEED_MESSAGE_BASE + int(row[0]), row[0]) for row in rows]
+        )
+        conn.execute(
+            "INSERT INTO sequences (name, value) VALUES ('appeals', ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = excluded.value", (start + len(rows),)
+        )
+    with database.transaction("achievements") as conn:
+        conn.executemany(
+            "INSERT INTO achievements "
+            "(id, reporter_id, reporter_name, reporter_role, student_name, student_key, education_level, "
+            "course, description, points, status, created_at, approver_id, approver_name, approved_at) "
+            "VALUES (?, ?, 'Админ', 'Info Head', ?, ?, 'Бакалавриат', ?, 'Олимпиада', ?, 'approved', ?, ?, "
+            "'Председатель', ?)",
+            [(f"seed-{i}", ADMIN_ID, student_name(i // 10), database.normalize_student_name(student_name(i // 10)),
+              str(1 + i % 4), 1 + i % 10, now.isoformat(), LEADER_ID, now.isoformat())
+             for i in users if i % 10 == 0]
+        )
+    return list(range(start + 1, start + len(rows) + 1))
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
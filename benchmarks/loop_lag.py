@@ -0,0 +1,103 @@
+"""Замер задержки event loop при конкурентной работе с хранилищем.
+
+Сравнивает синхронные вызовы utils.database прямо из корутин (как было до
+utils.repository) с вызовами через repo, которые выполняются в отдельном потоке.
+
+Запуск из корня репозитория:
+    python -m benchmarks.loop_lag --tasks 200 --ops 50
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bot-loop-lag-")
+
+from utils import database  # noqa: E402
+from utils.repository import repo  # noqa: E402
+
+TICK = 0.001
+
+
+async def measure_lag(stop: asyncio.Event, lags: list) -> None:
+    """Раз в TICK секунд замеряет, насколько позже срока проснулся event loop"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(TICK)
+        lags.append(max(0.0, loop.time() - started - TICK))
+
+
+async def handler_like(storage, worker: int, ops: int) -> None:
+    """Имитирует поток апдейтов: статистика, обращения, достижения"""
+    for i in range(ops):
+        user_id = worker * 1000 + i % 50
+        await storage("update_user_stats", user_id, f"user{user_id}", "Студент")
+        if i % 5 == 0:
+            appeal_id = await storage("create_appeal", user_id, None, "Студент", "Текст обращения " * 20)
+            await storage("answer_appeal", appeal_id, "Ответ")
+        if i % 7 == 0:
+            await storage("get_student_achievements_summary", f"Студент {i % 100}")
+        if i % 11 == 0:
+            await storage("get_admin_appeals_summary")
+            await storage("get_stats_summary")
+
+
+async def run(label: str, storage, tasks: int, ops: int) -> None:
+    stop = asyncio.Event()
+    lags: list = []
+    monitor = asyncio.create_task(measure_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(handler_like(storage, worker, ops) for worker in range(tasks)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99)] if lags else 0.0
+    print(
+        f"{label:<10} {elapsed:7.2f} s  "
+        f"lag p50 {statistics.median(lags) * 1000:7.2f} ms  "
+        f"p99 {p99 * 1000:7.2f} ms  max {lags[-1] * 1000:7.2f} ms  "
+        f"({len(lags)} замеров)"
+    )
+
+
+def seed() -> None:
+    for i in range(500):
+        achievement_id = database.create_achievement(
+            1, "Админ", "Chairman", f"Студент {i % 100}", "Олимпиада", 5, "1", "Бакалавриат"
+        )
+        database.update_achievement_status(achievement_id, "approved", 1, "Админ")
+
+
+async def main(tasks: int, ops: int) -> None:
+    database.init_db()
+    seed()
+
+    async def direct(name, *args):
+        result = getattr(database, name)(*args)
+        await asyncio.sleep(0)
+        return result
+
+    async def through_repo(name, *args):
+        return await getattr(repo, name)(*args)
+
+    print(f"{tasks} конкурентных задач × {ops} итераций, база {database.DATABASE_FILE}")
+    await run("sync", direct, tasks, ops)
+    database.close_db()
+
+    await repo.init()
+    await run("repo", through_repo, tasks, ops)
+    await repo.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=200, help="число конкурентных задач")
+    parser.add_argument("--ops", type=int, default=50, help="итераций в каждой задаче")
+    args = parser.parse_args()
+    asyncio.run(main(args.tasks, args.ops))
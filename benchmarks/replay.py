@@ -0,0 +1,137 @@
+"""Воспроизведение записанных обновлений через диспетчер.
+
+Запись делает сам бот при RECORD_UPDATES_FILE=updates.jsonl в .env (с
+RECORD_ANONYMIZE=1 — с псевдонимами вместо id и имен пользователей). Replay
+подает обновления в Dispatcher.feed_update в исходном темпе (--speed 1), в N раз
+быстрее (--speed N) или без пауз (--speed max); каждое обрабатывается отдельной
+задачей, как при polling. Bot API не вызывается — сессия только записывает
+вызовы. База — в отдельной папке (--data-dir, по умолчанию временная), ее можно
+заполнить копией рабочей базы (--seed-from data/bot.sqlite3).
+
+Роли берутся из .env, как у бота: при анонимизированной записи id админов
+сохраняются, и админские сценарии воспроизводятся.
+
+Запуск из корня репозитория:
+    python -m benchmarks.replay updates.jsonl --speed 10 --seed-from data/bot.sqlite3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from typing import List
+
+
+def parse_speed(value: str) -> float:
+    return 0.0 if value == "max" else float(value)
+
+
+async def replay(args) -> None:
+    from benchmarks.harness import RecordingSession, percentile
+
+    from aiogram import Bot
+    from aiogram.types import Update
+
+    import main
+    from config import DATABASE_FILE
+
+    if args.seed_from:
+        # Копия через backup API: согласованный снимок даже работающей базы
+        source = sqlite3.connect(args.seed_from)
+        target = sqlite3.connect(DATABASE_FILE)
+        with target:
+            source.backup(target)
+        source.close()
+        target.close()
+
+    session = RecordingSession()
+    bot = Bot(token=os.environ["BOT_TOKEN"], session=session)
+    dp = main.create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    latencies: List[float] = []
+    errors = 0
+    max_lag = 0.0
+    tasks = set()
+
+    async def handle(update: Update) -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            errors += 1
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    first_arrival = last_arrival = None
+    started = time.perf_counter()
+    try:
+        with open(args.recording, encoding="utf-8") as f:
+            for count, line in enumerate(f):
+                if args.limit and count >= args.limit:
+                    break
+                record = json.loads(line)
+                if first_arrival is None:
+                    first_arrival = record["t"]
+                last_arrival = record["t"]
+                if args.speed:
+                    # Держим исходные интервалы между обновлениями, ускоренные в speed раз
+                    delay = (record["t"] - first_arrival) / args.speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        max_lag = max(max_lag, -delay)
+                task = asyncio.create_task(handle(Update.model_validate(record["u"])))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+
+    if not latencies:
+        print("Запись пуста")
+        return
+    latencies.sort()
+    recorded = (last_arrival - first_arrival) if first_arrival is not None else 0.0
+    print(f"Обновлений: {len(latencies)} (в записи {recorded:.1f} с), воспроизведено за {elapsed:.2f} с "
+          f"({len(latencies) / elapsed:.1f}/с)")
+    print(f"Обработка: p50 {percentile(latencies, 0.5) * 1000:.2f} мс, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} мс, макс {latencies[-1] * 1000:.2f} мс; ошибок {errors}")
+    if args.speed:
+        print(f"Максимальное отставание от темпа записи: {max_lag * 1000:.1f} мс")
+    print(f"Вызовы Bot API: {dict(sorted(session.counts.items()))}")
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="JSONL-запись обновлений")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="ускорение: 1, N или max")
+    parser.add_argument("--data-dir", help="папка для базы воспроизведения (по умолчанию временная)")
+    parser.add_argument("--seed-from", help="база, копия которой станет начальным состоянием")
+    parser.add_argument("--limit", type=int, default=0, help="воспроизвести не больше стольких обновлений")
+    args = parser.parse_args()
+
+    # Окружение задается до импорта config: роли из .env, а база, запись и метрики — свои
+    from dotenv import load_dotenv
+    load_dotenv()
+    if args.data_dir:
+        os.environ["BENCH_DATA_DIR"] = args.data_dir
+    os.environ["RECORD_UPDATES_FILE"] = ""
+    if args.seed_from and not os.path.exists(args.seed_from):
+        parser.error(f"нет файла {args.seed_from}")
+
+    logging.disable(logging.WARNING)
+    try:
+        asyncio.run(replay(args))
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,226 @@
+"""Офлайн-бенчмарк диспетчера: настоящие роутеры в порядке main.py, синтетические
+апдейты через Dispatcher.feed_update и сессия Bot API, которая только записывает вызовы.
+
+Сценарии:
+    start        /start и кнопки меню (новость, статистика)
+    appeal       анонимное обращение с рассылкой всем админам
+    reply        ответ админа через reply на сообщение обращения
+    achievement  заявка на достижение (5 шагов FSM) и одобрение руководством
+    lookup       /achievements по ФИО (найденные и с опечаткой)
+
+Каждый сценарий прогоняется на базе с 1k/10k/100k пользователей и обращений
+(наполнение наращивается между размерами). Итог — пропускная способность и
+p50/p99 задержки одной итерации. С --baseline результаты сравниваются с
+сохраненными, и при регрессии больше --tolerance процесс завершается с кодом 1.
+
+Запуск из корня репозитория:
+    python -m benchmarks.suite --sizes 1000,10000 --iterations 300
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline --tolerance 0.3
+
+--baseline без пути сравнивает с benchmarks/baseline.json из репозитория (снят
+командой выше с настройками по умолчанию; после ускорений и на другой машине
+его стоит переснять).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+from benchmarks.harness import (
+    ADMIN_ID, ADMIN_POOL, LEADER_ID, SEED_MESSAGE_BASE, RecordingSession, Updates, percentile, seed, student_name,
+)
+
+from aiogram import Bot
+
+import main
+from utils.repository import repo
+
+BASELINE_FILE = "benchmarks/baseline.json"
+
+
+class Context:
+    def __init__(self, dp, bot: Bot, session: RecordingSession):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.updates = Updates()
+        self.size = 0
+        # Номера обращений из наполнения: у ADMIN_ID есть их сообщения для reply
+        self.seeded_appeals: List[int] = []
+        self.random = random.Random(42)
+        self._next_user = 2_000_000
+        self._iterations = 0
+        self.admins: asyncio.Queue = asyncio.Queue()
+        for admin_id in ADMIN_POOL:
+            self.admins.put_nowait(admin_id)
+
+    def next_iteration(self) -> int:
+        self._iterations += 1
+        return self._iterations
+
+    def new_user(self) -> int:
+        self._next_user += 1
+        return self._next_user
+
+    async def feed(self, update) -> None:
+        await self.dp.feed_update(self.bot, update)
+
+
+# === Сценарии: одна итерация ===
+
+async def scenario_start(ctx: Context) -> None:
+    user_id = ctx.new_user()
+    await ctx.feed(ctx.updates.message(user_id, "/start"))
+    await ctx.feed(ctx.updates.message(user_id, "📰 Новость"))
+    await ctx.feed(ctx.updates.message(user_id, "📊 Статистика"))
+
+
+async def scenario_appeal(ctx: Context) -> None:
+    user_id = ctx.new_user()
+    await ctx.feed(ctx.updates.message(user_id, "💬 Анонимное обращение"))
+    await ctx.feed(ctx.updates.message(user_id, "Почему в общежитии нет горячей воды третий день?"))
+
+
+async def scenario_reply(ctx: Context) -> None:
+    appeal_number = ctx.random.choice(ctx.seeded_appeals)
+    await ctx.feed(ctx.updates.reply(ADMIN_ID, "Спасибо, передали коменданту",
+                                     SEED_MESSAGE_BASE + appeal_number))
+
+
+async def scenario_achievement(ctx: Context) -> None:
+    # У каждого одновременного прохода свой админ, иначе шаги FSM перемешаются
+    admin_id = await ctx.admins.get()
+    try:
+        description = f"Победа в олимпиаде №{ctx.next_iteration()}"
+        for text in ("/add_achievement", student_name(ctx.random.randint(0, ctx.size // 10)),
+                     "Бакалавриат", "2", description, "5"):
+            await ctx.feed(ctx.updates.message(admin_id, text))
+    finally:
+        ctx.admins.put_nowait(admin_id)
+    notification = ctx.session.find(
+        "sendMessage", lambda call: call.chat_id == LEADER_ID and description in call.text
+    )
+    callback_data = notification.reply_markup.inline_keyboard[0][0].callback_data
+    await ctx.feed(ctx.updates.callback(LEADER_ID, callback_data, notification.text))
+
+
+async def scenario_lookup(ctx: Context) -> None:
+    index = ctx.random.randint(0, max(0, ctx.size // 10 - 1))
+    name = student_name(index)
+    if ctx.random.random() < 0.3:
+        # Опечатка: подсказки через триграммный индекс
+        name = name.replace("Иван", "Ивн", 1)
+    await ctx.feed(ctx.updates.message(ctx.new_user(), f"/achievements {name}"))
+
+
+SCENARIOS: Dict[str, Callable] = {
+    "start": scenario_start,
+    "appeal": scenario_appeal,
+    "reply": scenario_reply,
+    "achievement": scenario_achievement,
+    "lookup": scenario_lookup,
+}
+
+
+async def run_scenario(ctx: Context, scenario: Callable, iterations: int, concurrency: int) -> Dict:
+    latencies: List[float] = []
+    counter = iter(range(iterations))
+
+    async def worker():
+        for _ in counter:
+            started = time.perf_counter()
+            await scenario(ctx)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "throughput": round(iterations / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Регрессии относительно baseline: падение пропускной способности или рост p99"""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{key}: пропускная способность {result['throughput']}/с "
+                               f"(было {base['throughput']}/с)")
+        if result["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p99 {result['p99_ms']} мс (было {base['p99_ms']} мс)")
+    return regressions
+
+
+async def run(args) -> Dict:
+    session = RecordingSession()
+    bot = Bot(token="0:benchmark", session=session)
+    dp = main.create_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    ctx = Context(dp, bot, session)
+
+    results = {}
+    try:
+        for size in args.sizes:
+            # Наращиваем наполнение до size и перестраиваем индексы в памяти
+            ctx.seeded_appeals.extend(seed(ctx.size, size))
+            ctx.size = size
+            await repo.init()
+            for name in args.scenarios:
+                result = await run_scenario(ctx, SCENARIOS[name], args.iterations, args.concurrency)
+                key = f"{name}@{size}"
+                results[key] = result
+                print(f"{key:20} {result['throughput']:9.1f} итер/с  "
+                      f"p50 {result['p50_ms']:8.3f} мс  p99 {result['p99_ms']:8.3f} мс", flush=True)
+    finally:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
+    return results
+
+
+def main_cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        type=lambda value: sorted(int(size) for size in value.split(",")))
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda value: [name for name in value.split(",") if name])
+    parser.add_argument("--iterations", type=int, default=500, help="итераций на сценарий и размер")
+    parser.add_argument("--concurrency", type=int, default=10, help="одновременных пользователей")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE_FILE,
+                        help=f"JSON с прошлыми результатами для проверки регрессий (без пути — {BASELINE_FILE})")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое ухудшение, доля")
+    parser.add_argument("--save-baseline", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    logging.disable(logging.WARNING)
+    results = asyncio.run(run(args))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"Результаты сохранены в {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Регрессии:\n" + "\n".join(f"  {line}" for line in regressions))
+            sys.exit(1)
+        print("Регрессий нет")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,173 @@
+"""Задержка от появления обновления до вызова обработчика: polling против webhook.
+
+Telegram заменен фейковой сессией: обработчик считается вызванным, когда он
+делает первый запрос к Bot API. Сеть моделируется задержкой в одну сторону
+rtt/2: при polling ее проходят и запрос getUpdates, и ответ на него, при webhook —
+только POST от Telegram к нашему серверу (настоящий HTTP через aiohttp).
+
+Запуск из корня репозитория:
+    python -m benchmarks.webhook_latency --updates 200 --rtt 0.05
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bot-webhook-latency-")
+os.environ["WEBHOOK_SECRET"] = "benchmark-secret"
+os.environ["METRICS_PORT"] = "0"
+
+from aiohttp import ClientSession, web  # noqa: E402
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import GetUpdates  # noqa: E402
+from aiogram.types import Message, Update, User  # noqa: E402
+
+import main  # noqa: E402
+from config import WEBHOOK_PATH, WEBHOOK_SECRET  # noqa: E402
+
+
+class FakeSession(BaseSession):
+    """Bot API в памяти: getUpdates отдает очередь, остальные методы фиксируют время вызова"""
+
+    def __init__(self, rtt: float):
+        super().__init__()
+        self.rtt = rtt
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.handled: dict = {}
+        self.message_id = 0
+
+    async def close(self) -> None:
+        pass
+
+    async def stream_content(self, *args, **kwargs):
+        yield b""
+
+    async def make_request(self, bot, method, timeout=None):
+        if isinstance(method, GetUpdates):
+            # Запрос идет до Telegram, ждет обновлений, ответ идет обратно
+            await asyncio.sleep(self.rtt / 2)
+            updates = [await self.queue.get()]
+            while not self.queue.empty():
+                updates.append(self.queue.get_nowait())
+            await asyncio.sleep(self.rtt / 2)
+            return updates
+        if method.__api_method__ == "getMe":
+            return User(id=0, is_bot=True, first_name="Bench", username="bench_bot")
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is not None:
+            self.handled.setdefault(chat_id, time.perf_counter())
+        if method.__returning__ is bool:
+            return True
+        self.message_id += 1
+        return Message.model_validate({
+            "message_id": self.message_id, "date": 0,
+            "chat": {"id": chat_id or 0, "type": "private"},
+        })
+
+
+def make_update(update_id: int) -> Update:
+    chat_id = 10_000 + update_id
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()), "text": "/start",
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Студент"},
+        },
+    })
+
+
+async def wait_handled(session: FakeSession, chat_ids) -> None:
+    while any(chat_id not in session.handled for chat_id in chat_ids):
+        await asyncio.sleep(0.001)
+
+
+async def bench_polling(updates: int, interval: float, rtt: float) -> list:
+    session = FakeSession(rtt)
+    bot = Bot(token="0:benchmark", session=session)
+    dp = main.create_dispatcher()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False))
+    await asyncio.sleep(0.2)
+
+    sent = {}
+    for update_id in range(1, updates + 1):
+        update = make_update(update_id)
+        sent[update.message.chat.id] = time.perf_counter()
+        session.queue.put_nowait(update)
+        await asyncio.sleep(interval)
+    await wait_handled(session, sent)
+
+    await dp.stop_polling()
+    await polling
+    return [session.handled[chat_id] - started for chat_id, started in sent.items()]
+
+
+async def bench_webhook(updates: int, interval: float, rtt: float) -> list:
+    session = FakeSession(rtt)
+    bot = Bot(token="0:benchmark", session=session)
+    dp = main.create_dispatcher()
+    runner = web.AppRunner(main.create_app(bot, dp))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}{WEBHOOK_PATH}"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET}
+
+    sent = {}
+    async with ClientSession() as client:
+        async def push(update: Update) -> None:
+            # Обновление идет от Telegram к нашему серверу
+            await asyncio.sleep(rtt / 2)
+            body = update.model_dump_json(exclude_none=True)
+            async with client.post(url, data=body, headers=headers) as response:
+                assert response.status == 200, response.status
+
+        pushes = []
+        for update_id in range(1, updates + 1):
+            update = make_update(update_id)
+            sent[update.message.chat.id] = time.perf_counter()
+            pushes.append(asyncio.create_task(push(update)))
+            await asyncio.sleep(interval)
+        await asyncio.gather(*pushes)
+        await wait_handled(session, sent)
+
+    await runner.cleanup()
+    return [session.handled[chat_id] - started for chat_id, started in sent.items()]
+
+
+def report(label: str, latencies: list) -> None:
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{label:8} p50 {statistics.median(latencies) * 1000:7.2f} мс  "
+          f"p99 {p99 * 1000:7.2f} мс  max {latencies[-1] * 1000:7.2f} мс")
+
+
+async def main_async(args) -> None:
+    bench = bench_polling if args.mode == "polling" else bench_webhook
+    report(args.mode, await bench(args.updates, args.interval, args.rtt))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("both", "polling", "webhook"), default="both")
+    parser.add_argument("--updates", type=int, default=200, help="сколько обновлений отправить")
+    parser.add_argument("--interval", type=float, default=0.01, help="пауза между обновлениями, сек")
+    parser.add_argument("--rtt", type=float, default=0.05, help="время сети туда и обратно, сек")
+    args = parser.parse_args()
+    if args.mode == "both":
+        # Роутеры подключаются к одному диспетчеру, поэтому каждый режим — в своем процессе
+        for mode in ("polling", "webhook"):
+            subprocess.run([sys.executable, "-m", "benchmarks.webhook_latency", "--mode", mode,
+                            "--updates", str(args.updates), "--interval", str(args.interval),
+                            "--rtt", str(args.rtt)], check=True)
+    else:
+        logging.disable(logging.INFO)
+        asyncio.run(main_async(args))
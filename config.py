@@ -1,8 +1,10 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import List, Dict
+from utils.roles import ROLE_NAMES, RoleRegistry
 
+# Окружение процесса до .env: его значения важнее .env и при перезагрузке ролей
+PROCESS_ENV = dict(os.environ)
 load_dotenv()
 
 # Токены
@@ -10,91 +12,114 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
     raise ValueError("❌ BOT_TOKEN не найден в .env!")
 
-def get_ids_from_env(key: str) -> List[int]:
-    """Получает список ID из переменной окружения."""
-    ids_str = os.getenv(key)
-    if not ids_str:
-        return []
-    return [int(admin_id) for admin_id in ids_str.split(',') if admin_id]
-
-# Роли
-ROLES: Dict[str, List[int]] = {
-    # Председатель
-    "chairman": get_ids_from_env("CHAIRMAN_IDS"),
-    # Заместитель председателя
-    "deputy_chairman": get_ids_from_env("DEPUTY_CHAIRMAN_IDS"),
-    # Ответственный секретарь
-    "secretary": get_ids_from_env("SECRETARY_IDS"),
-    # Руководитель Информационного отдела
-    "info_head": get_ids_from_env("INFO_HEAD_IDS"),
-    "info_deputy": get_ids_from_env("INFO_DEPUTY_IDS"),
-    # Руководитель Культурного отдела
-    "culture_head": get_ids_from_env("CULTURE_HEAD_IDS"),
-    "culture_deputy": get_ids_from_env("CULTURE_DEPUTY_IDS"),
-    # Руководитель Научного отдела
-    "science_head": get_ids_from_env("SCIENCE_HEAD_IDS"),
-    "science_deputy": get_ids_from_env("SCIENCE_DEPUTY_IDS"),
-    # Руководитель Волонтёрского отдела
-    "volunteer_head": get_ids_from_env("VOLUNTEER_HEAD_IDS"),
-    "volunteer_deputy": get_ids_from_env("VOLUNTEER_DEPUTY_IDS"),
-    # Руководитель Международного отдела
-    "international_head": get_ids_from_env("INTERNATIONAL_HEAD_IDS"),
-    "international_deputy": get_ids_from_env("INTERNATIONAL_DEPUTY_IDS"),
-    # Заведующий Комитетом по быту
-    "social_head": get_ids_from_env("SOCIAL_HEAD_IDS"),
-    "social_deputy": get_ids_from_env("SOCIAL_DEPUTY_IDS"),
-    # Заведующий Комитетом по образованию
-    "education_head": get_ids_from_env("EDUCATION_HEAD_IDS"),
-    "education_deputy": get_ids_from_env("EDUCATION_DEPUTY_IDS"),
-    # Заведующий Комитетом по спорту
-    "sport_head": get_ids_from_env("SPORT_HEAD_IDS"),
-    "sport_deputy": get_ids_from_env("SPORT_DEPUTY_IDS"),
-    # Заведующий Комитетом по работе со спонсорами
-    "sponsors_head": get_ids_from_env("SPONSORS_HEAD_IDS"),
-    "sponsors_deputy": get_ids_from_env("SPONSORS_DEPUTY_IDS"),
-    # Заведующий Комитетом по Межфакультетским связям
-    "interfaculty_head": get_ids_from_env("INTERFACULTY_HEAD_IDS"),
-    "interfaculty_deputy": get_ids_from_env("INTERFACULTY_DEPUTY_IDS"),
-    # Заведующий Комитетом по цифровому развитию и техническому обеспечению
-    "tech_head": get_ids_from_env("TECH_HEAD_IDS"),
-    "tech_deputy": get_ids_from_env("TECH_DEPUTY_IDS"),
-}
-
-# Общий список всех админов
-ADMIN_IDS = sorted(list(set(id for role_ids in ROLES.values() for id in role_ids)))
-
-# Определение ролей руководства
-LEADERSHIP_ROLES = ["chairman", "deputy_chairman", "secretary"]
-LEADERSHIP_IDS = sorted(list(set(id for role in LEADERSHIP_ROLES for id in ROLES[role])))
-
-if not ADMIN_IDS:
+# Роли: назначения из .env, окружения и файла ролей (JSON), перезагружаются при изменении
+# файлов (проверка раз в ROLES_RELOAD_INTERVAL секунд, 0 — выключена) и по команде /reload_roles
+ENV_FILE = Path(os.getenv("ENV_FILE", Path(__file__).parent / ".env"))
+ROLES_FILE = os.getenv("ROLES_FILE", "")
+ROLES_RELOAD_INTERVAL = float(os.getenv("ROLES_RELOAD_INTERVAL", "10"))
+roles = RoleRegistry(ENV_FILE, ROLES_FILE or None, environ=PROCESS_ENV)
+
+if not roles.snapshot.admins:
     print("⚠️ Ни один ID администратора не найден в .env! Админ-панель будет недоступна.")
 
 def is_admin(user_id: int) -> bool:
     """Проверяет, является ли пользователь админом."""
-    return user_id in ADMIN_IDS
+    return user_id in roles.snapshot.admins
 
 def is_leadership(user_id: int) -> bool:
     """Проверяет, является ли пользователь руководством."""
-    return user_id in LEADERSHIP_IDS
+    return user_id in roles.snapshot.leadership
 
 def get_role_name(user_id: int) -> str:
-    """Возвращает название роли пользователя."""
-    for role, ids in ROLES.items():
-        if user_id in ids:
-            # This is a simple implementation, you might want to map role keys to human-readable names
-            return role.replace('_', ' ').title()
-    return "User"
+    """Возвращает название старшей роли пользователя."""
+    role = roles.role_of(user_id)
+    if role is None:
+        return "User"
+    return ROLE_NAMES.get(role, role.replace('_', ' ').title())
 
 # Папки и файлы
 BASE_DIR = Path(__file__).parent
-DATA_DIR = BASE_DIR / "data"
-DATA_DIR.mkdir(exist_ok=True)
+DATA_DIR = Path(os.getenv("DATA_DIR", BASE_DIR / "data"))
+DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+DATABASE_FILE = DATA_DIR / "bot.sqlite3"
 
+# Архив отвеченных обращений: сжатые сегменты в DATA_DIR/archive. Через сколько дней после
+# ответа обращение переносится из базы в архив (0 — не архивировать) и интервал проверки (сек)
+ARCHIVE_DIR = DATA_DIR / "archive"
+APPEALS_ARCHIVE_DAYS = int(os.getenv("APPEALS_ARCHIVE_DAYS", "180"))
+APPEALS_ARCHIVE_INTERVAL = float(os.getenv("APPEALS_ARCHIVE_INTERVAL", str(6 * 60 * 60)))
+
+# Файлы JSON-хранилища (переносятся в базу при первом запуске)
 STATS_FILE = DATA_DIR / "user_stats.json"
 APPEALS_FILE = DATA_DIR / "appeals.json"
 ACHIEVEMENTS_FILE = DATA_DIR / "achievements.json"
 
+# Отложенная запись статистики: интервал сброса (сек), порог изменений и размер кэша
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "5"))
+STATS_FLUSH_THRESHOLD = int(os.getenv("STATS_FLUSH_THRESHOLD", "500"))
+STATS_CACHE_SIZE = int(os.getenv("STATS_CACHE_SIZE", "10000"))
+
+# Рассылка обращений админам: сообщений в секунду (лимит Telegram ~30), запас сообщений
+# (не меньше альбома из 10 фото) и повторы после RetryAfter
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_BURST = float(os.getenv("BROADCAST_BURST", "30"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+
+# Сборка альбомов в обращениях: предельное время сборки (сек) и число альбомов в сборке
+ALBUM_TTL = float(os.getenv("ALBUM_TTL", "10"))
+ALBUM_MAX_GROUPS = int(os.getenv("ALBUM_MAX_GROUPS", "1000"))
+
+# Состояния FSM в базе: срок жизни неизменявшегося состояния (сек), размер кэша,
+# интервал (сек) и порог пакетной записи
+FSM_STATE_TTL = float(os.getenv("FSM_STATE_TTL", str(24 * 60 * 60)))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))
+FSM_FLUSH_THRESHOLD = int(os.getenv("FSM_FLUSH_THRESHOLD", "200"))
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+if BOT_MODE not in ("polling", "webhook"):
+    raise ValueError(f"❌ Неизвестный BOT_MODE: {BOT_MODE} (нужен polling или webhook)")
+
+# Webhook: публичный адрес (если пуст, вебхук в Telegram не регистрируется — удобно для
+# локальной проверки), путь, секрет для заголовка X-Telegram-Bot-Api-Secret-Token и адрес сервера
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+    raise ValueError("❌ Для BOT_MODE=webhook задайте WEBHOOK_SECRET в .env")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+# Метрики в формате Prometheus: адрес и порт HTTP-сервера (/metrics), 0 — выключены
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "8081"))
+
+# Обновления, обработанные дольше этого времени (сек), логируются с разбивкой по времени
+SLOW_UPDATE_THRESHOLD = float(os.getenv("SLOW_UPDATE_THRESHOLD", "1"))
+
+# Адрес Bot API (например, локального сервера или фейка из benchmarks/fake_api.py); пусто — api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "").rstrip("/")
+
+# Размер страницы в списках обращений и заявок на достижения
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", "5"))
+
+# Антифлуд: сообщений в секунду и запас на пользователя (0 — без ограничений), отдельно для
+# админов, и сколько последних пользователей помнить
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "1"))
+THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", "5"))
+THROTTLE_ADMIN_RATE = float(os.getenv("THROTTLE_ADMIN_RATE", "5"))
+THROTTLE_ADMIN_BURST = float(os.getenv("THROTTLE_ADMIN_BURST", "20"))
+THROTTLE_MAX_USERS = int(os.getenv("THROTTLE_MAX_USERS", "10000"))
+
+# Запись входящих обновлений в JSONL для воспроизведения (benchmarks/replay.py): путь к файлу
+# (пусто — запись выключена), замена id и имен пользователей псевдонимами (id админов сохраняются)
+# и секретная соль псевдонимов: с ней они одинаковы после перезапусков бота, дописывающего тот же файл
+RECORD_UPDATES_FILE = os.getenv("RECORD_UPDATES_FILE", "")
+RECORD_ANONYMIZE = os.getenv("RECORD_ANONYMIZE", "0").lower() in ("1", "true", "yes")
+RECORD_SALT = os.getenv("RECORD_SALT", "")
+
 # Контент
 NEWS_TEXT = """📰 <b>НОВОСТЬ ОТ СТУДСОВЕТА ФГУ!</b>
 
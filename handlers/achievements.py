@@ -1,21 +1,20 @@
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
-from aiogram.filters import Command
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, FSInputFile
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
+import asyncio
+import html
 import logging
 
-from config import is_admin, is_leadership, get_role_name, LEADERSHIP_IDS
-from utils.database import (
-    create_achievement,
-    get_pending_achievements,
-    get_achievement,
-    update_achievement_status
-)
-from utils.keyboards import get_cancel_keyboard
+from config import is_admin, is_leadership, get_role_name, roles
+from utils.repository import repo
+from utils.keyboards import get_cancel_keyboard, get_pagination_keyboard
+from utils.export import build_export, export_filename, parse_export_args
 
-achievements_router = Router()
+achievements_router = Router(name="achievements")
 logger = logging.getLogger(__name__)
 
 
@@ -142,7 +141,7 @@ async def process_points(message: Message, state: FSMContext, bot: Bot):
     reporter_name = message.from_user.full_name
     reporter_role = get_role_name(reporter_id)
     
-    achievement_id = create_achievement(
+    achievement_id = await repo.create_achievement(
         reporter_id=reporter_id,
         reporter_name=reporter_name,
         reporter_role=reporter_role,
@@ -176,7 +175,7 @@ async def process_points(message: Message, state: FSMContext, bot: Bot):
         f"Баллы: <b>{points}</b>"
     )
 
-    for admin_id in LEADERSHIP_IDS:
+    for admin_id in roles.snapshot.leadership:
         try:
             await bot.send_message(
                 admin_id, 
@@ -189,29 +188,125 @@ async def process_points(message: Message, state: FSMContext, bot: Bot):
 
 
 # --- Команды для руководства ---
+
+# Одна выгрузка за раз: файл строится в отдельном потоке и читает всю таблицу
+_export_lock = asyncio.Lock()
+
+
+@achievements_router.message(Command("export"))
+async def export_achievements(message: Message, command: CommandObject):
+    """Выгрузка одобренных достижений или итогов баллов: /export [achievements|totals] [xlsx|csv]"""
+    if not is_leadership(message.from_user.id):
+        return
+
+    try:
+        kind, fmt = parse_export_args(command.args)
+    except ValueError:
+        await message.answer(
+            "Использование: /export [achievements|totals] [xlsx|csv]\n"
+            "achievements — все одобренные достижения, totals — итоговые баллы по студентам"
+        )
+        return
+    if _export_lock.locked():
+        await message.answer("⏳ Выгрузка уже готовится, дождитесь файла")
+        return
+
+    async with _export_lock:
+        await message.answer("📦 Готовлю выгрузку, файл придет документом")
+        path = None
+        try:
+            path, count = await asyncio.to_thread(build_export, kind, fmt)
+            await message.answer_document(
+                FSInputFile(path, filename=export_filename(kind, fmt)),
+                caption=f"Строк: {count}"
+            )
+            logger.info(f"Выгрузка {kind}.{fmt} ({count} строк) для {message.from_user.id}")
+        except Exception as e:
+            logger.error(f"Ошибка выгрузки {kind}.{fmt}: {e}")
+            await message.answer("❌ Не удалось подготовить выгрузку")
+        finally:
+            if path is not None:
+                path.unlink(missing_ok=True)
+
 @achievements_router.message(Command("pending_achievements"))
 async def show_pending_achievements(message: Message):
     """Показывает список индивидуальных достижений, ожидающих подтверждения."""
     if not is_leadership(message.from_user.id):
         return
 
-    pending_list = get_pending_achievements()
-
-    if not pending_list:
+    page = await repo.get_pending_achievements_page()
+    if not page[0]:
         await message.answer("✅ Нет заявок на подтверждение индивидуальных достижений.")
         return
 
-    summary = f"⏳ <b>Заявки на подтверждение ({len(pending_list)}):</b>\n"
+    summary, keyboard = render_pending_page(*page)
+    await message.answer(summary, parse_mode="HTML", reply_markup=keyboard)
+
+
+# Лимит длины сообщения Telegram и длина описания заявки в списке (полное — в уведомлении)
+MESSAGE_LIMIT = 4096
+DESCRIPTION_PREVIEW = 300
+
+
+def shorten_html(text: str, limit: int) -> str:
+    """Экранированный для HTML текст не длиннее limit символов (обрезанный — с «…»)"""
+    escaped = html.escape(text)
+    keep = len(text)
+    while len(escaped) > limit and keep > 0:
+        keep = max(0, min(keep - 1, keep - (len(escaped) - limit)))
+        escaped = html.escape(text[:keep].rstrip()) + "…"
+    return escaped if len(escaped) <= limit else ""
+
+
+def render_pending_page(pending_list, total, prev_cursor, next_cursor):
+    """Текст страницы заявок и кнопки листания (ключ — seq крайней заявки).
+
+    Описания обрезаются так, чтобы страница уместилась в одно сообщение.
+    """
+    if not pending_list:
+        return "✅ Нет заявок на подтверждение индивидуальных достижений.", None
+
+    summary = f"⏳ <b>Заявки на подтверждение ({total}):</b>\n"
+    budget = (MESSAGE_LIMIT - len(summary)) // len(pending_list)
     for ach in pending_list:
-        summary += (
+        head = (
             "\n--------------------\n"
-            f"Студент: <b>{ach['student_name']} ({ach.get('education_level', '')}, {ach.get('course', '')} курс)</b>\n"
-            f"Баллы: <b>{ach['points']}</b> ({ach['description']})\n"
-            f"Добавил: {ach['reporter_name']} ({ach['reporter_role']})\n"
+            f"Студент: <b>{html.escape(ach['student_name'])} "
+            f"({ach.get('education_level', '')}, {ach.get('course', '')} курс)</b>\n"
+            f"Баллы: <b>{ach['points']}</b> ("
+        )
+        tail = (
+            ")\n"
+            f"Добавил: {html.escape(ach['reporter_name'] or '')} ({ach['reporter_role']})\n"
             f"/approve_{ach['id']} /reject_{ach['id']}"
         )
+        room = min(DESCRIPTION_PREVIEW, budget - len(head) - len(tail))
+        summary += head + shorten_html(ach['description'] or "", room) + tail
+
+    keyboard = get_pagination_keyboard(
+        f"pend:p:{prev_cursor}" if prev_cursor is not None else None,
+        f"pend:n:{next_cursor}" if next_cursor is not None else None,
+    )
+    return summary, keyboard
+
+
+@achievements_router.callback_query(F.data.startswith("pend:"))
+async def pending_achievements_page_callback(callback: CallbackQuery):
+    """Листание /pending_achievements: сообщение редактируется на месте"""
+    if not is_leadership(callback.from_user.id):
+        await callback.answer("У вас нет прав для этого действия.", show_alert=True)
+        return
 
-    await message.answer(summary, parse_mode="HTML")
+    _, direction, cursor = callback.data.split(":")
+    page = await repo.get_pending_achievements_page(int(cursor), "prev" if direction == "p" else "next")
+    summary, keyboard = render_pending_page(*page)
+    try:
+        await callback.message.edit_text(summary, parse_mode="HTML", reply_markup=keyboard)
+    except TelegramBadRequest as e:
+        # Страница не изменилась (двойное нажатие)
+        if "message is not modified" not in str(e):
+            raise
+    await callback.answer()
 
 # --- Обработка Callback-ов от руководства ---
 @achievements_router.callback_query(F.data.startswith("ach_approve_"))
@@ -229,7 +324,7 @@ async def process_achievement_decision(callback: CallbackQuery, bot: Bot, achiev
         await callback.answer("У вас нет прав для этого действия.", show_alert=True)
         return
 
-    achievement = get_achievement(achievement_id)
+    achievement = await repo.get_achievement(achievement_id)
     if not achievement or achievement["status"] != "pending":
         await callback.message.edit_text("<i>Заявка не найдена или уже была обработана.</i>", parse_mode="HTML")
         await callback.answer()
@@ -238,12 +333,18 @@ async def process_achievement_decision(callback: CallbackQuery, bot: Bot, achiev
     approver_id = callback.from_user.id
     approver_name = callback.from_user.full_name
 
-    update_achievement_status(
+    updated = await repo.update_achievement_status(
         achievement_id=achievement_id, 
         status=decision, 
         approver_id=approver_id, 
-        approver_name=approver_name
+        approver_name=approver_name,
+        expected_status="pending"
     )
+    if not updated:
+        # Заявку успели обработать параллельно
+        await callback.message.edit_text("<i>Заявка не найдена или уже была обработана.</i>", parse_mode="HTML")
+        await callback.answer()
+        return
     
     decision_text = "✅ Одобрена" if decision == "approved" else "❌ Отклонена"
 
@@ -1,20 +1,18 @@
-from aiogram import Router, F, Bot
-from aiogram.types import Message, ReplyKeyboardRemove, InputMediaPhoto
-from aiogram.filters import Command
+from aiogram import Router, F, Bot, html
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, InputMediaPhoto, BufferedInputFile
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio
 import logging
-from config import is_admin
-from utils.database import (
-    get_admin_appeals_summary, 
-    get_appeal, 
-    get_appeal_by_message_id,
-    answer_appeal
-)
-from utils.keyboards import get_cancel_keyboard
+from config import is_admin, is_leadership, roles
+from utils.repository import repo
+from utils.keyboards import get_cancel_keyboard, get_pagination_keyboard
+from utils.profiling import is_profiling, profile_for
 
-admin_router = Router()
+admin_router = Router(name="admin")
 logger = logging.getLogger(__name__)
 
 
@@ -29,20 +27,149 @@ async def admin_appeals_handler(message: Message):
         return
     
     try:
-        summary = get_admin_appeals_summary()
-        await message.answer(summary, parse_mode="HTML")
+        summary, newer, older = await repo.get_admin_appeals_summary()
+        await message.answer(summary, parse_mode="HTML", reply_markup=appeals_page_keyboard(newer, older))
     except Exception as e:
         logger.error(f"Ошибка получения обращений: {e}")
         await message.answer("❌ Ошибка получения обращений")
 
-@admin_router.message(F.text.regexp(r'^/view_\d{4}$'))
+
+def appeals_page_keyboard(newer, older):
+    """Листание новых обращений: ключ страницы (created_at, appeal_id) в callback_data"""
+    def data(direction, key):
+        return f"apl:{direction}:{key[1]}:{key[0]}" if key else None
+    return get_pagination_keyboard(data("n", newer), data("o", older))
+
+
+@admin_router.callback_query(F.data.startswith("apl:"))
+async def admin_appeals_page_callback(callback: CallbackQuery):
+    """Следующая или предыдущая страница /appeals: сообщение редактируется на месте"""
+    if not is_admin(callback.from_user.id):
+        await callback.answer()
+        return
+
+    _, direction, appeal_id, created_at = callback.data.split(":", 3)
+    summary, newer, older = await repo.get_admin_appeals_summary(
+        (created_at, appeal_id), "newer" if direction == "n" else "older"
+    )
+    try:
+        await callback.message.edit_text(summary, parse_mode="HTML",
+                                         reply_markup=appeals_page_keyboard(newer, older))
+    except TelegramBadRequest as e:
+        # Страница не изменилась (двойное нажатие)
+        if "message is not modified" not in str(e):
+            raise
+    await callback.answer()
+
+@admin_router.message(Command("profile"))
+async def admin_profile_handler(message: Message, command: CommandObject):
+    """Профилирование работающего бота: /profile [секунды]"""
+    if not is_leadership(message.from_user.id):
+        return
+    
+    seconds = 30
+    if command.args:
+        if not command.args.strip().isdigit():
+            await message.answer("Использование: /profile [секунды от 1 до 300]")
+            return
+        seconds = min(max(int(command.args.strip()), 1), 300)
+    
+    if is_profiling():
+        await message.answer("⏳ Профилирование уже идет, дождитесь отчета")
+        return
+    
+    await message.answer(f"🔬 Профилирование на {seconds} с запущено, отчет придет документом")
+    report = await profile_for(seconds)
+    logger.info(f"Профилирование на {seconds} с по запросу {message.from_user.id}")
+    await message.answer_document(
+        BufferedInputFile(report.encode("utf-8"), filename=f"profile_{datetime.now():%Y%m%d_%H%M%S}.txt"),
+        caption=f"Профиль за {seconds} с: по суммарному и по собственному времени функций"
+    )
+
+
+SEARCH_USAGE = (
+    "Использование: /search [status:new|answered] [from:ДД.ММ.ГГГГ] [to:ДД.ММ.ГГГГ] слова\n"
+    "Например: /search status:new душ общежитие"
+)
+SEARCH_STATUSES = {"new": "📥", "answered": "✅"}
+
+
+@admin_router.message(Command("search"))
+async def admin_search_handler(message: Message, command: CommandObject):
+    """Поиск по тексту обращений и ответов"""
+    if not is_admin(message.from_user.id):
+        return
+
+    status = since = until = None
+    words = []
+    try:
+        for word in (command.args or "").split():
+            option, _, value = word.partition(":")
+            if option == "status" and value in SEARCH_STATUSES:
+                status = value
+            elif option == "from" and value:
+                since = datetime.strptime(value, "%d.%m.%Y").isoformat()
+            elif option == "to" and value:
+                # Включительно: до начала следующего дня
+                until = (datetime.strptime(value, "%d.%m.%Y") + timedelta(days=1)).isoformat()
+            else:
+                words.append(word)
+    except ValueError:
+        await message.answer(SEARCH_USAGE)
+        return
+    if not words:
+        await message.answer(SEARCH_USAGE)
+        return
+
+    query = " ".join(words)
+    results = await repo.search_appeals(query, status, since, until)
+    if not results:
+        await message.answer(f"🔍 По запросу «{html.quote(query)}» ничего не найдено", parse_mode="HTML")
+        return
+
+    text = f"🔍 <b>Обращения по запросу «{html.quote(query)}»</b>"
+    for appeal in results:
+        preview = appeal["text"][:80] + ("..." if len(appeal["text"]) > 80 else "")
+        text += (
+            f"\n\n{SEARCH_STATUSES.get(appeal['status'], '')} <b>#{appeal['appeal_id']}</b> "
+            f"от {datetime.fromisoformat(appeal['created_at']).strftime('%d.%m.%Y')}"
+            f"\n<i>{html.quote(preview) if preview else 'без текста'}</i>"
+            f"\n/view_{appeal['appeal_id']}"
+        )
+    await message.answer(text, parse_mode="HTML")
+
+
+@admin_router.message(Command("reload_roles"))
+async def admin_reload_roles_handler(message: Message):
+    """Перечитывает назначения ролей из .env и файла ролей без перезапуска"""
+    if not is_leadership(message.from_user.id):
+        return
+
+    try:
+        added, removed = await asyncio.to_thread(roles.reload)
+    except Exception as e:
+        logger.error(f"Ошибка перезагрузки ролей: {e}")
+        await message.answer(f"❌ Роли не перезагружены, действуют прежние: {e}")
+        return
+
+    snapshot = roles.snapshot
+    lines = [f"✅ Роли перезагружены: админов {len(snapshot.admins)}, руководства {len(snapshot.leadership)}"]
+    if added:
+        lines.append(f"Добавлены: {', '.join(map(str, sorted(added)))}")
+    if removed:
+        lines.append(f"Удалены: {', '.join(map(str, sorted(removed)))}")
+    logger.info(f"Роли перезагружены по команде {message.from_user.id}")
+    await message.answer("\n".join(lines))
+
+
+@admin_router.message(F.text.regexp(r'^/view_\d{4,}$'))
 async def admin_view_appeal_handler(message: Message):
     """Просмотр обращения"""
     if not is_admin(message.from_user.id):
         return
     
     appeal_id = message.text.split('_')[1]
-    appeal = get_appeal(appeal_id)
+    appeal = await repo.get_appeal(appeal_id)
     
     if not appeal:
         await message.answer(f"❌ Обращение #{appeal_id} не найдено")
@@ -72,7 +199,7 @@ async def admin_view_appeal_handler(message: Message):
     text += f"""
 
 📅 <b>Дата:</b> {datetime.fromisoformat(appeal['created_at']).strftime('%d.%m.%Y %H:%M')}
-📊 <b>Статус:</b> {appeal['status']}"""
+📊 <b>Статус:</b> {appeal['status']}{" (в архиве)" if appeal.get('archived') else ""}"""
     
     if appeal['status'] == 'answered':
         text += f"""
@@ -121,18 +248,22 @@ async def admin_view_appeal_handler(message: Message):
         await message.answer(text, parse_mode="HTML")
 
 
-@admin_router.message(F.text.regexp(r'^/reply_\d{4}$'))
+@admin_router.message(F.text.regexp(r'^/reply_\d{4,}$'))
 async def admin_start_reply_handler(message: Message, state: FSMContext):
     """Начало ответа через команду"""
     if not is_admin(message.from_user.id):
         return
     
     appeal_id = message.text.split('_')[1]
-    appeal = get_appeal(appeal_id)
+    appeal = await repo.get_appeal(appeal_id)
     
     if not appeal:
         await message.answer(f"❌ Обращение #{appeal_id} не найдено")
         return
+
+    if appeal.get("archived"):
+        await message.answer(f"🗄 Обращение #{appeal_id} давно отвечено и перенесено в архив: /view_{appeal_id}")
+        return
     
     await state.set_state(AdminStates.waiting_for_reply)
     await state.update_data(appeal_id=appeal_id)
@@ -160,8 +291,8 @@ async def admin_reply_to_message_handler(message: Message, state: FSMContext):
     if not is_admin(message.from_user.id):
         return
     
-    # Ищем обращение по message_id
-    result = get_appeal_by_message_id(message.reply_to_message.message_id)
+    # Ищем обращение по message_id в чате админа
+    result = await repo.get_appeal_by_message_id(message.reply_to_message.message_id, message.chat.id)
     
     if not result:
         # Это не ответ на обращение, пропускаем
@@ -193,8 +324,10 @@ async def admin_reply_to_message_handler(message: Message, state: FSMContext):
         media_type = "voice"
         media_id = message.voice.file_id
     
-    # Сохраняем ответ
-    answer_appeal(appeal_id, text, media_type, media_id)
+    # Сохраняем ответ (False — обращение тем временем ушло в архив или удалено)
+    if not await repo.answer_appeal(appeal_id, text, media_type, media_id):
+        await message.answer(f"🗄 Обращение #{appeal_id} перенесено в архив или недоступно, ответ не отправлен")
+        return
     
     # Отправляем пользователю
     try:
@@ -260,7 +393,7 @@ async def admin_process_reply_handler(message: Message, state: FSMContext):
     data = await state.get_data()
     appeal_id = data.get("appeal_id")
     
-    appeal = get_appeal(appeal_id)
+    appeal = await repo.get_appeal(appeal_id)
     if not appeal:
         await message.answer("❌ Обращение не найдено")
         await state.clear()
@@ -290,8 +423,12 @@ async def admin_process_reply_handler(message: Message, state: FSMContext):
         media_type = "voice"
         media_id = message.voice.file_id
     
-    # Сохраняем ответ
-    answer_appeal(appeal_id, text, media_type, media_id)
+    # Сохраняем ответ (False — обращение ушло в архив или удалено, пока админ писал ответ)
+    if not await repo.answer_appeal(appeal_id, text, media_type, media_id):
+        await message.answer(f"🗄 Обращение #{appeal_id} перенесено в архив или недоступно, ответ не отправлен",
+                             reply_markup=ReplyKeyboardRemove())
+        await state.clear()
+        return
     
     # Отправляем пользователю
     try:
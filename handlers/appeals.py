@@ -1,15 +1,18 @@
 from aiogram import Router, F, Bot
+from aiogram.filters import Filter
 from aiogram.types import Message, InputMediaPhoto
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime
 import logging
-import asyncio
-from config import ADMIN_IDS
-from utils.database import update_user_stats, create_appeal
+from config import ALBUM_TTL, ALBUM_MAX_GROUPS, roles
+from utils.repository import repo
+from utils.broadcast import broadcast
+from utils.albums import Album, AlbumAggregator
+from utils.metrics import gauge
 from utils.keyboards import get_main_menu, get_cancel_keyboard
 
-appeals_router = Router()
+appeals_router = Router(name="appeals")
 logger = logging.getLogger(__name__)
 
 
@@ -17,17 +20,13 @@ class AppealStates(StatesGroup):
     waiting_for_appeal = State()
 
 
-# Хранилище для медиа-групп (альбомов)
-media_groups = {}
-# Задачи для обработки групп
-processing_tasks = {}
 
 
 @appeals_router.message(F.text == "💬 Анонимное обращение")
 async def start_appeal_handler(message: Message, state: FSMContext):
     """Начало создания обращения"""
-    update_user_stats(message.from_user.id, message.from_user.username,
-                     message.from_user.first_name)
+    await repo.update_user_stats(message.from_user.id, message.from_user.username,
+                                 message.from_user.first_name)
     
     await state.set_state(AppealStates.waiting_for_appeal)
     await message.answer(
@@ -54,51 +53,25 @@ async def cancel_appeal_handler(message: Message, state: FSMContext):
     await message.answer("❌ Обращение отменено", reply_markup=get_main_menu())
 
 
-async def process_media_group(media_group_id: str):
+async def process_media_group(album: Album):
     """Обработка медиа-группы после сбора всех сообщений"""
-    await asyncio.sleep(0.5)  # Ждем, пока все фото соберутся
-    
-    if media_group_id not in media_groups:
-        return
-    
-    group_data = media_groups[media_group_id]
-    messages = sorted(group_data["messages"], key=lambda m: m.message_id)
-    user = group_data["user"]
-    state = group_data["state"]
-    
-    # Если уже обработано, пропускаем
-    if group_data.get("processed"):
-        return
-    
-    group_data["processed"] = True
-    
-    # Берем текст из первого сообщения с caption
-    text = ""
-    for msg in messages:
-        if msg.caption:
-            text = msg.caption
-            break
-    
-    # Собираем все file_id фотографий
-    photo_ids = []
-    for msg in messages:
-        if msg.photo:
-            photo_ids.append(msg.photo[-1].file_id)
+    text = album.caption
+    photo_ids = album.photo_ids
     
     # Создаем обращение (сохраняем все photo_ids как строку)
-    appeal_id = create_appeal(
-        user_id=user.id,
-        username=user.username,
-        first_name=user.first_name,
+    appeal_id = await repo.create_appeal(
+        user_id=album.user_id,
+        username=album.username,
+        first_name=album.first_name,
         text=text,
         media_type="media_group",
         media_id=",".join(photo_ids)  # Сохраняем все ID через запятую
     )
     
-    await state.clear()
-    
     # Уведомляем пользователя
-    await messages[0].answer(
+    bot: Bot = album.bot
+    await bot.send_message(
+        album.chat_id,
         f"✅ <b>Обращение #{appeal_id} отправлено!</b>\n\n"
         "Студсовет получит ваше сообщение анонимно.\n"
         "Ответ придет в этот чат.",
@@ -106,11 +79,10 @@ async def process_media_group(media_group_id: str):
         reply_markup=get_main_menu()
     )
     
-    # Отправляем админам альбом
-    if ADMIN_IDS:
+    # Отправляем админам альбом (набор ролей на момент отправки)
+    admin_ids = roles.snapshot.admins
+    if admin_ids:
         try:
-            bot: Bot = messages[0].bot
-            
             # Формируем медиа-группу для отправки
             media_group_to_send = []
             admin_text = f"""📬 <b>Новое анонимное обращение #{appeal_id}</b>
@@ -134,32 +106,60 @@ async def process_media_group(media_group_id: str):
                     # Остальные фото без текста
                     media_group_to_send.append(InputMediaPhoto(media=photo_id))
             
-            # Отправляем группу всем админам
-            for admin_id in ADMIN_IDS:
-                try:
-                    sent_messages = await bot.send_media_group(admin_id, media_group_to_send)
-                    logger.info(f"Обращение #{appeal_id} (альбом из {len(photo_ids)} фото) отправлено админу {admin_id}")
-
-                    # Сохраняем message_id первого сообщения для reply
-                    if sent_messages:
-                        from utils.database import load_appeals, save_appeals
-                        appeals_data = load_appeals()
-                        # У каждого админа будет свой message_id для ответа
-                        if "admin_message_ids" not in appeals_data[appeal_id]:
-                            appeals_data[appeal_id]["admin_message_ids"] = {}
-                        appeals_data[appeal_id]["admin_message_ids"][str(admin_id)] = sent_messages[0].message_id
-                        save_appeals(appeals_data)
-
-                except Exception as e:
-                    logger.error(f"Ошибка отправки обращения админу {admin_id}: {e}")
+            # Отправляем группу всем админам параллельно
+            async def send_album(admin_id: int):
+                sent_messages = await bot.send_media_group(admin_id, media_group_to_send)
+                # Для reply запоминаем первое сообщение альбома
+                return sent_messages[0] if sent_messages else None
+
+            message_ids = await broadcast(admin_ids, send_album, cost=len(media_group_to_send))
+            # У каждого админа будет свой message_id для ответа
+            await repo.add_admin_message_ids(appeal_id, message_ids)
+            logger.info(
+                f"Обращение #{appeal_id} (альбом из {len(photo_ids)} фото) "
+                f"отправлено {len(message_ids)} из {len(admin_ids)} админов"
+            )
 
         except Exception as e:
             logger.error(f"Общая ошибка отправки обращения админам: {e}")
+
+
+# Сборщик альбомов: части одного альбома приходят отдельными сообщениями
+album_aggregator = AlbumAggregator(
+    on_complete=process_media_group,
+    ttl=ALBUM_TTL,
+    max_groups=ALBUM_MAX_GROUPS,
+)
+gauge("bot_album_events_total", "Album collection outcomes",
+      lambda: {(event,): count for event, count in album_aggregator.counters.items()},
+      ("event",), type_name="counter")
+gauge("bot_albums_collecting", "Albums currently being collected", lambda: {(): len(album_aggregator)})
+
+
+class AlbumPartFilter(Filter):
+    """Часть альбома обращения: пользователь ждет ввода обращения или альбом уже собирается"""
+
+    async def __call__(self, message: Message, state: FSMContext) -> bool:
+        if not message.media_group_id:
+            return False
+        # Сначала состояние, потом сборщик: первая часть добавляется в сборщик
+        # раньше, чем сбрасывается состояние, так что остальные части не потеряются
+        if await state.get_state() == AppealStates.waiting_for_appeal.state:
+            return True
+        return album_aggregator.seen(message.media_group_id)
+
+
+@appeals_router.message(AlbumPartFilter())
+async def album_part_handler(message: Message, state: FSMContext):
+    """Часть альбома обращения"""
+    first_part = await state.get_state() == AppealStates.waiting_for_appeal.state
+    accepted = album_aggregator.add(message)
+    # Остальные части альбома попадут сюда по media_group_id
+    await state.clear()
     
-    # Очищаем группу через 5 секунд
-    await asyncio.sleep(5)
-    if media_group_id in media_groups:
-        del media_groups[media_group_id]
+    if not accepted and first_part:
+        await message.answer("⏳ Сейчас слишком много обращений, отправьте альбом чуть позже.",
+                             reply_markup=get_main_menu())
 
 
 @appeals_router.message(AppealStates.waiting_for_appeal)
@@ -167,32 +167,7 @@ async def process_appeal_handler(message: Message, state: FSMContext):
     """Обработка обращения с медиа"""
     user = message.from_user
     
-    # Проверяем, это медиа-группа (альбом)?
-    if message.media_group_id:
-        # Если это первое сообщение из группы
-        if message.media_group_id not in media_groups:
-            media_groups[message.media_group_id] = {
-                "messages": [],
-                "user": user,
-                "state": state,
-                "processed": False
-            }
-        
-        # Добавляем сообщение в группу
-        media_groups[message.media_group_id]["messages"].append(message)
-        
-        # Отменяем предыдущую задачу если была
-        if message.media_group_id in processing_tasks:
-            processing_tasks[message.media_group_id].cancel()
-        
-        # Запускаем новую задачу обработки
-        processing_tasks[message.media_group_id] = asyncio.create_task(
-            process_media_group(message.media_group_id)
-        )
-        
-        return
-    
-    # Обычное сообщение (не альбом)
+    # Обычное сообщение (альбомы обрабатывает album_part_handler)
     media_type = None
     media_id = None
     text = message.text or message.caption or ""
@@ -217,7 +192,7 @@ async def process_appeal_handler(message: Message, state: FSMContext):
         media_id = message.voice.file_id
     
     # Создаем обращение
-    appeal_id = create_appeal(
+    appeal_id = await repo.create_appeal(
         user_id=user.id,
         username=user.username,
         first_name=user.first_name,
@@ -238,7 +213,8 @@ async def process_appeal_handler(message: Message, state: FSMContext):
     )
     
     # Отправляем админам
-    if ADMIN_IDS:
+    admin_ids = roles.snapshot.admins
+    if admin_ids:
         bot: Bot = message.bot
         admin_text = f"""📬 <b>Новое анонимное обращение #{appeal_id}</b>
 
@@ -251,35 +227,27 @@ async def process_appeal_handler(message: Message, state: FSMContext):
 Ответьте на это сообщение или используйте:
 /reply_{appeal_id}"""
 
-        for admin_id in ADMIN_IDS:
-            try:
-                # Отправляем с медиа если есть
-                admin_msg = None
-                if media_type == "photo":
-                    admin_msg = await bot.send_photo(admin_id, media_id, caption=admin_text, parse_mode="HTML")
-                elif media_type == "sticker":
-                    await bot.send_sticker(admin_id, media_id)
-                    admin_msg = await bot.send_message(admin_id, admin_text, parse_mode="HTML")
-                elif media_type == "animation":
-                    admin_msg = await bot.send_animation(admin_id, media_id, caption=admin_text, parse_mode="HTML")
-                elif media_type == "video":
-                    admin_msg = await bot.send_video(admin_id, media_id, caption=admin_text, parse_mode="HTML")
-                elif media_type == "document":
-                    admin_msg = await bot.send_document(admin_id, media_id, caption=admin_text, parse_mode="HTML")
-                elif media_type == "voice":
-                    admin_msg = await bot.send_voice(admin_id, media_id, caption=admin_text, parse_mode="HTML")
-                else:
-                    admin_msg = await bot.send_message(admin_id, admin_text, parse_mode="HTML")
-                
-                # Сохраняем message_id для reply
-                if admin_msg:
-                    from utils.database import load_appeals, save_appeals
-                    appeals_data = load_appeals()
-                    if "admin_message_ids" not in appeals_data[appeal_id]:
-                        appeals_data[appeal_id]["admin_message_ids"] = {}
-                    appeals_data[appeal_id]["admin_message_ids"][str(admin_id)] = admin_msg.message_id
-                    save_appeals(appeals_data)
-
-                logger.info(f"Обращение #{appeal_id} отправлено админу {admin_id}")
-            except Exception as e:
-                logger.error(f"Ошибка отправки обращения админу {admin_id}: {e}")
+        async def send_appeal(admin_id: int):
+            # Отправляем с медиа если есть
+            if media_type == "photo":
+                return await bot.send_photo(admin_id, media_id, caption=admin_text, parse_mode="HTML")
+            elif media_type == "animation":
+                return await bot.send_animation(admin_id, media_id, caption=admin_text, parse_mode="HTML")
+            elif media_type == "video":
+                return await bot.send_video(admin_id, media_id, caption=admin_text, parse_mode="HTML")
+            elif media_type == "document":
+                return await bot.send_document(admin_id, media_id, caption=admin_text, parse_mode="HTML")
+            elif media_type == "voice":
+                return await bot.send_voice(admin_id, media_id, caption=admin_text, parse_mode="HTML")
+            else:
+                return await bot.send_message(admin_id, admin_text, parse_mode="HTML")
+
+        if media_type == "sticker":
+            # Стикер без подписи: стикеры и текст — отдельные рассылки, чтобы повтор
+            # после RetryAfter не отправил админу стикер второй раз
+            await broadcast(admin_ids, lambda admin_id: bot.send_sticker(admin_id, media_id))
+
+        # Рассылаем всем админам параллельно и сохраняем message_id для reply одной записью
+        message_ids = await broadcast(admin_ids, send_appeal)
+        await repo.add_admin_message_ids(appeal_id, message_ids)
+        logger.info(f"Обращение #{appeal_id} отправлено {len(message_ids)} из {len(admin_ids)} админов")
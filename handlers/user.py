@@ -1,12 +1,12 @@
-from aiogram import Router, F
+from aiogram import Router, F, html
 from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from config import NEWS_TEXT, is_admin
-from utils.database import update_user_stats, get_stats_summary, get_student_achievements_summary
+from utils.repository import repo
 from utils.keyboards import get_main_menu
 
-user_router = Router()
+user_router = Router(name="user")
 
 
 @user_router.message(Command("start"))
@@ -14,7 +14,7 @@ async def start_handler(message: Message, state: FSMContext):
     """Приветствие"""
     await state.clear()
     user = message.from_user
-    update_user_stats(user.id, user.username, user.first_name)
+    await repo.update_user_stats(user.id, user.username, user.first_name)
     
     await message.answer(
         "👋 <b>Студсовет ФГУ</b>\n\n"
@@ -36,15 +36,53 @@ async def get_achievements_command(message: Message):
         return
 
     student_name = args[1]
-    summary = get_student_achievements_summary(student_name)
+    summary = await repo.get_student_achievements_summary(student_name)
     await message.answer(summary, parse_mode="HTML")
 
 
+TOP_LEVELS = {"бакалавриат": "Бакалавриат", "магистратура": "Магистратура"}
+TOP_USAGE = "Использование: <code>/top [Бакалавриат|Магистратура] [курс]</code>\nНапример: <code>/top Бакалавриат 2</code>"
+
+
+@user_router.message(Command("top"))
+async def top_command(message: Message, command: CommandObject):
+    """Рейтинг студентов по баллам, можно по уровню образования и курсу."""
+    education_level = course = None
+    for word in (command.args or "").split():
+        if word.lower() in TOP_LEVELS:
+            education_level = TOP_LEVELS[word.lower()]
+        elif word.isdigit():
+            course = word
+        else:
+            await message.answer(TOP_USAGE, parse_mode="HTML")
+            return
+
+    leaders = await repo.get_leaderboard(education_level, course)
+    scope = ", ".join(filter(None, [education_level, f"{course} курс" if course else None]))
+    title = f"🏆 <b>Рейтинг студентов{f' ({scope})' if scope else ''}</b>"
+    if not leaders:
+        await message.answer(f"{title}\n\nПодтвержденных достижений пока нет.", parse_mode="HTML")
+        return
+
+    lines = [title, ""]
+    place = 0
+    for i, leader in enumerate(leaders, 1):
+        # Равные баллы — одно место
+        if i == 1 or leader["points"] != leaders[i - 2]["points"]:
+            place = i
+        lines.append(
+            f"{place}. {html.quote(leader['student_name'])} — <b>{leader['points']}</b> "
+            f"({leader['education_level']}, {leader['course']} курс)"
+        )
+    lines.append("\nМесто конкретного студента: <code>/achievements ФИО</code>")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
 @user_router.message(F.text == "📰 Новость")
 async def news_handler(message: Message):
     """Новость"""
-    update_user_stats(message.from_user.id, message.from_user.username, 
-                     message.from_user.first_name)
+    await repo.update_user_stats(message.from_user.id, message.from_user.username, 
+                                 message.from_user.first_name)
     
     await message.answer(NEWS_TEXT, parse_mode="HTML", reply_markup=get_main_menu())
 
@@ -52,11 +90,11 @@ async def news_handler(message: Message):
 @user_router.message(F.text == "📊 Статистика")
 async def stats_handler(message: Message):
     """Статистика"""
-    update_user_stats(message.from_user.id, message.from_user.username,
-                     message.from_user.first_name)
+    await repo.update_user_stats(message.from_user.id, message.from_user.username,
+                                 message.from_user.first_name)
     
     try:
-        stats_text = get_stats_summary()
+        stats_text = await repo.get_stats_summary()
         await message.answer(stats_text, parse_mode="HTML", reply_markup=get_main_menu())
     except Exception as e:
         await message.answer("📊 Статистика временно недоступна", 
@@ -66,8 +104,8 @@ async def stats_handler(message: Message):
 @user_router.message(F.text == "ℹ️ Помощь")
 async def help_handler(message: Message):
     """Помощь"""
-    update_user_stats(message.from_user.id, message.from_user.username,
-                     message.from_user.first_name)
+    await repo.update_user_stats(message.from_user.id, message.from_user.username,
+                                 message.from_user.first_name)
     
     help_text = """<b>📖 Меню студсовета ФГУ</b>
 
@@ -76,6 +114,7 @@ async def help_handler(message: Message):
 • 📊 <i>Статистика</i> — данные о боте
 • /start — главное меню
 • /achievements [ФИО] - просмотр достижений студента
+• /top [уровень] [курс] - рейтинг студентов
 
 👨‍💻 <i>Студсовет ФГУ</i>"""
     
@@ -84,6 +123,7 @@ async def help_handler(message: Message):
         help_text += "• /add_achievement - добавить достижение\n"
         help_text += "• /pending_achievements - ожидающие подтверждения\n"
         help_text += "• /appeals — список обращений\n"
+        help_text += "• /search — поиск по обращениям\n"
         help_text += "• /view_XXXX — просмотр\n"
         help_text += "• /reply_XXXX — ответить"
     
@@ -93,8 +133,8 @@ async def help_handler(message: Message):
 @user_router.message()
 async def echo_handler(message: Message):
     """Неизвестная команда"""
-    update_user_stats(message.from_user.id, message.from_user.username,
-                     message.from_user.first_name)
+    await repo.update_user_stats(message.from_user.id, message.from_user.username,
+                                 message.from_user.first_name)
     
     await message.answer("❓ Неизвестная команда. Используйте меню:",
                         reply_markup=get_main_menu())
@@ -1,13 +1,29 @@
 import asyncio
 import logging
+from aiohttp import web
 from aiogram import Bot, Dispatcher
-from config import BOT_TOKEN, ADMIN_IDS, STATS_FILE, APPEALS_FILE, ROLES, ACHIEVEMENTS_FILE
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiogram.fsm.middleware import FSMContextMiddleware
+from config import (
+    BOT_TOKEN, DATABASE_FILE, BOT_MODE, roles, ROLES_RELOAD_INTERVAL, APPEALS_ARCHIVE_DAYS,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT,
+    METRICS_HOST, METRICS_PORT, TELEGRAM_API_URL, RECORD_UPDATES_FILE, RECORD_ANONYMIZE, RECORD_SALT,
+    THROTTLE_RATE,
+)
 from handlers.user import user_router
 from handlers.admin import admin_router
-# Мы убрали appeals_router, так как его функционал теперь в других файлах
-# from handlers.appeals import appeals_router 
+from handlers.appeals import appeals_router
 from handlers.achievements import achievements_router
-from utils.database import save_stats, save_appeals, save_achievements
+from utils.repository import repo
+from utils.fsm_storage import SQLiteStorage
+from utils.metrics import start_metrics_server
+from middlewares.metrics import APIMetricsMiddleware, setup_metrics
+from middlewares.tracing import SlowUpdateMiddleware, TracingRequestMiddleware
+from utils.roles import ROLE_NAMES
+from middlewares.throttling import ThrottlingMiddleware
+from middlewares.recording import Anonymizer, RecordingMiddleware, UpdateRecorder
 
 logging.basicConfig(
     level=logging.INFO,
@@ -16,48 +32,158 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-async def main():
-    """Запуск бота"""
-    logger.info("🚀 Запуск бота студсовета...")
-    
-    bot = Bot(token=BOT_TOKEN)
-    dp = Dispatcher()
-    
-    # --- ПРАВИЛЬНЫЙ ПОРЯДОК РЕГИСТРАЦИИ РОУТЕРОВ ---
-    # Сначала регистрируем роутеры с конкретными командами
-    dp.include_router(admin_router)
-    # dp.include_router(appeals_router) # appeals_router больше не используется
-    dp.include_router(achievements_router)
-    
-    # В САМОМ КОНЦЕ регистрируем роутер с обработчиком для всех остальных сообщений
-    dp.include_router(user_router)
-    
+async def on_startup(bot: Bot, dispatcher: Dispatcher):
+    """Подготовка перед приемом обновлений (общая для polling и webhook)"""
     try:
         bot_info = await bot.get_me()
         logger.info(f"✅ Бот: @{bot_info.username}")
-        if ADMIN_IDS:
+        if roles.snapshot.admins:
             logger.info("✅ Список администраторов загружен:")
-            for role, ids in ROLES.items():
+            for role, ids in roles.snapshot.roles.items():
                 if ids:
-                    logger.info(f"  - {role.replace('_', ' ').title()}: {', '.join(map(str, ids))}")
+                    logger.info(f"  - {ROLE_NAMES[role]}: {', '.join(map(str, sorted(ids)))}")
         else:
             logger.warning("⚠️ ID админов не установлены в .env файле!")
     except Exception as e:
         logger.error(f"❌ Ошибка получения информации о боте: {e}")
-    
-    # Создаем файлы данных, если они отсутствуют
-    if not STATS_FILE.exists():
-        save_stats({})
-        logger.info(f"Создан файл статистики: {STATS_FILE}")
-    if not APPEALS_FILE.exists():
-        save_appeals({})
-        logger.info(f"Создан файл обращений: {APPEALS_FILE}")
-    if not ACHIEVEMENTS_FILE.exists():
-        save_achievements([])
-        logger.info(f"Создан файл достижений: {ACHIEVEMENTS_FILE}")
-    
-    # Запуск polling
-    await dp.start_polling(bot)
+
+    # Создаем схему базы (и переносим старые JSON-файлы при первом запуске)
+    await repo.init()
+    logger.info(f"База данных: {DATABASE_FILE}")
+
+    # Периодический сброс статистики в базу
+    dispatcher["flush_task"] = asyncio.create_task(repo.run_stats_flusher())
+
+    # Перезагрузка ролей при изменении .env или файла ролей
+    if ROLES_RELOAD_INTERVAL:
+        dispatcher["roles_task"] = asyncio.create_task(roles.run_watcher(ROLES_RELOAD_INTERVAL))
+
+    # Перенос давно отвеченных обращений в архив
+    if APPEALS_ARCHIVE_DAYS:
+        dispatcher["archive_task"] = asyncio.create_task(repo.run_appeals_archiver())
+
+    if METRICS_PORT:
+        dispatcher["metrics_runner"] = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        logger.info(f"Метрики: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+    if BOT_MODE == "webhook" and WEBHOOK_URL:
+        await bot.set_webhook(
+            f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dispatcher.resolve_used_update_types(),
+        )
+        logger.info(f"✅ Вебхук установлен: {WEBHOOK_URL}{WEBHOOK_PATH}")
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    """Остановка: сбрасываем отложенные записи и закрываем базу.
+
+    Вебхук не удаляем: пока бот перезапускается, Telegram копит обновления у себя.
+    """
+    for task_name in ("flush_task", "roles_task", "archive_task"):
+        task = dispatcher.workflow_data.pop(task_name, None)
+        if task:
+            task.cancel()
+    metrics_runner = dispatcher.workflow_data.pop("metrics_runner", None)
+    if metrics_runner:
+        await metrics_runner.cleanup()
+    update_recorder = dispatcher.workflow_data.pop("update_recorder", None)
+    if update_recorder:
+        update_recorder.close()
+    # Состояния FSM пишутся пачками: сбрасываем последние до закрытия базы
+    # (после repo.close() запись заново подняла бы поток базы)
+    await dispatcher.fsm.storage.close()
+    await repo.close()
+
+
+def create_dispatcher() -> Dispatcher:
+    """Диспетчер со всеми роутерами и хуками запуска/остановки"""
+    # Состояния FSM хранятся в базе и переживают перезапуск
+    dp = Dispatcher(storage=SQLiteStorage())
+
+    # --- ПРАВИЛЬНЫЙ ПОРЯДОК РЕГИСТРАЦИИ РОУТЕРОВ ---
+    # Сначала регистрируем роутеры с конкретными командами
+    dp.include_router(admin_router)
+    dp.include_router(achievements_router)
+    # Анонимные обращения: кнопка меню и состояние ожидания текста обращения
+    dp.include_router(appeals_router)
+
+    # В САМОМ КОНЦЕ регистрируем роутер с обработчиком для всех остальных сообщений
+    dp.include_router(user_router)
+
+    # FSMContextMiddleware aiogram читает состояние из хранилища для каждого обновления:
+    # свои внешние middleware ставим перед ним, а его возвращаем последним
+    fsm_middleware = next(m for m in dp.update.outer_middleware if isinstance(m, FSMContextMiddleware))
+    dp.update.outer_middleware.unregister(fsm_middleware)
+
+    if RECORD_UPDATES_FILE:
+        # Запись входящих обновлений для воспроизведения — самой первой, чтобы
+        # в запись попадали и обновления, отброшенные антифлудом
+        anonymizer = Anonymizer(roles, salt=RECORD_SALT) if RECORD_ANONYMIZE else None
+        recorder = UpdateRecorder(RECORD_UPDATES_FILE, anonymizer)
+        dp.update.outer_middleware(RecordingMiddleware(recorder))
+        dp["update_recorder"] = recorder
+        logger.info(f"Запись обновлений: {RECORD_UPDATES_FILE}{' (анонимизированная)' if RECORD_ANONYMIZE else ''}")
+
+    if THROTTLE_RATE:
+        # Флуд отсекается сразу после записи: до метрик, FSM, обработчиков и хранилища
+        dp.update.outer_middleware(ThrottlingMiddleware())
+
+    # Счетчики и время обработки обновлений и обработчиков для /metrics
+    setup_metrics(dp)
+    # Разбивка времени медленных обновлений: хранилище, Bot API, свой код
+    dp.update.outer_middleware(SlowUpdateMiddleware())
+    dp.update.outer_middleware(fsm_middleware)
+
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+    return dp
+
+
+def create_app(bot: Bot, dp: Dispatcher) -> web.Application:
+    """aiohttp-приложение для webhook: принимает обновления POST-запросами на WEBHOOK_PATH"""
+    app = web.Application()
+    # Обновление обрабатывается в фоне, Telegram сразу получает 200
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    # Хуки диспетчера вызываются при запуске и остановке приложения
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Встроенный aiohttp-сервер для приема обновлений"""
+    runner = web.AppRunner(create_app(bot, dp))
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT)
+    await site.start()
+    logger.info(f"Webhook-сервер слушает http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
+
+
+async def main():
+    """Запуск бота"""
+    logger.info(f"🚀 Запуск бота студсовета ({BOT_MODE})...")
+
+    if TELEGRAM_API_URL:
+        # Свой сервер Bot API: локальный telegram-bot-api или фейк для нагрузочных тестов
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+        logger.info(f"Bot API: {TELEGRAM_API_URL}")
+    else:
+        session = None
+    bot = Bot(token=BOT_TOKEN, session=session)
+    bot.session.middleware(APIMetricsMiddleware())
+    bot.session.middleware(TracingRequestMiddleware())
+    dp = create_dispatcher()
+
+    if BOT_MODE == "webhook":
+        await run_webhook(bot, dp)
+    else:
+        # Запуск polling
+        await dp.start_polling(bot)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Dispatcher, Router
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from utils.metrics import counter, histogram
+from utils.tracing import current_trace
+
+UPDATES = counter("bot_updates_total", "Updates received", ("type",))
+UPDATE_DURATION = histogram("bot_update_duration_seconds", "Full update processing time", ("type",))
+UPDATE_ERRORS = counter("bot_update_errors_total", "Updates whose processing raised", ("type", "error"))
+
+HANDLED = counter("bot_handled_total", "Events handled by router", ("router", "type"))
+HANDLER_DURATION = histogram("bot_handler_duration_seconds", "Handler latency", ("router", "handler"))
+HANDLER_ERRORS = counter("bot_handler_errors_total", "Handlers that raised", ("router", "handler", "error"))
+
+API_DURATION = histogram("bot_api_request_duration_seconds", "Telegram Bot API call latency", ("method",))
+API_ERRORS = counter("bot_api_errors_total", "Failed Telegram Bot API calls", ("method", "error"))
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: количество по типам, полное время обработки и ошибки"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        update_type = event.event_type
+        UPDATES.inc(type=update_type)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            UPDATE_ERRORS.inc(type=update_type, error=type(e).__name__)
+            raise
+        finally:
+            UPDATE_DURATION.observe(time.perf_counter() - started, type=update_type)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Внутренний middleware роутера: время работы конкретного обработчика"""
+
+    def __init__(self, router_name: str, event_type: str):
+        self.router_name = router_name
+        self.event_type = event_type
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        handler_name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        HANDLED.inc(router=self.router_name, type=self.event_type)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.handler = f"{self.router_name}.{handler_name}"
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.inc(router=self.router_name, handler=handler_name, error=type(e).__name__)
+            raise
+        finally:
+            HANDLER_DURATION.observe(time.perf_counter() - started,
+                                     router=self.router_name, handler=handler_name)
+
+
+class APIMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: задержка вызовов Bot API по методам"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        api_method = method.__api_method__
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            API_ERRORS.inc(method=api_method, error=type(e).__name__)
+            raise
+        finally:
+            API_DURATION.observe(time.perf_counter() - started, method=api_method)
+
+
+def _routers(router: Router):
+    yield router
+    for sub_router in router.sub_routers:
+        yield from _routers(sub_router)
+
+
+def setup_metrics(dp: Dispatcher) -> None:
+    """Подключает middleware метрик к диспетчеру и всем роутерам"""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    for router in _routers(dp):
+        if router is dp:
+            continue
+        for event_type in ("message", "callback_query"):
+            router.observers[event_type].middleware(HandlerMetricsMiddleware(router.name, event_type))
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from utils.roles import RoleRegistry
+
+logger = logging.getLogger(__name__)
+
+# Поля с именами, которые заменяются при анонимизации
+NAME_FIELDS = ("first_name", "last_name", "username")
+CHAT_TYPES = ("private", "group", "supergroup", "channel")
+
+
+class Anonymizer:
+    """Детерминированно заменяет id и имена пользователей и чатов.
+
+    Один и тот же id дает один и тот же псевдоним, пока не меняется соль,
+    так что диалоги и состояния FSM при воспроизведении сохраняются. Соль
+    задается в .env (RECORD_SALT) и в запись не попадает: зная ее, псевдонимы
+    можно обратить перебором id. Без соли берется случайная, и псевдонимы
+    меняются при каждом перезапуске. id админов из roles не меняются, иначе
+    воспроизведение не пройдет по админским обработчикам; их имена заменяются.
+    Админы берутся из текущего набора ролей, так что перезагрузка ролей
+    учитывается сразу.
+    """
+
+    def __init__(self, roles: Optional[RoleRegistry] = None, salt: str = ""):
+        self.roles = roles
+        if salt:
+            self._salt = hashlib.blake2b(salt.encode("utf-8"), digest_size=16).digest()
+        else:
+            logger.warning("RECORD_SALT не задан: псевдонимы в записи сменятся после перезапуска бота")
+            self._salt = os.urandom(16)
+
+    def _hash(self, value: str) -> int:
+        digest = hashlib.blake2b(value.encode("utf-8"), key=self._salt, digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def user_id(self, user_id: int) -> int:
+        if self.roles is not None and self.roles.is_admin(user_id):
+            return user_id
+        # Положительные id — пользователи и личные чаты, отрицательные — группы
+        alias = 10 ** 9 + self._hash(str(abs(user_id))) % 10 ** 9
+        return alias if user_id > 0 else -alias
+
+    def __call__(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        # Объекты User и Chat: у первого есть is_bot, у второго type
+        is_peer = "id" in value and ("is_bot" in value or value.get("type") in CHAT_TYPES)
+        result = {}
+        for key, item in value.items():
+            if is_peer and key == "id" and isinstance(item, int):
+                result[key] = self.user_id(item)
+            elif key in ("user_id", "chat_id") and isinstance(item, int):
+                result[key] = self.user_id(item)
+            elif key in NAME_FIELDS and isinstance(item, str):
+                result[key] = f"{key}_{self._hash(item) % 10 ** 6:06d}"
+            else:
+                result[key] = self(item)
+        return result
+
+
+class UpdateRecorder:
+    """Дописывает обновления в JSONL: {"t": время прихода (unix), "u": Update}"""
+
+    def __init__(self, path: Path, anonymizer: Anonymizer = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Буферизованная запись: на диск уходит блоками, остаток — в close()
+        self._file = open(self.path, "a", encoding="utf-8", buffering=64 * 1024)
+        self.anonymizer = anonymizer
+        self.recorded = 0
+
+    def record(self, update: Update, arrived: float) -> None:
+        data = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+        if self.anonymizer is not None:
+            data = self.anonymizer(data)
+        self._file.write(json.dumps({"t": round(arrived, 6), "u": data},
+                                    ensure_ascii=False, separators=(",", ":")) + "\n")
+        self.recorded += 1
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+            logger.info(f"Записано обновлений: {self.recorded} в {self.path}")
+
+
+class RecordingMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: пишет каждое входящее обновление в запись"""
+
+    def __init__(self, recorder: UpdateRecorder):
+        self.recorder = recorder
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            self.recorder.record(event, time.time())
+        except Exception as e:
+            # Запись — вспомогательная, обработку обновления она не ломает
+            logger.error(f"Ошибка записи обновления {event.update_id}: {e}")
+        return await handler(event, data)
@@ -0,0 +1,102 @@
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update, User
+
+from config import (
+    THROTTLE_RATE, THROTTLE_BURST, THROTTLE_ADMIN_RATE, THROTTLE_ADMIN_BURST, THROTTLE_MAX_USERS, is_admin,
+)
+from utils.metrics import counter
+from utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+THROTTLED = counter("bot_throttled_total", "Updates dropped by per-user throttling", ("type",))
+
+THROTTLE_NOTICE = "⏳ Слишком много сообщений. Подождите немного и попробуйте снова."
+
+
+@dataclass
+class _UserLimit:
+    bucket: TokenBucket
+    # Предупреждение уже отправлено, до первого пропущенного обновления молчим
+    notified: bool = False
+    # Альбом приходит пачкой сообщений: токен списывается за первую часть
+    last_media_group: Optional[str] = None
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: ведро токенов на пользователя.
+
+    Сверх лимита пользователь один раз получает предупреждение, дальше его
+    обновления отбрасываются до FSM, обработчиков и хранилища, пока не
+    накопится токен (нажатия кнопок при этом молча подтверждаются).
+    Состояние хранится для max_users последних пользователей (LRU):
+    вытесненный пользователь просто начинает с полного ведра.
+    """
+
+    def __init__(self, rate: float = THROTTLE_RATE, burst: float = THROTTLE_BURST,
+                 admin_rate: float = THROTTLE_ADMIN_RATE, admin_burst: float = THROTTLE_ADMIN_BURST,
+                 max_users: int = THROTTLE_MAX_USERS):
+        self.rate = rate
+        self.burst = burst
+        self.admin_rate = admin_rate
+        self.admin_burst = admin_burst
+        self.max_users = max_users
+        self._limits: "OrderedDict[int, _UserLimit]" = OrderedDict()
+
+    def _limit_for(self, user_id: int) -> _UserLimit:
+        rate, burst = ((self.admin_rate, self.admin_burst) if is_admin(user_id)
+                       else (self.rate, self.burst))
+        limit = self._limits.get(user_id)
+        # Новая запись или сменилась роль пользователя после перезагрузки ролей
+        if limit is None or limit.bucket.rate != rate:
+            limit = _UserLimit(TokenBucket(rate, burst))
+            self._limits[user_id] = limit
+            if len(self._limits) > self.max_users:
+                self._limits.popitem(last=False)
+        self._limits.move_to_end(user_id)
+        return limit
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is None or event.event_type not in ("message", "callback_query"):
+            return await handler(event, data)
+
+        limit = self._limit_for(user.id)
+        media_group_id = event.message.media_group_id if event.message else None
+        if media_group_id and media_group_id == limit.last_media_group:
+            return await handler(event, data)
+        if limit.bucket.try_acquire():
+            limit.notified = False
+            limit.last_media_group = media_group_id
+            return await handler(event, data)
+
+        if limit.notified:
+            THROTTLED.inc(type="dropped")
+            if event.callback_query:
+                # Без ответа кнопка у клиента крутится до таймаута Telegram
+                try:
+                    await event.callback_query.answer()
+                except Exception as e:
+                    logger.error(f"Не удалось ответить на callback {user.id}: {e}")
+            return None
+        limit.notified = True
+        THROTTLED.inc(type="notice")
+        logger.info(f"Пользователь {user.id} превысил лимит сообщений, обновления отбрасываются")
+        try:
+            if event.callback_query:
+                await event.callback_query.answer(THROTTLE_NOTICE)
+            else:
+                await event.message.answer(THROTTLE_NOTICE)
+        except Exception as e:
+            logger.error(f"Не удалось предупредить {user.id} о лимите: {e}")
+        return None
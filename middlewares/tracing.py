@@ -0,0 +1,64 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from config import SLOW_UPDATE_THRESHOLD
+from utils.tracing import UpdateTrace, current_trace
+
+logger = logging.getLogger(__name__)
+
+
+class SlowUpdateMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: логирует обработку дольше threshold секунд
+    с разбивкой на хранилище, Bot API и собственный код обработчика"""
+
+    def __init__(self, threshold: float = SLOW_UPDATE_THRESHOLD):
+        self.threshold = threshold
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        trace = UpdateTrace()
+        token = current_trace.set(trace)
+        try:
+            return await handler(event, data)
+        finally:
+            current_trace.reset(token)
+            elapsed = time.perf_counter() - trace.started
+            if elapsed >= self.threshold:
+                own_time = max(0.0, elapsed - trace.storage_time - trace.api_time)
+                logger.warning(
+                    f"Медленное обновление {event.update_id} ({event.event_type}, "
+                    f"{trace.handler or 'без обработчика'}): {elapsed:.3f} с — "
+                    f"хранилище {trace.storage_time:.3f} с ({trace.storage_calls} вызовов), "
+                    f"Bot API {trace.api_time:.3f} с ({trace.api_calls} вызовов), "
+                    f"свой код {own_time:.3f} с"
+                )
+
+
+class TracingRequestMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: добавляет время вызовов Bot API к трассировке обновления"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        trace = current_trace.get()
+        if trace is None:
+            return await make_request(bot, method)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            trace.add_api(time.perf_counter() - started)
@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Корень репозитория — в путь импорта; config читает окружение при импорте,
+# поэтому токен и папка данных задаются до первого импорта модулей бота
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("BOT_TOKEN", "0:test")
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bot-tests-")
+os.environ["ROLES_FILE"] = ""
+
+
+@pytest.fixture
+def database_files(tmp_path, monkeypatch):
+    """Модуль utils.database, направленный на файлы в tmp_path; схема еще не создана"""
+    from utils import database
+
+    database.close_db()
+    monkeypatch.setattr(database, "DATABASE_FILE", tmp_path / "bot.sqlite3")
+    monkeypatch.setattr(database, "ARCHIVE_DIR", tmp_path / "archive")
+    monkeypatch.setattr(database, "STATS_FILE", tmp_path / "user_stats.json")
+    monkeypatch.setattr(database, "APPEALS_FILE", tmp_path / "appeals.json")
+    monkeypatch.setattr(database, "ACHIEVEMENTS_FILE", tmp_path / "achievements.json")
+    yield database
+    database.close_db()
+
+
+@pytest.fixture
+def db(database_files):
+    """Пустая база бота (схема создана, индексы в памяти загружены)"""
+    database_files.init_db()
+    return database_files
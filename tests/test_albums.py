@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+from utils.albums import AlbumAggregator
+
+
+def part(group_id, message_id, chat_id=1, caption=None):
+    """Часть альбома: только поля, которые читает AlbumAggregator"""
+    return SimpleNamespace(
+        media_group_id=group_id, message_id=message_id, caption=caption, bot=None,
+        chat=SimpleNamespace(id=chat_id),
+        from_user=SimpleNamespace(id=chat_id, username="student", first_name="Анна"),
+        photo=[SimpleNamespace(file_id=f"small-{message_id}"), SimpleNamespace(file_id=f"photo-{message_id}")],
+    )
+
+
+def collect(**kwargs):
+    completed = []
+
+    async def on_complete(album):
+        completed.append(album)
+
+    return AlbumAggregator(on_complete, tick=0.01, **kwargs), completed
+
+
+def test_parts_are_joined_after_pause():
+    async def scenario():
+        aggregator, completed = collect(debounce=0.05)
+        for message_id in (12, 10, 11):
+            assert aggregator.add(part("g1", message_id, caption="Подпись" if message_id == 11 else None))
+            await asyncio.sleep(0.01)
+        assert completed == []
+        await asyncio.sleep(0.2)
+        return aggregator, completed
+
+    aggregator, completed = asyncio.run(scenario())
+    assert len(completed) == 1
+    assert completed[0].photo_ids == ["photo-10", "photo-11", "photo-12"]
+    assert completed[0].caption == "Подпись"
+    assert len(aggregator) == 0 and aggregator.seen("g1")
+
+
+def test_full_album_completes_without_waiting():
+    async def scenario():
+        aggregator, completed = collect(debounce=5, max_parts=3)
+        for message_id in range(3):
+            aggregator.add(part("g1", message_id))
+        await asyncio.sleep(0.05)
+        return aggregator, completed
+
+    aggregator, completed = asyncio.run(scenario())
+    assert len(completed) == 1
+    assert aggregator.counters["early"] == 1
+
+
+def test_albums_over_limit_are_rejected():
+    async def scenario():
+        aggregator, completed = collect(debounce=0.05, max_groups=1)
+        assert aggregator.add(part("g1", 1))
+        assert not aggregator.add(part("g2", 2, chat_id=2))
+        # Остальные части отклоненного альбома тоже не принимаются
+        assert not aggregator.add(part("g2", 3, chat_id=2))
+        await asyncio.sleep(0.2)
+        return aggregator, completed
+
+    aggregator, completed = asyncio.run(scenario())
+    assert [album.media_group_id for album in completed] == ["g1"]
+    assert aggregator.counters["rejected"] == 1
+
+
+def test_late_part_splits_album_and_records_gap():
+    async def scenario():
+        aggregator, completed = collect(debounce=0.05, min_debounce=0.05)
+        aggregator.add(part("g1", 1))
+        await asyncio.sleep(0.15)
+        aggregator.add(part("g1", 2))
+        await asyncio.sleep(0.3)
+        return aggregator, completed
+
+    aggregator, completed = asyncio.run(scenario())
+    assert [album.photo_ids for album in completed] == [["photo-1"], ["photo-2"]]
+    assert aggregator.counters["split"] == 1
+    assert aggregator._chat_gaps[1][0] >= 0.1
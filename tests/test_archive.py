@@ -0,0 +1,80 @@
+import gzip
+import json
+
+import pytest
+
+
+def answered_appeal(db, text, answer="Ответ", message_ids=None):
+    appeal_id = db.create_appeal(100, "student", "Анна", text)
+    if message_ids:
+        db.add_admin_message_ids(appeal_id, message_ids)
+    db.answer_appeal(appeal_id, answer)
+    return appeal_id
+
+
+def test_archived_appeal_round_trip(db):
+    archived_id = answered_appeal(db, "Сломались душевые", "Починили", {1: 501, 2: 601})
+    kept_id = db.create_appeal(101, None, "Борис", "Нет горячей воды")
+
+    assert db.archive_answered_appeals("9999-12-31") == 1
+
+    appeal = db.get_appeal(archived_id)
+    assert appeal["archived"] is True
+    assert appeal["text"] == "Сломались душевые"
+    assert appeal["answer"] == "Починили"
+    assert appeal["admin_message_ids"] == {"1": 501, "2": 601}
+    assert "archived" not in db.get_appeal(kept_id)
+
+    conn = db.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM appeals").fetchone()[0] == 1
+    assert conn.execute("SELECT COUNT(*) FROM appeal_messages").fetchone()[0] == 0
+    # В поиск архивные обращения не попадают, ответ на старое сообщение находит архив
+    assert db.search_appeals("душевые") == []
+    assert db.get_appeal_by_message_id(501, 1) is None
+    assert db._appeal_queue.counts.get("archived") == 1
+    assert db._appeal_queue.total == 2
+
+
+def test_segment_is_readable_as_plain_gzip(db):
+    first = answered_appeal(db, "Первое")
+    second = answered_appeal(db, "Второе")
+    db.archive_answered_appeals("9999-12-31", limit=1)
+    db.archive_answered_appeals("9999-12-31", limit=1)
+
+    segments = list(db.ARCHIVE_DIR.glob("appeals-*.jsonl.gz"))
+    assert len(segments) == 1
+    # Блоки склеиваются в обычный gzip-поток (его читает zcat)
+    with gzip.open(segments[0], "rt", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert [record["appeal_id"] for record in records] == [first, second]
+    assert db.get_appeal(second)["text"] == "Второе"
+
+
+def test_only_old_answered_appeals_are_archived(db):
+    answered_id = answered_appeal(db, "Отвеченное")
+    new_id = db.create_appeal(101, None, "Борис", "Новое")
+
+    assert db.archive_answered_appeals("2000-01-01") == 0
+    assert db.archive_answered_appeals("9999-12-31") == 1
+    assert db.get_appeal(answered_id)["archived"] is True
+    assert db.get_appeal(new_id)["status"] == "new"
+
+
+def test_appeals_stay_in_database_if_segment_is_not_synced(db, monkeypatch):
+    appeal_id = answered_appeal(db, "Сломались душевые", message_ids={1: 501})
+
+    def failing_fsync(fd):
+        raise OSError("диск отвалился")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(db.os, "fsync", failing_fsync)
+        with pytest.raises(OSError):
+            db.archive_answered_appeals("9999-12-31")
+
+    appeal = db.get_appeal(appeal_id)
+    assert "archived" not in appeal
+    assert appeal["admin_message_ids"] == {"1": 501}
+    conn = db.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM appeals_archive").fetchone()[0] == 0
+    assert [a["appeal_id"] for a in db.search_appeals("душевые")] == [appeal_id]
+    assert db.get_appeal_by_message_id(501, 1)[0] == appeal_id
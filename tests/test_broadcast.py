@@ -0,0 +1,63 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from utils import broadcast as broadcast_module
+from utils.broadcast import broadcast
+from utils.ratelimit import TokenBucket
+
+
+def test_bucket_spends_burst_then_refills():
+    bucket = TokenBucket(rate=100, capacity=3)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    time.sleep(0.02)
+    assert bucket.try_acquire()
+    # Запрос больше запаса урезается до capacity, иначе он ждал бы вечно
+    bucket.reset(rate=100, capacity=3)
+    assert bucket.try_acquire(10)
+
+
+def test_paused_bucket_waits_before_handing_out_tokens():
+    async def scenario():
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.2)
+        assert not bucket.try_acquire()
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.19
+
+
+def test_broadcast_retries_after_flood_control(monkeypatch):
+    monkeypatch.setattr(broadcast_module, "broadcast_bucket", TokenBucket(rate=1000, capacity=10))
+    attempts = {}
+
+    async def send(chat_id):
+        attempts[chat_id] = attempts.get(chat_id, 0) + 1
+        if chat_id == 2 and attempts[chat_id] == 1:
+            raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text="x"), "Flood control", retry_after=1)
+        if chat_id == 3:
+            raise RuntimeError("bot was blocked by the user")
+        return SimpleNamespace(message_id=100 + chat_id)
+
+    started = time.monotonic()
+    delivered = asyncio.run(broadcast([1, 2, 3], send))
+
+    assert delivered == {1: 101, 2: 102}
+    assert attempts == {1: 1, 2: 2, 3: 1}
+    # Повтор ушел только после паузы, которую попросил Telegram
+    assert time.monotonic() - started >= 1
+
+
+def test_broadcast_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(broadcast_module, "broadcast_bucket", TokenBucket(rate=1000, capacity=10))
+
+    async def send(chat_id):
+        raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text="x"), "Flood control", retry_after=0)
+
+    assert asyncio.run(broadcast([1], send, max_retries=2)) == {}
@@ -0,0 +1,77 @@
+import csv
+import zipfile
+from xml.etree import ElementTree
+
+import pytest
+
+from utils import export
+
+NS = {"x": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+
+
+def read_xlsx(path):
+    """Строки первого листа: числа — числами, строки — текстом, пустые ячейки — None"""
+    with zipfile.ZipFile(path) as archive:
+        assert {"[Content_Types].xml", "xl/workbook.xml", "xl/styles.xml"} <= set(archive.namelist())
+        root = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+    rows = []
+    for row in root.iterfind(".//x:sheetData/x:row", NS):
+        values = []
+        for cell in row.iterfind("x:c", NS):
+            if cell.get("t") == "inlineStr":
+                values.append(cell.find("x:is/x:t", NS).text or "")
+            elif cell.find("x:v", NS) is not None:
+                values.append(int(cell.find("x:v", NS).text))
+            else:
+                values.append(None)
+        rows.append(values)
+    return rows
+
+
+@pytest.fixture
+def approved(db, monkeypatch):
+    monkeypatch.setattr(export, "DATABASE_FILE", db.DATABASE_FILE)
+    for name, description, points in [("Иванов Иван", "Олимпиада <финал> & приз\x01", 10),
+                                      ("Иванов Иван", "Конференция", 5),
+                                      ("Петров Петр", "Хакатон", 7)]:
+        achievement_id = db.create_achievement(1, "Куратор", "curator", name, description, points, "2", "bachelor")
+        db.update_achievement_status(achievement_id, "approved", 2, "Админ")
+    db.create_achievement(1, "Куратор", "curator", "Сидоров Сидор", "Заявка", 3, "1", "master")
+    return db
+
+
+def test_xlsx_export_streams_approved_achievements(approved, monkeypatch):
+    # Пачки меньше числа строк: выгрузка собирается из нескольких fetchmany
+    monkeypatch.setattr(export, "FETCH_SIZE", 2)
+    path, count = export.build_export("achievements", "xlsx")
+    try:
+        rows = read_xlsx(path)
+    finally:
+        path.unlink()
+
+    assert count == 3
+    assert rows[0] == export.EXPORT_KINDS["achievements"][1]
+    assert [(row[0], row[3], row[4]) for row in rows[1:]] == [
+        ("Иванов Иван", "Олимпиада <финал> & приз", 10),
+        ("Иванов Иван", "Конференция", 5),
+        ("Петров Петр", "Хакатон", 7),
+    ]
+
+
+def test_csv_totals_export(approved):
+    path, count = export.build_export("totals", "csv")
+    try:
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.reader(f))
+    finally:
+        path.unlink()
+
+    assert count == 2
+    assert rows[1:] == [["Иванов Иван", "bachelor", "2", "15", "2"], ["Петров Петр", "bachelor", "2", "7", "1"]]
+
+
+def test_export_args():
+    assert export.parse_export_args("") == ("achievements", "xlsx")
+    assert export.parse_export_args("CSV totals") == ("totals", "csv")
+    with pytest.raises(ValueError):
+        export.parse_export_args("pdf")
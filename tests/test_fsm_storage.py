@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+
+from utils.fsm_storage import SQLiteStorage
+from utils.repository import repo
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+def run(scenario):
+    """Сценарий в своем цикле событий; поток базы останавливается в конце"""
+    async def wrapper():
+        try:
+            await scenario()
+        finally:
+            await repo.close()
+    asyncio.run(wrapper())
+
+
+def test_state_survives_close_and_reopen(db):
+    async def scenario():
+        # Фоновая запись не успеет сработать: сохранить должен close()
+        storage = SQLiteStorage(flush_interval=60)
+        await storage.set_state(key(10), "AddAchievement:waiting_for_points")
+        await storage.set_data(key(10), {"student_name": "Иванов Иван", "course": "2"})
+        await storage.close()
+
+        reopened = SQLiteStorage(flush_interval=60)
+        assert await reopened.get_state(key(10)) == "AddAchievement:waiting_for_points"
+        assert await reopened.get_data(key(10)) == {"student_name": "Иванов Иван", "course": "2"}
+        await reopened.close()
+
+    run(scenario)
+
+
+def test_cleared_state_is_deleted_from_database(db):
+    async def scenario():
+        storage = SQLiteStorage(flush_interval=60)
+        await storage.set_state(key(10), "AdminStates:waiting_for_reply")
+        await storage.flush()
+        await storage.set_state(key(10), None)
+        await storage.close()
+
+        assert db.get_connection().execute("SELECT COUNT(*) FROM fsm_states").fetchone()[0] == 0
+        reopened = SQLiteStorage(flush_interval=60)
+        assert await reopened.get_state(key(10)) is None
+        await reopened.close()
+
+    run(scenario)
+
+
+def test_lru_evicts_only_flushed_records(db):
+    async def scenario():
+        storage = SQLiteStorage(cache_size=2, flush_interval=60, flush_threshold=1000)
+        for user_id in range(1, 6):
+            await storage.set_state(key(user_id), f"state{user_id}")
+        # Несохраненные записи вытеснять нельзя — иначе изменения потеряются
+        assert len(storage._cache) == 5
+
+        await storage.flush()
+        assert len(storage._cache) == 2
+        # Вытесненная запись читается из базы
+        assert await storage.get_state(key(1)) == "state1"
+        await storage.close()
+
+    run(scenario)
+
+
+def test_threshold_triggers_flush(db):
+    async def scenario():
+        storage = SQLiteStorage(flush_interval=60, flush_threshold=3)
+        for user_id in range(1, 4):
+            await storage.set_state(key(user_id), "state")
+        await asyncio.sleep(0.1)
+        assert not storage._dirty
+        assert db.get_connection().execute("SELECT COUNT(*) FROM fsm_states").fetchone()[0] == 3
+        await storage.close()
+
+    run(scenario)
+
+
+def test_expired_state_reads_as_empty(db):
+    async def scenario():
+        storage = SQLiteStorage(ttl=0.2, flush_interval=60)
+        await storage.set_state(key(10), "state")
+        await storage.set_data(key(10), {"a": 1})
+        await storage.close()
+        time.sleep(0.3)
+
+        # Из кэша
+        assert await storage.get_state(key(10)) is None
+        assert await storage.get_data(key(10)) == {}
+        # Из базы
+        reopened = SQLiteStorage(ttl=0.2, flush_interval=60)
+        assert await reopened.get_state(key(10)) is None
+        await reopened.close()
+
+    run(scenario)
@@ -0,0 +1,166 @@
+import json
+import sqlite3
+
+# Схема версии 3: обращения и достижения с TEXT PRIMARY KEY без seq, рейтинг на rowid
+SCHEMA_V3 = """
+CREATE TABLE appeals (
+    appeal_id TEXT PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    username TEXT,
+    first_name TEXT,
+    text TEXT NOT NULL DEFAULT '',
+    media_type TEXT,
+    media_id TEXT,
+    created_at TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'new',
+    answer TEXT,
+    answer_media_type TEXT,
+    answer_media_id TEXT,
+    answered_at TEXT
+);
+CREATE TABLE appeal_messages (
+    admin_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    appeal_id TEXT NOT NULL REFERENCES appeals (appeal_id) ON DELETE CASCADE,
+    PRIMARY KEY (admin_id, message_id)
+);
+CREATE TABLE achievements (
+    id TEXT PRIMARY KEY,
+    reporter_id INTEGER NOT NULL,
+    reporter_name TEXT,
+    reporter_role TEXT,
+    student_name TEXT NOT NULL,
+    student_key TEXT NOT NULL,
+    education_level TEXT,
+    course TEXT,
+    description TEXT,
+    points INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TEXT NOT NULL,
+    approver_id INTEGER,
+    approver_name TEXT,
+    approved_at TEXT
+);
+CREATE TABLE student_points (
+    student_key TEXT PRIMARY KEY,
+    student_name TEXT NOT NULL,
+    education_level TEXT,
+    course TEXT,
+    points INTEGER NOT NULL,
+    approved INTEGER NOT NULL,
+    last_rowid INTEGER NOT NULL
+);
+CREATE TABLE sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE VIRTUAL TABLE appeals_search USING fts5 (text, answer);
+"""
+
+
+def create_v3_database(path):
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA_V3)
+    conn.executemany(
+        "INSERT INTO appeals (appeal_id, user_id, first_name, text, created_at, status, answer, answered_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            ("0001", 100, "Анна", "Сломались душевые в общежитии", "2024-01-01T10:00:00",
+             "answered", "Починили", "2024-01-02T10:00:00"),
+            ("0002", 101, "Борис", "Нет горячей воды", "2024-01-03T10:00:00", "new", None, None),
+        ]
+    )
+    conn.executemany(
+        "INSERT INTO appeal_messages (admin_id, message_id, appeal_id) VALUES (?, ?, ?)",
+        [(1, 501, "0001"), (2, 601, "0001"), (1, 502, "0002")]
+    )
+    conn.executemany(
+        "INSERT INTO achievements (id, reporter_id, student_name, student_key, education_level, course, "
+        "description, points, status, created_at) VALUES (?, 1, ?, ?, 'bachelor', '2', ?, ?, ?, ?)",
+        [
+            ("a1", "Иванов Иван", "иванов иван", "Олимпиада", 10, "approved", "2024-01-01T10:00:00"),
+            ("a2", "Иванов Иван", "иванов иван", "Конференция", 5, "approved", "2024-01-02T10:00:00"),
+            ("a3", "Петров Петр", "петров петр", "Хакатон", 7, "pending", "2024-01-03T10:00:00"),
+        ]
+    )
+    conn.execute(
+        "INSERT INTO student_points VALUES ('иванов иван', 'Иванов Иван', 'bachelor', '2', 15, 2, 2)"
+    )
+    conn.execute("INSERT INTO sequences (name, value) VALUES ('appeals', 2)")
+    conn.execute("PRAGMA user_version = 3")
+    conn.commit()
+    conn.close()
+
+
+def columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def test_v3_database_is_migrated_to_seq_keys(database_files):
+    db = database_files
+    create_v3_database(db.DATABASE_FILE)
+
+    db.init_db()
+    conn = db.get_connection()
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+    assert columns(conn, "appeals")[0] == "seq"
+    assert columns(conn, "achievements")[0] == "seq"
+    assert "last_seq" in columns(conn, "student_points")
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    # Старый rowid стал seq: порядок строк сохранен
+    assert [tuple(row) for row in conn.execute("SELECT seq, appeal_id FROM appeals ORDER BY seq")] == [
+        (1, "0001"), (2, "0002")
+    ]
+
+    appeal = db.get_appeal("0001")
+    assert appeal["answer"] == "Починили"
+    assert appeal["admin_message_ids"] == {"1": 501, "2": 601}
+    assert db.get_appeal_by_message_id(502, 1)[0] == "0002"
+
+    # Поисковый индекс пересобран по новым ключам
+    assert [a["appeal_id"] for a in db.search_appeals("душевая")] == ["0001"]
+
+    # Рейтинг пересобран по подтвержденным достижениям
+    leaderboard = db.get_leaderboard()
+    assert [(row["student_name"], row["points"]) for row in leaderboard] == [("Иванов Иван", 15)]
+
+    # Счетчик ID продолжается после существующих обращений
+    assert db.create_appeal(102, None, "Вера", "Новое обращение") == "0003"
+
+
+def test_migration_is_idempotent(database_files):
+    db = database_files
+    create_v3_database(db.DATABASE_FILE)
+    db.init_db()
+    db.close_db()
+
+    db.init_db()
+    conn = db.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM appeals").fetchone()[0] == 2
+    assert conn.execute("SELECT COUNT(*) FROM appeal_messages").fetchone()[0] == 3
+    assert conn.execute("SELECT COUNT(*) FROM achievements").fetchone()[0] == 3
+
+
+def test_json_stores_are_imported_on_first_start(database_files):
+    db = database_files
+    db.STATS_FILE.write_text(json.dumps({
+        "100": {"first_name": "Анна", "username": "anna", "messages_count": 3,
+                "first_seen": "2024-01-01T10:00:00", "last_seen": "2024-01-05T10:00:00"},
+    }), encoding="utf-8")
+    db.APPEALS_FILE.write_text(json.dumps({
+        "0007": {"user_id": 100, "first_name": "Анна", "text": "Вопрос", "created_at": "2024-01-01T10:00:00",
+                 "status": "new", "admin_message_id": 900, "admin_message_ids": {"1": 901}},
+    }), encoding="utf-8")
+    db.ACHIEVEMENTS_FILE.write_text(json.dumps([
+        {"id": "x1", "reporter_id": 1, "student_name": "Иванов  Иван", "points": 3,
+         "status": "approved", "created_at": "2024-01-01T10:00:00"},
+    ]), encoding="utf-8")
+
+    db.init_db()
+
+    appeal = db.get_appeal("0007")
+    assert appeal["text"] == "Вопрос"
+    assert appeal["admin_message_ids"] == {"1": 901}
+    # Старое одиночное поле admin_message_id ищется без чата админа
+    assert db.get_appeal_by_message_id(900)[0] == "0007"
+    assert db.get_achievement("x1")["points"] == 3
+    assert db.get_leaderboard()[0]["points"] == 3
+    assert db.create_appeal(100, "anna", "Анна", "Еще вопрос") == "0008"
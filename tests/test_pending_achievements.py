@@ -0,0 +1,48 @@
+from handlers.achievements import MESSAGE_LIMIT, render_pending_page
+
+
+def add_pending(db, count, description="Олимпиада"):
+    return [
+        db.create_achievement(1, "Куратор", "curator", f"Студент {n}", description, n, "1", "bachelor")
+        for n in range(count)
+    ]
+
+
+def test_keyset_pages_follow_insertion_order(db):
+    ids = add_pending(db, 7)
+
+    page, total, prev_cursor, next_cursor = db.get_pending_achievements_page(limit=3)
+    assert [a["id"] for a in page] == ids[:3]
+    assert (total, prev_cursor) == (7, None)
+
+    page, _, prev_cursor, next_cursor = db.get_pending_achievements_page(next_cursor, "next", limit=3)
+    assert [a["id"] for a in page] == ids[3:6]
+
+    # Заявку с текущей страницы подтвердили — листание назад не сбивается
+    db.update_achievement_status(ids[4], "approved", 2, "Админ")
+    page, total, prev_cursor, _ = db.get_pending_achievements_page(prev_cursor, "prev", limit=3)
+    assert [a["id"] for a in page] == ids[:3]
+    assert (total, prev_cursor) == (6, None)
+
+
+def test_stale_cursor_restarts_from_first_page(db):
+    ids = add_pending(db, 2)
+    _, _, _, next_cursor = db.get_pending_achievements_page(limit=1)
+    db.update_achievement_status(ids[1], "rejected", 2, "Админ")
+
+    page, total, prev_cursor, next_cursor = db.get_pending_achievements_page(next_cursor, "next", limit=1)
+    assert [a["id"] for a in page] == ids[:1]
+    assert (total, prev_cursor, next_cursor) == (1, None, None)
+
+
+def test_page_escapes_html_and_fits_in_one_message(db):
+    add_pending(db, 1, description="<b>жирный</b> & " + "очень длинное описание " * 20)
+    add_pending(db, 9, description="Подробности " * 500)
+    page, total, prev_cursor, next_cursor = db.get_pending_achievements_page(limit=10)
+
+    summary, _ = render_pending_page(page, total, prev_cursor, next_cursor)
+
+    assert len(summary) <= MESSAGE_LIMIT
+    assert "&lt;b&gt;жирный&lt;/b&gt; &amp;" in summary
+    assert "<b>жирный</b>" not in summary
+    assert summary.count("…") == 10
@@ -0,0 +1,84 @@
+import json
+import os
+
+import config
+from middlewares.recording import Anonymizer
+from utils.roles import RoleRegistry
+
+
+def write_roles(path, roles, mtime):
+    path.write_text(json.dumps(roles), encoding="utf-8")
+    # Время изменения задаем явно: на быстрой ФС оно может не смениться между записями
+    os.utime(path, (mtime, mtime))
+
+
+def test_registry_reads_env_file_and_roles_file(tmp_path):
+    env_file = tmp_path / ".env"
+    env_file.write_text("CHAIRMAN_IDS=1\nSECRETARY_IDS=2,3\n", encoding="utf-8")
+    roles_file = tmp_path / "roles.json"
+    write_roles(roles_file, {"secretary": [3], "tech_head": [4]}, 1000)
+
+    registry = RoleRegistry(env_file, roles_file, environ={"TECH_HEAD_IDS": "5"})
+
+    assert registry.snapshot.admins == {1, 3, 4}
+    assert registry.snapshot.leadership == {1, 3}
+    assert registry.role_of(4) == "tech_head"
+    assert registry.role_of(2) is None
+
+
+def test_reload_picks_up_changes(tmp_path):
+    roles_file = tmp_path / "roles.json"
+    write_roles(roles_file, {"chairman": [1]}, 1000)
+    registry = RoleRegistry(roles_file=roles_file, environ={})
+
+    assert registry.reload_if_changed() is False
+    write_roles(roles_file, {"chairman": [2], "sport_head": [3]}, 2000)
+    assert registry.reload_if_changed() is True
+
+    assert registry.snapshot.admins == {2, 3}
+    assert registry.is_leadership(2) and not registry.is_leadership(1)
+    assert registry.reload_if_changed() is False
+
+
+def test_failed_reload_keeps_old_roles_and_retries(tmp_path):
+    roles_file = tmp_path / "roles.json"
+    write_roles(roles_file, {"chairman": [1]}, 1000)
+    registry = RoleRegistry(roles_file=roles_file, environ={})
+
+    roles_file.write_text("{не json", encoding="utf-8")
+    os.utime(roles_file, (2000, 2000))
+    assert registry.reload_if_changed() is True
+    assert registry.snapshot.admins == {1}
+
+    # Файл исправили, не меняя времени изменения: следующая проверка перечитывает его
+    write_roles(roles_file, {"chairman": [7]}, 2000)
+    assert registry.reload_if_changed() is True
+    assert registry.snapshot.admins == {7}
+
+
+def test_role_name_is_human_readable(monkeypatch):
+    monkeypatch.setattr(config, "roles", RoleRegistry(environ={"TECH_HEAD_IDS": "4"}))
+
+    assert config.get_role_name(4) == "Заведующий Комитетом по цифровому развитию и техническому обеспечению"
+    assert config.get_role_name(5) == "User"
+
+
+def test_anonymizer_follows_role_reload(tmp_path):
+    roles_file = tmp_path / "roles.json"
+    write_roles(roles_file, {"chairman": [1]}, 1000)
+    registry = RoleRegistry(roles_file=roles_file, environ={})
+    anonymizer = Anonymizer(registry, salt="test")
+    update = {"message": {"from": {"id": 2, "is_bot": False, "first_name": "Анна"},
+                          "chat": {"id": 2, "type": "private"}, "text": "привет"}}
+
+    anonymized = anonymizer(update)
+    assert anonymized["message"]["from"]["id"] != 2
+    assert anonymized["message"]["from"]["first_name"] != "Анна"
+    # Псевдонимы детерминированы при той же соли
+    assert Anonymizer(registry, salt="test")(update) == anonymized
+    assert anonymizer({"user_id": 1}) == {"user_id": 1}
+
+    write_roles(roles_file, {"chairman": [2]}, 2000)
+    registry.reload_if_changed()
+    assert anonymizer(update)["message"]["from"]["id"] == 2
+    assert anonymizer({"user_id": 1})["user_id"] != 1
@@ -0,0 +1,38 @@
+from utils.text import search_terms, stem
+
+
+def test_stem_strips_one_ending():
+    assert stem("стипендии") == "стипенд"
+    assert stem("расписанием") == "расписан"
+    # Короткие основы не укорачиваются
+    assert stem("душ") == "душ"
+    assert stem("новые") == "нов"
+
+
+def test_adjective_suffix_joins_derived_words():
+    assert {stem(word) for word in ("душ", "душевые", "душевой", "душевых", "душевым")} == {"душ"}
+    # Без окончания прилагательного суффикс остается: фамилии и существительные
+    assert stem("петрова") == "петров"
+
+
+def test_search_terms_normalize_text():
+    assert search_terms("Сломан  ДУШЕВОЙ, нет ёлки!") == ["сломан", "душ", "нет", "елк"]
+
+
+def test_search_finds_word_forms(db):
+    shower = db.create_appeal(1, None, "Анна", "Не работают душевые в общежитии")
+    water = db.create_appeal(2, None, "Борис", "Нет горячей воды в душе")
+    db.answer_appeal(water, "Душевую починили")
+
+    assert {a["appeal_id"] for a in db.search_appeals("душ")} == {shower, water}
+    assert {a["appeal_id"] for a in db.search_appeals("душевая")} == {shower, water}
+    assert [a["appeal_id"] for a in db.search_appeals("горячая вода")] == [water]
+    assert [a["appeal_id"] for a in db.search_appeals("душ", status="new")] == [shower]
+    assert db.search_appeals("!!!") == []
+
+
+def test_search_ranks_only_newest_candidates(db, monkeypatch):
+    ids = [db.create_appeal(n, None, "Студент", "Вопрос про стипендию") for n in range(5)]
+    monkeypatch.setattr(db, "SEARCH_CANDIDATES", 3)
+
+    assert {a["appeal_id"] for a in db.search_appeals("стипендия", limit=10)} == set(ids[2:])
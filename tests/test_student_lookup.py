@@ -0,0 +1,36 @@
+from utils.text import TrigramIndex, normalize_student_name
+
+
+def test_student_key_ignores_case_spacing_and_word_order():
+    assert normalize_student_name("  Иванов   Иван Иванович ") == "иван иванов иванович"
+    assert normalize_student_name("иван ИВАНОВИЧ Иванов") == "иван иванов иванович"
+    assert normalize_student_name("Семён Алёшин") == normalize_student_name("Семен Алешин")
+
+
+def test_suggest_finds_typos_by_similarity():
+    index = TrigramIndex()
+    for name in ("Иванов Иван", "Иванова Ирина", "Петров Петр", "Сидоров Сидор"):
+        index.add(normalize_student_name(name), name)
+
+    suggestions = index.suggest(normalize_student_name("Иваонв Иван"))
+    assert suggestions[0][0] == "Иванов Иван"
+    assert all(score >= 0.5 for _, score in suggestions)
+    assert index.suggest(normalize_student_name("Кузнецова Мария")) == []
+
+    index.discard(normalize_student_name("Иванов Иван"))
+    assert "Иванов Иван" not in [name for name, _ in index.suggest(normalize_student_name("Иваонв Иван"))]
+
+
+def test_summary_uses_index_of_approved_students(db):
+    achievement_id = db.create_achievement(1, "Куратор", "curator", "Иванов  Иван", "Олимпиада <финал>", 10,
+                                           "2", "bachelor")
+    db.create_achievement(1, "Куратор", "curator", "Петров Петр", "Хакатон", 7, "2", "bachelor")
+
+    # Заявки на подтверждении в подсказки не попадают
+    assert "Иванов Иван" not in db.get_student_achievements_summary("Иваонв Иван")
+
+    db.update_achievement_status(achievement_id, "approved", 2, "Админ")
+    summary = db.get_student_achievements_summary("иван ИВАНОВ")
+    assert "Всего баллов: 10" in summary
+    assert "Олимпиада &lt;финал&gt;" in summary
+    assert "/achievements Иванов Иван" in db.get_student_achievements_summary("Иваонв Иван")
@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_concurrent_appeals_get_unique_sequential_ids(db):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda n: db.create_appeal(n, None, "Студент", f"Обращение {n}"), range(50)))
+
+    assert sorted(ids) == [str(n).zfill(4) for n in range(1, 51)]
+    assert db.get_connection().execute("SELECT COUNT(*) FROM appeals").fetchone()[0] == 50
+
+
+def test_appeal_ids_are_not_reused_after_archiving(db):
+    first = db.create_appeal(1, None, "Студент", "Первое")
+    db.answer_appeal(first, "Ответ")
+    assert db.archive_answered_appeals("9999-12-31") == 1
+
+    assert db.create_appeal(1, None, "Студент", "Второе") == "0002"
+
+
+def test_concurrent_decisions_apply_once(db):
+    achievement_id = db.create_achievement(1, "Куратор", "curator", "Иванов Иван", "Олимпиада", 10,
+                                           "2", "bachelor")
+
+    def decide(status):
+        return db.update_achievement_status(achievement_id, status, 2, "Админ", expected_status="pending")
+
+    decisions = ["approved", "rejected"] * 5
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(decide, decisions))
+
+    status = db.get_achievement(achievement_id)["status"]
+    assert [decision for decision, applied in zip(decisions, results) if applied] == [status]
+    # Рейтинг учел заявку не больше одного раза
+    points = [row["points"] for row in db.get_leaderboard()]
+    assert points == ([10] if status == "approved" else [])
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.types import Message
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Album:
+    """Собираемый альбом: только то, что нужно для обращения"""
+    media_group_id: str
+    bot: Bot
+    chat_id: int
+    user_id: int
+    username: Optional[str]
+    first_name: str
+    caption: str = ""
+    # message_id части -> file_id фото (для сортировки в порядке отправки)
+    photos: Dict[int, str] = field(default_factory=dict)
+    parts: int = 0
+    started: float = 0.0
+    last_part: float = 0.0
+    deadline_tick: int = 0
+
+    @property
+    def photo_ids(self) -> List[str]:
+        return [self.photos[message_id] for message_id in sorted(self.photos)]
+
+
+class AlbumAggregator:
+    """Собирает части альбомов (media group) и отдает готовый альбом в on_complete.
+
+    Все ожидания обслуживает одно колесо таймеров: альбом завершается, когда
+    после последней части прошла пауза дольше обычной для этого чата, сразу по
+    получении max_parts частей (больше в альбоме Telegram не бывает), либо
+    принудительно через ttl после первой части. Одновременно собирается не
+    больше max_groups альбомов.
+
+    Пауза подбирается по скользящему перцентилю промежутков между частями
+    (своему для каждого чата, пока по нему мало данных — общему). Если часть
+    пришла уже после завершения своего альбома, альбом считается разбитым,
+    а промежуток учитывается, чтобы следующие альбомы этого чата ждать дольше.
+    """
+
+    def __init__(self, on_complete: Callable[[Album], Awaitable[None]],
+                 debounce: float = 0.5, min_debounce: float = 0.15, max_debounce: float = 2.0,
+                 ttl: float = 10.0, tick: float = 0.05,
+                 max_groups: int = 1000, max_parts: int = 10, closed_size: int = 1000,
+                 gap_window: int = 32, gap_percentile: float = 0.95, max_chats: int = 10000):
+        self.on_complete = on_complete
+        self.debounce = debounce
+        self.min_debounce = min_debounce
+        self.max_debounce = max_debounce
+        self.ttl = ttl
+        self.tick = tick
+        self.max_groups = max_groups
+        self.max_parts = max_parts
+        self._albums: Dict[str, Album] = {}
+        self._wheel: List[set] = [set() for _ in range(max(2, int(ttl / tick) + 2))]
+        self._current_tick = 0
+        self._task: Optional[asyncio.Task] = None
+        # Задачи обработки собранных альбомов: ссылки держим, пока они не завершатся
+        self._completions: Set[asyncio.Task] = set()
+        # Недавно закрытые альбомы: media_group_id -> (done/split/rejected, время последней части)
+        self._closed: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._closed_size = closed_size
+        # Промежутки между частями альбомов: по чатам (LRU) и общие
+        self.gap_percentile = gap_percentile
+        self._gap_window = gap_window
+        self._chat_gaps: "OrderedDict[int, Deque[float]]" = OrderedDict()
+        self._max_chats = max_chats
+        self._global_gaps: Deque[float] = deque(maxlen=gap_window * 8)
+        # Счетчики: собрано альбомов, из них завершено досрочно, разбито на несколько обращений
+        self.counters: Dict[str, int] = {"completed": 0, "early": 0, "split": 0, "rejected": 0}
+
+    def __contains__(self, media_group_id: str) -> bool:
+        return media_group_id in self._albums
+
+    def __len__(self) -> int:
+        return len(self._albums)
+
+    def seen(self, media_group_id: str) -> bool:
+        """Альбом собирается сейчас или недавно завершен (опоздавшие части тоже нужно принять)"""
+        return media_group_id in self._albums or media_group_id in self._closed
+
+    def add(self, message: Message) -> bool:
+        """Добавляет часть альбома; False, если альбом не принят (перегрузка)"""
+        media_group_id = message.media_group_id
+        album = self._albums.get(media_group_id)
+        now = self._now()
+
+        if album is None:
+            closed = self._closed.get(media_group_id)
+            if closed and closed[0] == "rejected":
+                return False
+            if closed and closed[0] == "done":
+                # Часть опоздала: альбом уже ушел обращением, эта часть станет отдельным
+                self.counters["split"] += 1
+                self._record_gap(message.chat.id, now - closed[1])
+                self._close(media_group_id, "split", closed[1])
+                logger.warning(f"Альбом {media_group_id} разбит: часть пришла через {now - closed[1]:.2f} с")
+            if len(self._albums) >= self.max_groups:
+                logger.warning(f"Слишком много альбомов в сборке, отклонен {media_group_id}")
+                self.counters["rejected"] += 1
+                self._close(media_group_id, "rejected", now)
+                return False
+            user = message.from_user
+            album = Album(
+                media_group_id=media_group_id,
+                bot=message.bot,
+                chat_id=message.chat.id,
+                user_id=user.id,
+                username=user.username,
+                first_name=user.first_name,
+                started=now,
+            )
+            self._albums[media_group_id] = album
+        else:
+            self._record_gap(album.chat_id, now - album.last_part)
+
+        if album.parts >= self.max_parts:
+            return True
+        album.parts += 1
+        album.last_part = now
+        if message.caption and not album.caption:
+            album.caption = message.caption
+        if message.photo:
+            album.photos[message.message_id] = message.photo[-1].file_id
+
+        if album.parts >= self.max_parts:
+            # Больше частей не будет, ждать нечего
+            self.counters["early"] += 1
+            deadline = now
+        else:
+            deadline = min(now + self.debounce_for(album.chat_id), album.started + self.ttl)
+        self._schedule(album, deadline)
+        self._ensure_running()
+        return True
+
+    def debounce_for(self, chat_id: int) -> float:
+        """Сколько ждать следующую часть альбома в этом чате"""
+        gaps = self._chat_gaps.get(chat_id)
+        if not gaps or len(gaps) < 4:
+            gaps = self._global_gaps
+        if len(gaps) < 4:
+            return self.debounce
+        ordered = sorted(gaps)
+        percentile = ordered[min(len(ordered) - 1, int(len(ordered) * self.gap_percentile))]
+        # Запас на разброс: полтора перцентиля плюс один тик колеса
+        return min(self.max_debounce, max(self.min_debounce, percentile * 1.5 + self.tick))
+
+    def _record_gap(self, chat_id: int, gap: float) -> None:
+        gaps = self._chat_gaps.get(chat_id)
+        if gaps is None:
+            gaps = self._chat_gaps[chat_id] = deque(maxlen=self._gap_window)
+            while len(self._chat_gaps) > self._max_chats:
+                self._chat_gaps.popitem(last=False)
+        else:
+            self._chat_gaps.move_to_end(chat_id)
+        gaps.append(gap)
+        self._global_gaps.append(gap)
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def _schedule(self, album: Album, deadline: float) -> None:
+        """Кладет альбом в слот колеса; старый слот очищается лениво при срабатывании"""
+        deadline_tick = max(self._current_tick + 1, int(deadline / self.tick) + 1)
+        album.deadline_tick = deadline_tick
+        self._wheel[deadline_tick % len(self._wheel)].add(album.media_group_id)
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._current_tick = int(self._now() / self.tick)
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """Проворачивает колесо, пока есть собираемые альбомы"""
+        while self._albums:
+            await asyncio.sleep(self.tick)
+            now_tick = int(self._now() / self.tick)
+            while self._current_tick < now_tick:
+                self._current_tick += 1
+                self._fire(self._current_tick)
+
+    def _fire(self, tick: int) -> None:
+        # Колесо длиннее ttl, поэтому в слоте лежат только альбомы этого тика
+        # и устаревшие записи альбомов, перенесенных в другой слот
+        slot = self._wheel[tick % len(self._wheel)]
+        for group_id in list(slot):
+            album = self._albums.get(group_id)
+            if album is None or album.deadline_tick != tick:
+                continue
+            del self._albums[group_id]
+            self.counters["completed"] += 1
+            self._close(group_id, "done", album.last_part)
+            task = asyncio.create_task(self._complete(album))
+            self._completions.add(task)
+            task.add_done_callback(self._completions.discard)
+        slot.clear()
+
+    async def _complete(self, album: Album) -> None:
+        try:
+            await self.on_complete(album)
+        except Exception as e:
+            logger.error(f"Ошибка обработки альбома {album.media_group_id}: {e}", exc_info=True)
+
+    def _close(self, media_group_id: str, reason: str, last_part: float) -> None:
+        self._closed[media_group_id] = (reason, last_part)
+        self._closed.move_to_end(media_group_id)
+        while len(self._closed) > self._closed_size:
+            self._closed.popitem(last=False)
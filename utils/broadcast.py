@@ -0,0 +1,44 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Message
+
+from config import BROADCAST_RATE, BROADCAST_BURST, BROADCAST_MAX_RETRIES
+from utils.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Общий лимит исходящих рассылок бота (у Telegram ~30 сообщений в секунду)
+broadcast_bucket = TokenBucket(rate=BROADCAST_RATE, capacity=BROADCAST_BURST)
+
+
+async def broadcast(recipients: Iterable[int],
+                    send: Callable[[int], Awaitable[Optional[Message]]],
+                    cost: float = 1,
+                    max_retries: int = BROADCAST_MAX_RETRIES) -> Dict[int, int]:
+    """Параллельно отправляет сообщение всем получателям с учетом общего лимита.
+
+    send(chat_id) отправляет сообщение одному получателю и возвращает то,
+    на которое нужно отвечать; cost — сколько сообщений Telegram уходит за одну
+    отправку (для альбома — число фото). Возвращает {chat_id: message_id} успешных отправок.
+    """
+
+    async def deliver(chat_id: int) -> Tuple[int, Optional[Message]]:
+        for attempt in range(max_retries + 1):
+            await broadcast_bucket.acquire(cost)
+            try:
+                return chat_id, await send(chat_id)
+            except TelegramRetryAfter as e:
+                # Flood control действует на весь бот, поэтому притормаживаем всех
+                logger.warning(f"RetryAfter {e.retry_after} с при отправке в {chat_id}")
+                broadcast_bucket.pause(e.retry_after)
+            except Exception as e:
+                logger.error(f"Ошибка отправки в {chat_id}: {e}")
+                return chat_id, None
+        logger.error(f"Не удалось отправить в {chat_id}: превышено число повторов")
+        return chat_id, None
+
+    results = await asyncio.gather(*(deliver(chat_id) for chat_id in recipients))
+    return {chat_id: message.message_id for chat_id, message in results if message is not None}
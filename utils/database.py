@@ -1,78 +1,625 @@
+import bisect
+import gzip
+import html
 import json
 import logging
-from datetime import datetime
-from typing import Dict, Optional, List
-from pathlib import Path
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Dict, Iterator, Optional, List, Tuple
 import uuid
 
 logger = logging.getLogger(__name__)
 
 # Импортируем после определения logger
-from config import STATS_FILE, APPEALS_FILE, ACHIEVEMENTS_FILE
+from config import (
+    DATABASE_FILE, ARCHIVE_DIR, STATS_FILE, APPEALS_FILE, ACHIEVEMENTS_FILE,
+    STATS_FLUSH_THRESHOLD, STATS_CACHE_SIZE, PAGE_SIZE
+)
+from utils.metrics import storage_read, storage_write
+from utils.text import TrigramIndex, normalize_student_name, search_terms
 
 
-# === Статистика ===
+# === Подключение и схема ===
+
+SCHEMA_VERSION = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id INTEGER PRIMARY KEY,
+    first_name TEXT,
+    username TEXT,
+    messages_count INTEGER NOT NULL DEFAULT 0,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_stats_last_seen ON user_stats (last_seen);
+CREATE INDEX IF NOT EXISTS idx_user_stats_messages ON user_stats (messages_count);
+
+-- seq — постоянный числовой ключ обращения (на него ссылается поисковый индекс)
+CREATE TABLE IF NOT EXISTS appeals (
+    seq INTEGER PRIMARY KEY,
+    appeal_id TEXT NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL,
+    username TEXT,
+    first_name TEXT,
+    text TEXT NOT NULL DEFAULT '',
+    media_type TEXT,
+    media_id TEXT,
+    created_at TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'new',
+    answer TEXT,
+    answer_media_type TEXT,
+    answer_media_id TEXT,
+    answered_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_appeals_status_created ON appeals (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_appeals_status_answered ON appeals (status, answered_at);
+
+-- Обращения, перенесенные в архив (archive_answered_appeals): где лежит gzip-блок с обращением
+CREATE TABLE IF NOT EXISTS appeals_archive (
+    appeal_id TEXT PRIMARY KEY,
+    segment TEXT NOT NULL,
+    block_offset INTEGER NOT NULL,
+    block_length INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    answered_at TEXT
+) WITHOUT ROWID;
+
+-- message_id сообщений с обращением у каждого админа (admin_id = 0 — старое поле admin_message_id)
+CREATE TABLE IF NOT EXISTS appeal_messages (
+    admin_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    appeal_id TEXT NOT NULL REFERENCES appeals (appeal_id) ON DELETE CASCADE,
+    PRIMARY KEY (admin_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_appeal_messages_message ON appeal_messages (message_id);
+CREATE INDEX IF NOT EXISTS idx_appeal_messages_appeal ON appeal_messages (appeal_id);
+
+-- Полнотекстовый поиск по обращениям: основы слов текста и ответа (utils.text.search_terms),
+-- rowid совпадает с seq обращения в appeals
+CREATE VIRTUAL TABLE IF NOT EXISTS appeals_search USING fts5 (text, answer);
+
+-- seq — постоянный числовой ключ в порядке добавления (курсор страниц заявок, рейтинг)
+CREATE TABLE IF NOT EXISTS achievements (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    reporter_id INTEGER NOT NULL,
+    reporter_name TEXT,
+    reporter_role TEXT,
+    student_name TEXT NOT NULL,
+    student_key TEXT NOT NULL,
+    education_level TEXT,
+    course TEXT,
+    description TEXT,
+    points INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TEXT NOT NULL,
+    approver_id INTEGER,
+    approver_name TEXT,
+    approved_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_achievements_status ON achievements (status);
+CREATE INDEX IF NOT EXISTS idx_achievements_student ON achievements (student_key, status);
+
+-- Рейтинг студентов: сумма баллов подтвержденных достижений (обновляется в update_achievement_status).
+-- Имя, уровень и курс — из последнего подтвержденного достижения (last_seq)
+CREATE TABLE IF NOT EXISTS student_points (
+    student_key TEXT PRIMARY KEY,
+    student_name TEXT NOT NULL,
+    education_level TEXT,
+    course TEXT,
+    points INTEGER NOT NULL,
+    approved INTEGER NOT NULL,
+    last_seq INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_student_points_points ON student_points (points DESC, student_name);
+CREATE INDEX IF NOT EXISTS idx_student_points_level ON student_points (education_level, points DESC, student_name);
+CREATE INDEX IF NOT EXISTS idx_student_points_course ON student_points (course, points DESC, student_name);
+CREATE INDEX IF NOT EXISTS idx_student_points_facets ON student_points
+    (education_level, course, points DESC, student_name);
+
+-- Монотонные счетчики ID (не переиспользуются после удаления записей)
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+-- Состояния FSM (utils.fsm_storage): ключ aiogram -> состояние и данные в JSON
+CREATE TABLE IF NOT EXISTS fsm_states (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at);
+"""
+
+# У каждого потока свое подключение; _generation меняется при close_db()
+_local = threading.local()
+_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+_generation = 0
 
-def load_stats() -> Dict:
-    """Загружает статистику"""
-    if STATS_FILE.exists():
+# Блокировки хранилищ внутри процесса (между процессами — BEGIN IMMEDIATE)
+_store_locks: Dict[str, threading.RLock] = {
+    "stats": threading.RLock(),
+    "appeals": threading.RLock(),
+    "achievements": threading.RLock(),
+    "fsm": threading.RLock(),
+}
+
+
+def get_connection() -> sqlite3.Connection:
+    """Возвращает подключение к базе для текущего потока, открывая его при первом вызове"""
+    if getattr(_local, "generation", None) != _generation:
+        conn = sqlite3.connect(DATABASE_FILE, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        with _connections_lock:
+            _connections.append(conn)
+        _local.connection = conn
+        _local.generation = _generation
+    return _local.connection
+
+
+@contextmanager
+def transaction(store: str) -> Iterator[sqlite3.Connection]:
+    """Транзакция чтения-изменения-записи над хранилищем (stats, appeals, achievements, fsm).
+
+    Держит блокировку хранилища и сразу берет блокировку записи в базе,
+    поэтому прочитанное внутри транзакции не изменится до ее фиксации.
+    Вложенные транзакции присоединяются к внешней.
+    """
+    with _store_locks[store]:
+        conn = get_connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
         try:
-            with open(STATS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Ошибка загрузки статистики: {e}")
-            return {}
-    return {}
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
 
+def close_db() -> None:
+    """Сбрасывает отложенные записи и закрывает подключения к базе"""
+    global _generation
+    with _connections_lock:
+        if not _connections:
+            return
+    flush_stats()
+    _stats_cache.clear()
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+        _generation += 1
 
-def save_stats(stats: Dict) -> None:
-    """Сохраняет статистику"""
+
+def init_db() -> None:
+    """Создает схему и при первом запуске переносит данные из JSON-файлов"""
+    conn = get_connection()
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    with conn:
+        conn.executescript(SCHEMA)
+    if version < 1:
+        _migrate_json(conn)
+    if version < 2:
+        _rekey_students(conn)
+    if version < 3:
+        _seed_sequences(conn)
+    if version < 4:
+        _add_seq_key(conn, "appeals", APPEALS_TABLE)
+        with conn:
+            # Индекс пересоберет _sync_search_index по новым ключам
+            conn.execute("DELETE FROM appeals_search")
+    if version < 5:
+        _add_seq_key(conn, "achievements", ACHIEVEMENTS_TABLE)
+        with conn:
+            # Рейтинг ссылался на rowid достижений: пересоберет _sync_leaderboard
+            conn.execute("DROP TABLE IF EXISTS student_points")
+        conn.executescript(SCHEMA)
+    if version < 6:
+        with conn:
+            # Основы слов считаются иначе (суффикс -ев-/-ов-): индекс пересоберет _sync_search_index
+            conn.execute("DELETE FROM appeals_search")
+    if version < SCHEMA_VERSION:
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    _stats_aggregates.load(conn)
+    _appeal_queue.load(conn)
+    _sync_search_index(conn)
+    _sync_leaderboard(conn)
+    rebuild_message_index()
+    rebuild_student_index()
+
+
+def _load_json(path, default):
+    """Читает старый JSON-файл хранилища"""
+    if not path.exists():
+        return default
     try:
-        with open(STATS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(stats, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.error(f"Ошибка сохранения статистики: {e}")
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, IOError) as e:
+        logger.error(f"Ошибка чтения {path}: {e}")
+        return default
+
+
+def _migrate_json(conn: sqlite3.Connection) -> None:
+    """Переносит данные из user_stats.json, appeals.json и achievements.json"""
+    stats = _load_json(STATS_FILE, {})
+    appeals = _load_json(APPEALS_FILE, {})
+    achievements = _load_json(ACHIEVEMENTS_FILE, [])
+    if not (stats or appeals or achievements):
+        return
+
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO user_stats "
+            "(user_id, first_name, username, messages_count, first_seen, last_seen) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (int(user_id), u.get("first_name"), u.get("username"),
+                 u.get("messages_count", 0), u["first_seen"], u["last_seen"])
+                for user_id, u in stats.items()
+            ]
+        )
+
+        for appeal_id, a in sorted(appeals.items()):
+            conn.execute(
+                "INSERT OR IGNORE INTO appeals "
+                "(appeal_id, user_id, username, first_name, text, media_type, media_id, "
+                "created_at, status, answer, answer_media_type, answer_media_id, answered_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (appeal_id, a["user_id"], a.get("username"), a.get("first_name"),
+                 a.get("text") or "", a.get("media_type"), a.get("media_id"),
+                 a["created_at"], a.get("status", "new"), a.get("answer"),
+                 a.get("answer_media_type"), a.get("answer_media_id"), a.get("answered_at"))
+            )
+            message_ids = [
+                (int(admin_id), msg_id, appeal_id)
+                for admin_id, msg_id in (a.get("admin_message_ids") or {}).items()
+            ]
+            if a.get("admin_message_id"):
+                message_ids.append((0, a["admin_message_id"], appeal_id))
+            conn.executemany(
+                "INSERT OR IGNORE INTO appeal_messages (admin_id, message_id, appeal_id) "
+                "VALUES (?, ?, ?)",
+                message_ids
+            )
+
+        conn.executemany(
+            "INSERT OR IGNORE INTO achievements "
+            "(id, reporter_id, reporter_name, reporter_role, student_name, student_key, "
+            "education_level, course, description, points, status, created_at, "
+            "approver_id, approver_name, approved_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (ach["id"], ach["reporter_id"], ach.get("reporter_name"), ach.get("reporter_role"),
+                 ach["student_name"], normalize_student_name(ach["student_name"]),
+                 ach.get("education_level"), ach.get("course"), ach.get("description"),
+                 ach["points"], ach.get("status", "pending"), ach["created_at"],
+                 ach.get("approver_id"), ach.get("approver_name"), ach.get("approved_at"))
+                for ach in achievements
+            ]
+        )
+
+    logger.info(
+        f"Данные перенесены из JSON: {len(stats)} пользователей, "
+        f"{len(appeals)} обращений, {len(achievements)} достижений"
+    )
+
+
+def _rekey_students(conn: sqlite3.Connection) -> None:
+    """Пересчитывает ключи студентов по текущим правилам нормализации"""
+    rows = conn.execute("SELECT id, student_name FROM achievements").fetchall()
+    with conn:
+        conn.executemany(
+            "UPDATE achievements SET student_key = ? WHERE id = ?",
+            [(normalize_student_name(row["student_name"]), row["id"]) for row in rows]
+        )
+
+
+def _seed_sequences(conn: sqlite3.Connection) -> None:
+    """Начинает счетчик ID обращений после наибольшего существующего номера"""
+    last_id = conn.execute(
+        "SELECT COALESCE(MAX(CAST(appeal_id AS INTEGER)), 0) FROM appeals"
+    ).fetchone()[0]
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO sequences (name, value) VALUES ('appeals', ?)", (last_id,))
+
+
+# Таблицы с постоянным ключом seq (для переноса старых баз в _add_seq_key)
+APPEALS_TABLE = """
+CREATE TABLE appeals_new (
+    seq INTEGER PRIMARY KEY,
+    appeal_id TEXT NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL,
+    username TEXT,
+    first_name TEXT,
+    text TEXT NOT NULL DEFAULT '',
+    media_type TEXT,
+    media_id TEXT,
+    created_at TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'new',
+    answer TEXT,
+    answer_media_type TEXT,
+    answer_media_id TEXT,
+    answered_at TEXT
+)"""
+
+ACHIEVEMENTS_TABLE = """
+CREATE TABLE achievements_new (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    reporter_id INTEGER NOT NULL,
+    reporter_name TEXT,
+    reporter_role TEXT,
+    student_name TEXT NOT NULL,
+    student_key TEXT NOT NULL,
+    education_level TEXT,
+    course TEXT,
+    description TEXT,
+    points INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TEXT NOT NULL,
+    approver_id INTEGER,
+    approver_name TEXT,
+    approved_at TEXT
+)"""
+
+
+def _add_seq_key(conn: sqlite3.Connection, table: str, create_new: str) -> None:
+    """Пересоздает таблицу с явным ключом seq INTEGER PRIMARY KEY.
+
+    Неявный rowid таблицы с TEXT PRIMARY KEY может поменяться при VACUUM,
+    seq — нет. Старый rowid становится seq, порядок строк сохраняется.
+    Таблицу создает create_new под именем <table>_new; индексы
+    пересоздаются из SCHEMA.
+    """
+    columns = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if "seq" in columns:
+        return
+    names = ", ".join(columns)
+    # Внешние ключи на таблицу (appeal_messages) не должны сработать на DROP
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(create_new)
+            conn.execute(f"INSERT INTO {table}_new (seq, {names}) SELECT rowid, {names} FROM {table}")
+            conn.execute(f"DROP TABLE {table}")
+            conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+            if conn.execute("PRAGMA foreign_key_check").fetchone() is not None:
+                raise sqlite3.IntegrityError(f"Нарушены внешние ключи после переноса {table}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    logger.info(f"Таблица {table} перенесена на ключ seq")
+
+
+def next_sequence(conn: sqlite3.Connection, name: str) -> int:
+    """Выдает следующее значение счетчика (вызывать внутри transaction)"""
+    conn.execute(
+        "INSERT INTO sequences (name, value) VALUES (?, 1) "
+        "ON CONFLICT (name) DO UPDATE SET value = value + 1",
+        (name,)
+    )
+    return conn.execute("SELECT value FROM sequences WHERE name = ?", (name,)).fetchone()[0]
+
 
+# === Статистика ===
+
+class StatsCache:
+    """Кэш статистики пользователей с отложенной (write-behind) записью в базу"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._users: "OrderedDict[int, Dict]" = OrderedDict()
+        # user_id -> число сообщений, еще не записанных в базу
+        self._dirty: Dict[int, int] = {}
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def get(self, user_id: int) -> Optional[Dict]:
+        """Возвращает запись пользователя из кэша или базы"""
+        user = self._users.get(user_id)
+        if user is not None:
+            self._users.move_to_end(user_id)
+            return user
+        row = get_connection().execute(
+            "SELECT first_name, username, messages_count, first_seen, last_seen "
+            "FROM user_stats WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        user = dict(row)
+        self._users[user_id] = user
+        return user
+
+    def put(self, user_id: int, user: Dict) -> None:
+        """Кладет запись в кэш и помечает ее для записи"""
+        self._users[user_id] = user
+        self._users.move_to_end(user_id)
+        self._dirty[user_id] = self._dirty.get(user_id, 0) + 1
+
+    def flush(self) -> int:
+        """Записывает накопленные приращения одной транзакцией, возвращает число пользователей"""
+        # Пишем приращения, а не итоговые значения: так не теряются записи других процессов
+        with transaction("stats") as conn:
+            if not self._dirty:
+                return 0
+            rows = [
+                (user_id, u["first_name"], u["username"], delta, u["first_seen"], u["last_seen"])
+                for user_id, u, delta in (
+                    (user_id, self._users[user_id], delta) for user_id, delta in self._dirty.items()
+                )
+            ]
+            conn.executemany(
+                "INSERT INTO user_stats "
+                "(user_id, first_name, username, messages_count, first_seen, last_seen) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET "
+                "messages_count = messages_count + excluded.messages_count, "
+                "last_seen = MAX(last_seen, excluded.last_seen)",
+                rows
+            )
+            self._dirty.clear()
+            self._evict()
+        return len(rows)
+
+    def _evict(self) -> None:
+        """Вытесняет давно не использованные записи, уже сохраненные в базе"""
+        while len(self._users) > self.max_size:
+            user_id = next(iter(self._users))
+            if user_id in self._dirty:
+                break
+            del self._users[user_id]
+
+    def clear(self) -> None:
+        self._users.clear()
+        self._dirty.clear()
+
+
+class StatsAggregates:
+    """Итоги для сводки статистики, обновляемые на каждой записи"""
+
+    def __init__(self, top_size: int = 5, active_days: int = 7):
+        self.top_size = top_size
+        self.active_days = active_days
+        self.total_users = 0
+        self.total_messages = 0
+        # Номер дня (date.toordinal) -> число пользователей, последний раз активных в этот день
+        self._days: Dict[int, int] = {}
+        # Топ по сообщениям: user_id -> (first_name, username, messages_count)
+        self._top: Dict[int, Tuple[str, Optional[str], int]] = {}
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        """Пересчитывает итоги по базе (один раз при запуске)"""
+        self.total_users, self.total_messages = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(messages_count), 0) FROM user_stats"
+        ).fetchone()
+
+        first_day = date.today().toordinal() - self.active_days
+        self._days = {
+            date.fromisoformat(day).toordinal(): count
+            for day, count in conn.execute(
+                "SELECT substr(last_seen, 1, 10) AS day, COUNT(*) FROM user_stats "
+                "WHERE last_seen >= ? GROUP BY day",
+                (date.fromordinal(first_day).isoformat(),)
+            )
+        }
+
+        self._top = {
+            row["user_id"]: (row["first_name"], row["username"], row["messages_count"])
+            for row in conn.execute(
+                "SELECT user_id, first_name, username, messages_count FROM user_stats "
+                "ORDER BY messages_count DESC LIMIT ?", (self.top_size,)
+            )
+        }
+
+    def record(self, user_id: int, user: Dict, previous_last_seen: Optional[str]) -> None:
+        """Учитывает одно сообщение пользователя (previous_last_seen=None — новый пользователь)"""
+        self.total_messages += 1
+        today = date.fromisoformat(user["last_seen"][:10]).toordinal()
+
+        if previous_last_seen is None:
+            self.total_users += 1
+            self._days[today] = self._days.get(today, 0) + 1
+        else:
+            previous_day = date.fromisoformat(previous_last_seen[:10]).toordinal()
+            if previous_day != today:
+                if previous_day in self._days:
+                    self._days[previous_day] -= 1
+                self._days[today] = self._days.get(today, 0) + 1
+
+        for day in [day for day in self._days if day < today - self.active_days]:
+            del self._days[day]
+
+        count = user["messages_count"]
+        entry = (user["first_name"], user["username"], count)
+        if user_id in self._top or len(self._top) < self.top_size:
+            self._top[user_id] = entry
+            return
+        # Счетчики только растут, поэтому войти в топ можно, лишь обогнав его минимум
+        weakest = min(self._top, key=lambda uid: self._top[uid][2])
+        if count > self._top[weakest][2]:
+            del self._top[weakest]
+            self._top[user_id] = entry
+
+    def active_users(self) -> int:
+        first_day = date.today().toordinal() - self.active_days
+        return sum(count for day, count in self._days.items() if day >= first_day)
+
+    def top(self) -> List[Tuple[str, Optional[str], int]]:
+        return sorted(self._top.values(), key=lambda entry: entry[2], reverse=True)
 
-def update_user_stats(user_id: int, username: Optional[str] = None, 
+
+_stats_cache = StatsCache(STATS_CACHE_SIZE)
+_stats_aggregates = StatsAggregates()
+
+
+@storage_write
+def update_user_stats(user_id: int, username: Optional[str] = None,
                      first_name: Optional[str] = None) -> None:
     """Обновляет статистику пользователя"""
-    stats = load_stats()
-    user_key = str(user_id)
-    
-    if user_key not in stats:
-        stats[user_key] = {
-            "first_name": first_name or "Неизвестно",
-            "username": username,
-            "messages_count": 0,
-            "first_seen": datetime.now().isoformat(),
-            "last_seen": datetime.now().isoformat()
-        }
-    
-    stats[user_key]["messages_count"] += 1
-    stats[user_key]["last_seen"] = datetime.now().isoformat()
-    
-    save_stats(stats)
+    with _store_locks["stats"]:
+        now = datetime.now().isoformat()
+        user = _stats_cache.get(user_id)
+        previous_last_seen = user["last_seen"] if user else None
+
+        if user is None:
+            user = {
+                "first_name": first_name or "Неизвестно",
+                "username": username,
+                "messages_count": 0,
+                "first_seen": now,
+                "last_seen": now
+            }
+
+        user["messages_count"] += 1
+        user["last_seen"] = now
+        _stats_cache.put(user_id, user)
+        _stats_aggregates.record(user_id, user, previous_last_seen)
+
+    if _stats_cache.dirty_count >= STATS_FLUSH_THRESHOLD:
+        flush_stats()
+
+
+@storage_write
+def flush_stats() -> None:
+    """Сбрасывает накопленную статистику в базу"""
+    try:
+        count = _stats_cache.flush()
+        if count:
+            logger.debug(f"Статистика сохранена: {count} пользователей")
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка сохранения статистики: {e}")
 
 
+@storage_read
 def get_stats_summary() -> str:
     """Возвращает сводку статистики"""
-    stats = load_stats()
-    total_users = len(stats)
-    total_messages = sum(u["messages_count"] for u in stats.values())
-    
-    now = datetime.now()
-    active_users = sum(
-        1 for u in stats.values() 
-        if (now - datetime.fromisoformat(u["last_seen"])).days <= 7
-    )
-    
-    top_users = sorted(
-        stats.items(), 
-        key=lambda x: x[1]["messages_count"], 
-        reverse=True
-    )[:5]
-    
+    total_users = _stats_aggregates.total_users
+    total_messages = _stats_aggregates.total_messages
+    active_users = _stats_aggregates.active_users()
+    top_users = _stats_aggregates.top()
+
     summary = f"""<b>📊 Статистика бота</b>
 
 👥 Всего пользователей: <b>{total_users}</b>
@@ -80,244 +627,728 @@ def get_stats_summary() -> str:
 🔥 Активных за неделю: <b>{active_users}</b>
 
 <b>🏆 Топ-5 активных:</b>"""
-    
-    for i, (user_id, data) in enumerate(top_users, 1):
-        username = f"@{data['username']}" if data.get('username') else ""
-        summary += f"\n{i}. <b>{data['first_name']}</b> {username} — {data['messages_count']} сообщений"
-    
+
+    for i, (first_name, username, messages_count) in enumerate(top_users, 1):
+        username = f"@{username}" if username else ""
+        summary += f"\n{i}. <b>{first_name}</b> {username} — {messages_count} сообщений"
+
     return summary
 
 
 # === Обращения ===
 
-def load_appeals() -> Dict:
-    """Загружает обращения"""
-    if APPEALS_FILE.exists():
-        try:
-            with open(APPEALS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"Ошибка загрузки обращений: {e}")
-            return {}
-    return {}
+# Обратный индекс (chat_id админа, message_id) -> appeal_id для ответов через reply
+_message_index: Dict[Tuple[int, int], str] = {}
+# Старое поле admin_message_id без chat_id: message_id -> appeal_id
+_legacy_message_index: Dict[int, str] = {}
 
 
-def save_appeals(appeals: Dict) -> None:
-    """Сохраняет обращения"""
-    try:
-        with open(APPEALS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(appeals, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        logger.error(f"Ошибка сохранения обращений: {e}")
+def rebuild_message_index() -> None:
+    """Перестраивает обратный индекс сообщений обращений по базе"""
+    _message_index.clear()
+    _legacy_message_index.clear()
+    for admin_id, message_id, appeal_id in get_connection().execute(
+        "SELECT admin_id, message_id, appeal_id FROM appeal_messages"
+    ):
+        _index_admin_message(appeal_id, admin_id, message_id)
+    logger.info(f"Индекс сообщений обращений: {len(_message_index) + len(_legacy_message_index)} записей")
+
+
+def _index_admin_message(appeal_id: str, admin_id: int, message_id: int) -> None:
+    if admin_id == 0:
+        _legacy_message_index[message_id] = appeal_id
+    else:
+        _message_index[(admin_id, message_id)] = appeal_id
+
+
+def _unindex_admin_message(admin_id: int, message_id: int) -> None:
+    if admin_id == 0:
+        _legacy_message_index.pop(message_id, None)
+    else:
+        _message_index.pop((admin_id, message_id), None)
+
 
+class AppealQueue:
+    """Счетчики обращений по статусам и очередь открытых обращений по дате создания"""
 
-def create_appeal(user_id: int, username: Optional[str], 
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        # Отсортированный список (created_at, appeal_id) обращений со статусом new
+        self._open: List[Tuple[str, str]] = []
+
+    def load(self, conn: sqlite3.Connection) -> None:
+        """Пересчитывает очередь по базе (один раз при запуске)"""
+        self.counts = dict(conn.execute("SELECT status, COUNT(*) FROM appeals GROUP BY status").fetchall())
+        archived = conn.execute("SELECT COUNT(*) FROM appeals_archive").fetchone()[0]
+        if archived:
+            self.counts["archived"] = archived
+        self._open = [
+            (row["created_at"], row["appeal_id"])
+            for row in conn.execute(
+                "SELECT created_at, appeal_id FROM appeals WHERE status = 'new' ORDER BY created_at, appeal_id"
+            )
+        ]
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, appeal_id: str, created_at: str, status: str = "new") -> None:
+        self.counts[status] = self.counts.get(status, 0) + 1
+        if status == "new":
+            bisect.insort(self._open, (created_at, appeal_id))
+
+    def set_status(self, appeal_id: str, created_at: str, old_status: str, new_status: str) -> None:
+        if old_status == new_status:
+            return
+        self.counts[old_status] = self.counts.get(old_status, 0) - 1
+        self.counts[new_status] = self.counts.get(new_status, 0) + 1
+        entry = (created_at, appeal_id)
+        if old_status == "new":
+            i = bisect.bisect_left(self._open, entry)
+            if i < len(self._open) and self._open[i] == entry:
+                del self._open[i]
+        if new_status == "new":
+            bisect.insort(self._open, entry)
+
+    def archive(self, count: int) -> None:
+        """Отвеченные обращения перенесены в архив"""
+        self.counts["answered"] = self.counts.get("answered", 0) - count
+        self.counts["archived"] = self.counts.get("archived", 0) + count
+
+    def page(self, cursor: Optional[Tuple[str, str]], direction: str,
+             limit: int) -> Tuple[List[Tuple[str, str]], bool, bool]:
+        """Страница открытых обращений от новых к старым по ключу (created_at, appeal_id).
+
+        direction "older" — обращения старше cursor, "newer" — новее; без cursor —
+        самые новые. Возвращает (ключи страницы, есть ли новее, есть ли старше).
+        """
+        if cursor is None:
+            start, end = max(0, len(self._open) - limit), len(self._open)
+        elif direction == "newer":
+            start = bisect.bisect_right(self._open, cursor)
+            end = min(len(self._open), start + limit)
+        else:
+            end = bisect.bisect_left(self._open, cursor)
+            start = max(0, end - limit)
+        if start == end and cursor is not None:
+            # Обращения страницы успели ответить — показываем самые новые
+            return self.page(None, direction, limit)
+        return list(reversed(self._open[start:end])), end < len(self._open), start > 0
+
+
+_appeal_queue = AppealQueue()
+
+def _appeal_from_row(conn: sqlite3.Connection, row: sqlite3.Row) -> Dict:
+    """Собирает словарь обращения из строки таблицы"""
+    appeal = dict(row)
+    appeal.pop("seq", None)
+    appeal_id = appeal.pop("appeal_id")
+    appeal["admin_message_ids"] = {
+        str(admin_id): message_id
+        for admin_id, message_id in conn.execute(
+            "SELECT admin_id, message_id FROM appeal_messages "
+            "WHERE appeal_id = ? AND admin_id != 0",
+            (appeal_id,)
+        )
+    }
+    return appeal
+
+
+@storage_write
+def create_appeal(user_id: int, username: Optional[str],
                  first_name: str, text: str, media_type: str = None,
                  media_id: str = None) -> str:
     """Создает новое обращение с поддержкой медиа"""
-    appeals = load_appeals()
-    appeal_id = str(len(appeals) + 1).zfill(4)
-    
-    appeals[appeal_id] = {
-        "user_id": user_id,
-        "username": username,
-        "first_name": first_name,
-        "text": text or "",
-        "media_type": media_type,
-        "media_id": media_id,
-        "admin_message_ids": {},
-        "created_at": datetime.now().isoformat(),
-        "status": "new",
-        "answer": None,
-        "answer_media_type": None,
-        "answer_media_id": None,
-        "answered_at": None
-    }
-    
-    save_appeals(appeals)
+    with transaction("appeals") as conn:
+        appeal_id = str(next_sequence(conn, "appeals")).zfill(4)
+        created_at = datetime.now().isoformat()
+        cursor = conn.execute(
+            "INSERT INTO appeals "
+            "(appeal_id, user_id, username, first_name, text, media_type, media_id, "
+            "created_at, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'new')",
+            (appeal_id, user_id, username, first_name, text or "", media_type, media_id,
+             created_at)
+        )
+        conn.execute(
+            "INSERT INTO appeals_search (rowid, text, answer) VALUES (?, ?, '')",
+            (cursor.lastrowid, " ".join(search_terms(text or "")))
+        )
+        _appeal_queue.add(appeal_id, created_at)
     return appeal_id
 
 
+@storage_write
+def add_admin_message_ids(appeal_id: str, message_ids: Dict[int, int]) -> None:
+    """Запоминает message_id обращения у каждого админа (для reply) одной записью"""
+    with transaction("appeals") as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO appeal_messages (admin_id, message_id, appeal_id) "
+            "VALUES (?, ?, ?)",
+            [(admin_id, message_id, appeal_id) for admin_id, message_id in message_ids.items()]
+        )
+        for admin_id, message_id in message_ids.items():
+            _index_admin_message(appeal_id, admin_id, message_id)
+
+
+@storage_read
 def get_appeal(appeal_id: str) -> Optional[Dict]:
     """Получает обращение по ID"""
-    appeals = load_appeals()
-    return appeals.get(appeal_id)
-
-
-def get_appeal_by_message_id(message_id: int) -> Optional[tuple]:
-    """Получает обращение по message_id (для reply)"""
-    appeals = load_appeals()
-    for appeal_id, appeal in appeals.items():
-        if appeal.get("admin_message_id") == message_id:
-            return appeal_id, appeal
-        if "admin_message_ids" in appeal:
-            for admin_id, msg_id in appeal["admin_message_ids"].items():
-                if msg_id == message_id:
-                    return appeal_id, appeal
-    return None
+    conn = get_connection()
+    row = conn.execute("SELECT * FROM appeals WHERE appeal_id = ?", (appeal_id,)).fetchone()
+    if row is None:
+        return _get_archived_appeal(conn, appeal_id)
+    return _appeal_from_row(conn, row)
+
 
+@storage_read
+def get_appeal_by_message_id(message_id: int, admin_chat_id: Optional[int] = None) -> Optional[tuple]:
+    """Получает обращение по message_id в чате админа (для reply)"""
+    appeal_id = None
+    if admin_chat_id is not None:
+        appeal_id = _message_index.get((admin_chat_id, message_id))
+    if appeal_id is None:
+        appeal_id = _legacy_message_index.get(message_id)
+    if appeal_id is None:
+        return None
+    appeal = get_appeal(appeal_id)
+    if appeal is None:
+        return None
+    return appeal_id, appeal
 
-def answer_appeal(appeal_id: str, answer_text: str, 
+
+@storage_write
+def answer_appeal(appeal_id: str, answer_text: str,
                  media_type: str = None, media_id: str = None) -> bool:
     """Отвечает на обращение с поддержкой медиа"""
-    appeals = load_appeals()
-    
-    if appeal_id not in appeals:
-        return False
-    
-    appeals[appeal_id]["status"] = "answered"
-    appeals[appeal_id]["answer"] = answer_text or ""
-    appeals[appeal_id]["answer_media_type"] = media_type
-    appeals[appeal_id]["answer_media_id"] = media_id
-    appeals[appeal_id]["answered_at"] = datetime.now().isoformat()
-    
-    save_appeals(appeals)
+    with transaction("appeals") as conn:
+        row = conn.execute(
+            "SELECT seq, status, created_at FROM appeals WHERE appeal_id = ?", (appeal_id,)
+        ).fetchone()
+        if row is None:
+            return False
+        conn.execute(
+            "UPDATE appeals SET status = 'answered', answer = ?, answer_media_type = ?, "
+            "answer_media_id = ?, answered_at = ? WHERE appeal_id = ?",
+            (answer_text or "", media_type, media_id, datetime.now().isoformat(), appeal_id)
+        )
+        conn.execute(
+            "UPDATE appeals_search SET answer = ? WHERE rowid = ?",
+            (" ".join(search_terms(answer_text or "")), row["seq"])
+        )
+        _appeal_queue.set_status(appeal_id, row["created_at"], row["status"], "answered")
     return True
 
 
-def get_admin_appeals_summary() -> str:
-    """Сводка по обращениям для админа"""
-    appeals = load_appeals()
-    
-    new_count = sum(1 for a in appeals.values() if a["status"] == "new")
-    answered_count = sum(1 for a in appeals.values() if a["status"] == "answered")
-    
+@storage_read
+def get_admin_appeals_summary(cursor: Optional[Tuple[str, str]] = None, direction: str = "older",
+                              limit: int = PAGE_SIZE) -> Tuple[str, Optional[Tuple[str, str]],
+                                                                Optional[Tuple[str, str]]]:
+    """Сводка по обращениям для админа со страницей новых обращений.
+
+    Возвращает (текст, ключ для кнопки «новее», ключ для кнопки «старше»);
+    ключ None — листать в эту сторону некуда.
+    """
+    new_count = _appeal_queue.counts.get("new", 0)
+    archived_count = _appeal_queue.counts.get("archived", 0)
+    answered_count = _appeal_queue.counts.get("answered", 0) + archived_count
+
     summary = f"""<b>📬 Обращения</b>
 
 📥 Новых: <b>{new_count}</b>
-✅ Отвеченных: <b>{answered_count}</b>
-📊 Всего: <b>{len(appeals)}</b>"""
-    
+✅ Отвеченных: <b>{answered_count}</b>{f" (в архиве: {archived_count})" if archived_count else ""}
+📊 Всего: <b>{_appeal_queue.total}</b>"""
+
+    newer_cursor = older_cursor = None
     if new_count > 0:
+        keys, has_newer, has_older = _appeal_queue.page(cursor, direction, limit)
+        if keys:
+            newer_cursor = keys[0] if has_newer else None
+            older_cursor = keys[-1] if has_older else None
         summary += "\n\n<b>Новые обращения:</b>"
-        new_appeals = [(aid, a) for aid, a in appeals.items() if a["status"] == "new"]
-        new_appeals.sort(key=lambda x: x[1]["created_at"], reverse=True)
-        
-        for appeal_id, appeal in new_appeals[:5]:
+        new_ids = [appeal_id for _, appeal_id in keys]
+        rows = {
+            row["appeal_id"]: row
+            for row in get_connection().execute(
+                "SELECT appeal_id, first_name, text, media_type, media_id FROM appeals "
+                f"WHERE appeal_id IN ({', '.join('?' * len(new_ids))})",
+                new_ids
+            )
+        }
+        new_appeals = [rows[appeal_id] for appeal_id in new_ids if appeal_id in rows]
+
+        for appeal in new_appeals:
+            appeal_id = appeal["appeal_id"]
             text_preview = appeal["text"][:50]
             if len(appeal["text"]) > 50:
                 text_preview += "..."
-            
+
             media_info = ""
-            if appeal.get('media_type') == 'media_group' and appeal.get('media_id'):
+            if appeal['media_type'] == 'media_group' and appeal['media_id']:
                 photo_count = len(appeal['media_id'].split(','))
                 media_info = f" 📷×{photo_count}"
-            elif appeal.get('media_type'):
+            elif appeal['media_type']:
                 media_info = f" 📎"
-            
+
             summary += f"\n\n<b>#{appeal_id}</b>{media_info} от {appeal['first_name']}"
             summary += f"\n<i>{text_preview}</i>"
             summary += f"\n/view_{appeal_id} /reply_{appeal_id}"
-    
-    return summary
 
-# === Индивидуальные достижения ===
+    return summary, newer_cursor, older_cursor
 
-def load_achievements() -> List[Dict]:
-    """Загружает все достижения из файла."""
-    if ACHIEVEMENTS_FILE.exists():
-        try:
-            with open(ACHIEVEMENTS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            logger.error(f"Ошибка загрузки достижений: {e}")
-            return []
-    return []
-
-def save_achievements(achievements: List[Dict]) -> None:
-    """Сохраняет список достижений в файл."""
+# === Поиск по обращениям ===
+
+def _sync_search_index(conn: sqlite3.Connection) -> None:
+    """Перестраивает поисковый индекс, если он разошелся с таблицей обращений
+    (первый запуск после обновления или обращения, добавленные в обход create_appeal)"""
+    indexed = tuple(conn.execute("SELECT COUNT(*), MAX(rowid) FROM appeals_search").fetchone())
+    total, last_seq = conn.execute("SELECT COUNT(*), MAX(seq) FROM appeals").fetchone()
+    if indexed == (total, last_seq):
+        return
+    with transaction("appeals") as conn:
+        conn.execute("DELETE FROM appeals_search")
+        conn.executemany(
+            "INSERT INTO appeals_search (rowid, text, answer) VALUES (?, ?, ?)",
+            ((row["seq"], " ".join(search_terms(row["text"] or "")), " ".join(search_terms(row["answer"] or "")))
+             for row in conn.execute("SELECT seq, text, answer FROM appeals"))
+        )
+    logger.info(f"Поисковый индекс обращений перестроен: {total} записей")
+
+
+# Сколько последних совпадений поиска ранжируется по bm25: широкий запрос
+# не сортирует все обращения базы
+SEARCH_CANDIDATES = 1000
+
+
+@storage_read
+def search_appeals(query: str, status: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None, limit: int = 10) -> List[Dict]:
+    """Ищет обращения по словам текста и ответа (все слова, по началу основы).
+
+    Результаты по убыванию релевантности (bm25, совпадения в тексте весят
+    больше, чем в ответе); status и даты created_at (ISO) сужают выборку.
+    Ранжируются только SEARCH_CANDIDATES самых новых совпадений, фильтры
+    применяются к ним же: более старые обращения находятся уточненным запросом.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+    match = " ".join(f'"{term}"*' for term in dict.fromkeys(terms))
+    sql = ("SELECT a.appeal_id, a.first_name, a.text, a.status, a.created_at, a.media_type "
+           "FROM (SELECT rowid, bm25(appeals_search, 1.0, 0.5) AS rank FROM appeals_search "
+           "WHERE appeals_search MATCH ? ORDER BY rowid DESC LIMIT ?) s "
+           "JOIN appeals a ON a.seq = s.rowid WHERE 1")
+    params: List = [match, SEARCH_CANDIDATES]
+    if status:
+        sql += " AND a.status = ?"
+        params.append(status)
+    if since:
+        sql += " AND a.created_at >= ?"
+        params.append(since)
+    if until:
+        sql += " AND a.created_at < ?"
+        params.append(until)
+    sql += " ORDER BY s.rank LIMIT ?"
+    params.append(limit)
+    return [dict(row) for row in get_connection().execute(sql, params)]
+
+# === Архив обращений ===
+
+# Обращений в одном gzip-блоке: чтение архивного обращения распаковывает один блок
+ARCHIVE_BLOCK_SIZE = 500
+
+
+@storage_write
+def archive_answered_appeals(before: str, limit: int = ARCHIVE_BLOCK_SIZE) -> int:
+    """Переносит в архив до limit обращений, отвеченных раньше before (ISO); возвращает их число.
+
+    Обращения пишутся одним gzip-блоком в конец сегмента месяца архивации
+    (appeals-ГГГГ-ММ.jsonl.gz; блоки склеиваются в обычный gzip, его читает zcat),
+    в appeals_archive запоминается положение блока. Блок сбрасывается на диск
+    до удаления обращений из базы: при сбое между шагами они остаются в базе,
+    а в сегменте — блок, на который никто не ссылается.
+    """
+    with transaction("appeals") as conn:
+        rows = conn.execute(
+            "SELECT * FROM appeals WHERE status = 'answered' AND answered_at < ? "
+            "ORDER BY answered_at LIMIT ?",
+            (before, limit)
+        ).fetchall()
+        if not rows:
+            return 0
+        appeal_ids = [row["appeal_id"] for row in rows]
+        messages = conn.execute(
+            "SELECT admin_id, message_id, appeal_id FROM appeal_messages "
+            f"WHERE appeal_id IN ({', '.join('?' * len(appeal_ids))})",
+            appeal_ids
+        ).fetchall()
+        admin_message_ids: Dict[str, Dict[str, int]] = {}
+        for admin_id, message_id, appeal_id in messages:
+            if admin_id != 0:
+                admin_message_ids.setdefault(appeal_id, {})[str(admin_id)] = message_id
+
+        lines = []
+        for row in rows:
+            record = {key: row[key] for key in row.keys() if key != "seq"}
+            record["admin_message_ids"] = admin_message_ids.get(row["appeal_id"], {})
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        block = gzip.compress("".join(lines).encode("utf-8"))
+
+        segment = f"appeals-{datetime.now():%Y-%m}.jsonl.gz"
+        ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(ARCHIVE_DIR / segment, "ab") as f:
+            offset = f.tell()
+            f.write(block)
+            f.flush()
+            os.fsync(f.fileno())
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO appeals_archive "
+            "(appeal_id, segment, block_offset, block_length, created_at, answered_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(row["appeal_id"], segment, offset, len(block), row["created_at"], row["answered_at"])
+             for row in rows]
+        )
+        conn.executemany("DELETE FROM appeals_search WHERE rowid = ?", [(row["seq"],) for row in rows])
+        # appeal_messages удаляются каскадом
+        conn.executemany("DELETE FROM appeals WHERE appeal_id = ?", [(appeal_id,) for appeal_id in appeal_ids])
+        for admin_id, message_id, _ in messages:
+            _unindex_admin_message(admin_id, message_id)
+        _appeal_queue.archive(len(rows))
+    logger.info(f"В архив {segment} перенесено обращений: {len(rows)}")
+    return len(rows)
+
+
+def _get_archived_appeal(conn: sqlite3.Connection, appeal_id: str) -> Optional[Dict]:
+    """Обращение из архива (распаковывается блок, в котором оно лежит)"""
+    entry = conn.execute(
+        "SELECT segment, block_offset, block_length FROM appeals_archive WHERE appeal_id = ?",
+        (appeal_id,)
+    ).fetchone()
+    if entry is None:
+        return None
     try:
-        with open(ACHIEVEMENTS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(achievements, f, ensure_ascii=False, indent=2)
-    except IOError as e:
-        logger.error(f"Ошибка сохранения достижений: {e}")
+        with open(ARCHIVE_DIR / entry["segment"], "rb") as f:
+            f.seek(entry["block_offset"])
+            block = gzip.decompress(f.read(entry["block_length"]))
+    except (OSError, EOFError) as e:
+        logger.error(f"Не удалось прочитать обращение #{appeal_id} из архива {entry['segment']}: {e}")
+        return None
+    for line in block.decode("utf-8").splitlines():
+        appeal = json.loads(line)
+        if appeal.pop("appeal_id") == appeal_id:
+            appeal["archived"] = True
+            return appeal
+    return None
+
+# === Индивидуальные достижения ===
+
+# Студенты с подтвержденными достижениями: ключ -> число достижений, и индекс для подсказок
+_student_approved: Dict[str, int] = {}
+_student_index = TrigramIndex()
+
+
+def rebuild_student_index() -> None:
+    """Перестраивает индекс студентов по подтвержденным достижениям"""
+    _student_approved.clear()
+    _student_index.clear()
+    for row in get_connection().execute(
+        "SELECT student_key, student_name, COUNT(*) AS approved, MAX(seq) FROM achievements "
+        "WHERE status = 'approved' GROUP BY student_key"
+    ):
+        _student_approved[row["student_key"]] = row["approved"]
+        _student_index.add(row["student_key"], row["student_name"])
 
+
+def _index_student_status(student_key: str, student_name: str,
+                          old_status: str, new_status: str) -> None:
+    """Учитывает смену статуса достижения в индексе студентов"""
+    if old_status != "approved" and new_status == "approved":
+        _student_approved[student_key] = _student_approved.get(student_key, 0) + 1
+        _student_index.add(student_key, student_name)
+    elif old_status == "approved" and new_status != "approved":
+        remaining = _student_approved.get(student_key, 0) - 1
+        if remaining > 0:
+            _student_approved[student_key] = remaining
+        else:
+            _student_approved.pop(student_key, None)
+            _student_index.discard(student_key)
+
+@storage_write
 def create_achievement(reporter_id: int, reporter_name: str, reporter_role: str,
-                       student_name: str, description: str, points: int, 
+                       student_name: str, description: str, points: int,
                        course: str, education_level: str) -> str:
     """Создает новую запись о достижении и возвращает ее ID."""
-    achievements = load_achievements()
-    
     achievement_id = str(uuid.uuid4())
-    
-    new_achievement = {
-        "id": achievement_id,
-        "reporter_id": reporter_id,
-        "reporter_name": reporter_name,
-        "reporter_role": reporter_role,
-        "student_name": student_name.strip(),
-        "education_level": education_level,
-        "course": course,
-        "description": description.strip(),
-        "points": points,
-        "status": "pending",  # pending, approved, rejected
-        "created_at": datetime.now().isoformat(),
-        "approver_id": None,
-        "approver_name": None,
-        "approved_at": None
-    }
-    
-    achievements.append(new_achievement)
-    save_achievements(achievements)
-    
+    student_name = " ".join(student_name.split())
+
+    with transaction("achievements") as conn:
+        conn.execute(
+            "INSERT INTO achievements "
+            "(id, reporter_id, reporter_name, reporter_role, student_name, student_key, "
+            "education_level, course, description, points, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?)",
+            (achievement_id, reporter_id, reporter_name, reporter_role, student_name,
+             normalize_student_name(student_name), education_level, course, description.strip(),
+             points, datetime.now().isoformat())
+        )
+
     return achievement_id
 
+def _achievement_from_row(row: sqlite3.Row) -> Dict:
+    """Собирает словарь достижения из строки таблицы"""
+    achievement = dict(row)
+    achievement.pop("student_key", None)
+    return achievement
+
+@storage_read
 def get_achievement(achievement_id: str) -> Optional[Dict]:
     """Находит достижение по его ID."""
-    achievements = load_achievements()
-    for ach in achievements:
-        if ach["id"] == achievement_id:
-            return ach
-    return None
+    row = get_connection().execute(
+        "SELECT * FROM achievements WHERE id = ?", (achievement_id,)
+    ).fetchone()
+    return _achievement_from_row(row) if row else None
+
+@storage_read
+def get_pending_achievements_page(cursor: Optional[int] = None, direction: str = "next",
+                                  limit: int = PAGE_SIZE) -> Tuple[List[Dict], int, Optional[int], Optional[int]]:
+    """Страница заявок на подтверждение по порядку добавления (ключ — seq).
+
+    direction "next" — заявки после cursor, "prev" — перед ним. Возвращает
+    (заявки с полем seq, всего заявок, ключ для «назад», ключ для «вперед»).
+    """
+    conn = get_connection()
+    if direction == "prev" and cursor is not None:
+        rows = conn.execute(
+            "SELECT * FROM achievements WHERE status = 'pending' AND seq < ? "
+            "ORDER BY seq DESC LIMIT ?", (cursor, limit)
+        ).fetchall()[::-1]
+    else:
+        rows = conn.execute(
+            "SELECT * FROM achievements WHERE status = 'pending' AND seq > ? "
+            "ORDER BY seq LIMIT ?", (cursor or 0, limit)
+        ).fetchall()
+    if not rows and cursor is not None:
+        # Заявки страницы успели обработать — начинаем с первой
+        rows = conn.execute(
+            "SELECT * FROM achievements WHERE status = 'pending' ORDER BY seq LIMIT ?", (limit,)
+        ).fetchall()
+    total = conn.execute("SELECT COUNT(*) FROM achievements WHERE status = 'pending'").fetchone()[0]
+    if not rows:
+        return [], total, None, None
+
+    def exists(condition: str, seq: int) -> bool:
+        return conn.execute(
+            f"SELECT 1 FROM achievements WHERE status = 'pending' AND seq {condition} ? LIMIT 1", (seq,)
+        ).fetchone() is not None
+
+    first, last = rows[0]["seq"], rows[-1]["seq"]
+    return ([_achievement_from_row(row) for row in rows], total,
+            first if exists("<", first) else None, last if exists(">", last) else None)
+
+@storage_write
+def update_achievement_status(achievement_id: str, status: str, approver_id: int, approver_name: str,
+                              expected_status: Optional[str] = None) -> bool:
+    """Обновляет статус достижения (approved/rejected).
+
+    Если указан expected_status, статус меняется только из него: так два
+    одновременных решения по одной заявке не перезапишут друг друга.
+    """
+    with transaction("achievements") as conn:
+        row = conn.execute(
+            "SELECT seq, status, student_key, student_name, education_level, course, points "
+            "FROM achievements WHERE id = ?",
+            (achievement_id,)
+        ).fetchone()
+        if row is None or (expected_status is not None and row["status"] != expected_status):
+            return False
+        conn.execute(
+            "UPDATE achievements SET status = ?, approver_id = ?, approver_name = ?, "
+            "approved_at = ? WHERE id = ?",
+            (status, approver_id, approver_name, datetime.now().isoformat(), achievement_id)
+        )
+        _index_student_status(row["student_key"], row["student_name"], row["status"], status)
+        _apply_leaderboard(conn, row, status)
+    return True
+
+# === Рейтинг студентов ===
+
+def _sync_leaderboard(conn: sqlite3.Connection) -> None:
+    """Пересобирает рейтинг, если он разошелся с подтвержденными достижениями
+    (первый запуск после обновления или записи в обход update_achievement_status)"""
+    materialized = tuple(conn.execute("SELECT COUNT(*), COALESCE(SUM(points), 0) FROM student_points").fetchone())
+    actual = tuple(conn.execute(
+        "SELECT COUNT(DISTINCT student_key), COALESCE(SUM(points), 0) FROM achievements WHERE status = 'approved'"
+    ).fetchone())
+    if materialized == actual:
+        return
+    with transaction("achievements") as write:
+        write.execute("DELETE FROM student_points")
+        write.execute(
+            "INSERT INTO student_points "
+            "(student_key, student_name, education_level, course, points, approved, last_seq) "
+            "SELECT a.student_key, a.student_name, a.education_level, a.course, t.total, t.approved, t.last_seq "
+            "FROM (SELECT student_key, SUM(points) AS total, COUNT(*) AS approved, MAX(seq) AS last_seq "
+            "      FROM achievements WHERE status = 'approved' GROUP BY student_key) AS t "
+            "JOIN achievements AS a ON a.seq = t.last_seq"
+        )
+    logger.info(f"Рейтинг студентов пересобран: {actual[0]} студентов")
+
 
-def get_pending_achievements() -> List[Dict]:
-    """Возвращает список достижений, ожидающих подтверждения."""
-    achievements = load_achievements()
-    return [ach for ach in achievements if ach["status"] == "pending"]
-
-def update_achievement_status(achievement_id: str, status: str, approver_id: int, approver_name: str) -> bool:
-    """Обновляет статус достижения (approved/rejected)."""
-    achievements = load_achievements()
-    
-    for ach in achievements:
-        if ach["id"] == achievement_id:
-            ach["status"] = status
-            ach["approver_id"] = approver_id
-            ach["approver_name"] = approver_name
-            ach["approved_at"] = datetime.now().isoformat()
-            save_achievements(achievements)
-            return True
-    
-    return False
+def _apply_leaderboard(conn: sqlite3.Connection, row: sqlite3.Row, new_status: str) -> None:
+    """Учитывает смену статуса достижения в рейтинге (внутри транзакции update_achievement_status)"""
+    old_status = row["status"]
+    if old_status != "approved" and new_status == "approved":
+        conn.execute(
+            "INSERT INTO student_points "
+            "(student_key, student_name, education_level, course, points, approved, last_seq) "
+            "VALUES (?, ?, ?, ?, ?, 1, ?) "
+            "ON CONFLICT (student_key) DO UPDATE SET "
+            "points = points + excluded.points, approved = approved + 1, "
+            "student_name = CASE WHEN excluded.last_seq > last_seq THEN excluded.student_name ELSE student_name END, "
+            "education_level = CASE WHEN excluded.last_seq > last_seq THEN excluded.education_level ELSE education_level END, "
+            "course = CASE WHEN excluded.last_seq > last_seq THEN excluded.course ELSE course END, "
+            "last_seq = max(last_seq, excluded.last_seq)",
+            (row["student_key"], row["student_name"], row["education_level"], row["course"],
+             row["points"], row["seq"])
+        )
+    elif old_status == "approved" and new_status != "approved":
+        conn.execute(
+            "UPDATE student_points SET points = points - ?, approved = approved - 1 WHERE student_key = ?",
+            (row["points"], row["student_key"])
+        )
+        latest = conn.execute(
+            "SELECT seq, student_name, education_level, course FROM achievements "
+            "WHERE student_key = ? AND status = 'approved' ORDER BY seq DESC LIMIT 1",
+            (row["student_key"],)
+        ).fetchone()
+        if latest is None:
+            conn.execute("DELETE FROM student_points WHERE student_key = ?", (row["student_key"],))
+        else:
+            conn.execute(
+                "UPDATE student_points SET student_name = ?, education_level = ?, course = ?, last_seq = ? "
+                "WHERE student_key = ?",
+                (latest["student_name"], latest["education_level"], latest["course"], latest["seq"],
+                 row["student_key"])
+            )
 
+
+def _facet_filter(education_level: Optional[str], course: Optional[str]) -> Tuple[str, List]:
+    conditions, params = [], []
+    if education_level:
+        conditions.append("education_level = ?")
+        params.append(education_level)
+    if course:
+        conditions.append("course = ?")
+        params.append(course)
+    return "".join(f" AND {condition}" for condition in conditions), params
+
+
+@storage_read
+def get_leaderboard(education_level: Optional[str] = None, course: Optional[str] = None,
+                    limit: int = 10) -> List[Dict]:
+    """Первые limit студентов по баллам (чтение limit строк по индексу)"""
+    where, params = _facet_filter(education_level, course)
+    rows = get_connection().execute(
+        "SELECT student_name, education_level, course, points, approved FROM student_points "
+        f"WHERE 1 = 1{where} ORDER BY points DESC, student_name LIMIT ?",
+        params + [limit]
+    )
+    return [dict(row) for row in rows]
+
+
+def _student_rank(conn: sqlite3.Connection, points: int, education_level: Optional[str] = None,
+                  course: Optional[str] = None) -> int:
+    """Место с таким числом баллов: 1 + число студентов с большим (равные делят место).
+
+    Счет идет по покрывающему индексу (points, для уровня и курса — facets)
+    диапазоном points > ?, то есть O(место): для лидеров почти даром, для
+    хвоста — проход по индексу без чтения строк таблицы.
+    """
+    where, params = _facet_filter(education_level, course)
+    return 1 + conn.execute(
+        f"SELECT COUNT(*) FROM student_points WHERE points > ?{where}", [points] + params
+    ).fetchone()[0]
+
+
+@storage_read
 def get_student_achievements_summary(student_name: str) -> str:
     """Возвращает сводку по достижениям и баллам для конкретного студента."""
-    achievements = load_achievements()
-    
-    student_name_lower = student_name.lower().strip()
-    
-    student_achievements = [
-        ach for ach in achievements 
-        if ach["student_name"].lower() == student_name_lower and ach["status"] == "approved"
-    ]
-    
+    rows = get_connection().execute(
+        "SELECT * FROM achievements WHERE student_key = ? AND status = 'approved' ORDER BY seq",
+        (normalize_student_name(student_name),)
+    ).fetchall()
+    student_achievements = [_achievement_from_row(row) for row in rows]
+
     if not student_achievements:
-        return f"Не найдено подтвержденных индивидуальных достижений для студента: <b>{student_name}</b>."
-        
+        summary = f"Не найдено подтвержденных индивидуальных достижений для студента: <b>{html.escape(student_name)}</b>."
+        suggestions = _student_index.suggest(normalize_student_name(student_name))
+        if suggestions:
+            summary += "\n\nВозможно, вы имели в виду:"
+            for name, _ in suggestions:
+                summary += f"\n• <code>/achievements {html.escape(name)}</code>"
+        return summary
+
     total_points = sum(ach["points"] for ach in student_achievements)
-    
+
     # Берем данные из последнего добавленного достижения
     last_achievement = student_achievements[-1]
     education_info = f"{last_achievement.get('education_level', '')}, {last_achievement.get('course', '')} курс"
 
-    summary = f"🏆 <b>Индивидуальные достижения студента: {student_name}</b> ({education_info})\n"
+    summary = f"🏆 <b>Индивидуальные достижения студента: {html.escape(student_name)}</b> ({education_info})\n"
     summary += f"🏅 <b>Всего баллов: {total_points}</b>\n"
     summary += f"📝 <b>Количество достижений: {len(student_achievements)}</b>\n"
-    
+    conn = get_connection()
+    overall_rank = _student_rank(conn, total_points)
+    facet_rank = _student_rank(conn, total_points, last_achievement.get("education_level"),
+                               last_achievement.get("course"))
+    summary += f"🥇 <b>Место в рейтинге: {overall_rank}</b> (среди {education_info}: {facet_rank})\n"
+
     summary += "\n<b>Подтвержденные достижения:</b>\n"
-    
+
     for i, ach in enumerate(student_achievements, 1):
-        summary += f"\n{i}. <b>{ach['points']} баллов</b> - <i>{ach['description']}</i>"
-        summary += f"\n   (Добавлено: {ach['reporter_role']} {ach['reporter_name']})\n"
-        
+        summary += f"\n{i}. <b>{ach['points']} баллов</b> - <i>{html.escape(ach['description'] or '')}</i>"
+        summary += f"\n   (Добавлено: {ach['reporter_role']} {html.escape(ach['reporter_name'] or '')})\n"
+
     return summary
+
+
+# === Состояния FSM ===
+
+@storage_read
+def load_fsm_record(key: str, min_updated_at: float) -> Optional[Tuple[Optional[str], Dict, float]]:
+    """Возвращает (состояние, данные, время изменения) по ключу, если запись не старше min_updated_at"""
+    row = get_connection().execute(
+        "SELECT state, data, updated_at FROM fsm_states WHERE key = ? AND updated_at >= ?",
+        (key, min_updated_at)
+    ).fetchone()
+    if row is None:
+        return None
+    return row["state"], json.loads(row["data"]), row["updated_at"]
+
+
+@storage_write
+def save_fsm_records(records: List[Tuple[str, Optional[str], Dict, float]]) -> None:
+    """Записывает пачку (ключ, состояние, данные, время) одной транзакцией; пустые записи удаляет"""
+    with transaction("fsm") as conn:
+        conn.executemany(
+            "INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "state = excluded.state, data = excluded.data, updated_at = excluded.updated_at",
+            [
+                (key, state, json.dumps(data, ensure_ascii=False), updated_at)
+                for key, state, data, updated_at in records
+                if state is not None or data
+            ]
+        )
+        conn.executemany(
+            "DELETE FROM fsm_states WHERE key = ?",
+            [(key,) for key, state, data, _ in records if state is None and not data]
+        )
+
+
+@storage_write
+def purge_fsm_records(before: float) -> int:
+    """Удаляет состояния, не менявшиеся с момента before, возвращает их число"""
+    with transaction("fsm") as conn:
+        return conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (before,)).rowcount
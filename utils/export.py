@@ -0,0 +1,178 @@
+"""Выгрузка достижений для руководства в CSV и XLSX.
+
+Файл строится потоково: строки читаются из базы пачками и сразу пишутся
+в файл, весь набор в памяти не собирается. build_export выполняется в рабочем
+потоке со своим подключением только для чтения (WAL не блокирует поток базы
+бота), результат — временный файл, который вызывающий удаляет после отправки.
+"""
+import csv
+import os
+import re
+import sqlite3
+import tempfile
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Sequence, Tuple
+from xml.sax.saxutils import escape
+
+from config import DATABASE_FILE
+
+FETCH_SIZE = 1000
+
+EXPORT_KINDS = {
+    # Каждое одобренное достижение
+    "achievements": (
+        "Достижения",
+        ["Студент", "Уровень образования", "Курс", "Описание", "Баллы",
+         "Добавил", "Роль", "Одобрил", "Дата одобрения"],
+        "SELECT student_name, education_level, course, description, points, "
+        "reporter_name, reporter_role, approver_name, approved_at "
+        "FROM achievements WHERE status = 'approved' ORDER BY student_key, seq",
+    ),
+    # Итог баллов по студенту из рейтинга (имя, уровень и курс — из последнего достижения)
+    "totals": (
+        "Баллы",
+        ["Студент", "Уровень образования", "Курс", "Баллы", "Достижений"],
+        "SELECT student_name, education_level, course, points, approved FROM student_points "
+        "ORDER BY points DESC, student_name",
+    ),
+}
+EXPORT_FORMATS = ("csv", "xlsx")
+
+# Символы, недопустимые в XML 1.0
+_XML_ILLEGAL_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def iter_rows(conn: sqlite3.Connection, query: str) -> Iterator[tuple]:
+    """Строки запроса пачками по FETCH_SIZE"""
+    cursor = conn.execute(query)
+    while True:
+        rows = cursor.fetchmany(FETCH_SIZE)
+        if not rows:
+            return
+        yield from rows
+
+
+def write_csv(path: Path, header: Sequence[str], rows: Iterable[Sequence]) -> int:
+    """CSV в UTF-8 с BOM (Excel сам определяет кодировку); возвращает число строк"""
+    count = 0
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+# Стиль 1 — жирный шрифт для заголовка
+_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/><xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>
+</styleSheet>"""
+
+
+def _cell(value, style: int = 0) -> str:
+    style_attr = f' s="{style}"' if style else ""
+    if value is None:
+        return f"<c{style_attr}/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c{style_attr}><v>{value}</v></c>"
+    text = escape(_XML_ILLEGAL_RE.sub("", str(value)))
+    # Строки хранятся прямо в ячейках: таблица общих строк потребовала бы держать их все в памяти
+    return f'<c t="inlineStr"{style_attr}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def write_xlsx(path: Path, sheet_name: str, header: Sequence[str], rows: Iterable[Sequence]) -> int:
+    """Минимальная книга XLSX с одним листом; лист пишется в архив построчно"""
+    count = 0
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        archive.writestr("xl/styles.xml", _STYLES)
+        archive.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        )
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" '
+                b'activePane="bottomLeft" state="frozen"/></sheetView></sheetViews><sheetData>'
+            )
+            sheet.write(("<row>" + "".join(_cell(name, 1) for name in header) + "</row>").encode("utf-8"))
+            for row in rows:
+                sheet.write(("<row>" + "".join(_cell(value) for value in row) + "</row>").encode("utf-8"))
+                count += 1
+            sheet.write(b"</sheetData></worksheet>")
+    return count
+
+
+def build_export(kind: str, fmt: str) -> Tuple[Path, int]:
+    """Строит выгрузку во временный файл; возвращает (путь, число строк без заголовка)"""
+    sheet_name, header, query = EXPORT_KINDS[kind]
+    fd, name = tempfile.mkstemp(prefix=f"{kind}_{datetime.now():%Y%m%d_%H%M%S}_", suffix=f".{fmt}")
+    os.close(fd)
+    path = Path(name)
+    # as_uri экранирует ?, #, % и пробелы в пути к базе
+    conn = sqlite3.connect(Path(DATABASE_FILE).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        rows = iter_rows(conn, query)
+        if fmt == "xlsx":
+            count = write_xlsx(path, sheet_name, header, rows)
+        else:
+            count = write_csv(path, header, rows)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    finally:
+        conn.close()
+    return path, count
+
+
+def export_filename(kind: str, fmt: str) -> str:
+    return f"{kind}_{datetime.now():%Y%m%d}.{fmt}"
+
+
+def parse_export_args(args: str) -> Tuple[str, str]:
+    """Вид и формат выгрузки из аргументов команды; ValueError при неизвестных"""
+    kind, fmt = "achievements", "xlsx"
+    words: List[str] = (args or "").lower().split()
+    for word in words:
+        if word in EXPORT_KINDS:
+            kind = word
+        elif word in EXPORT_FORMATS:
+            fmt = word
+        else:
+            raise ValueError(word)
+    return kind, fmt
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+
+from config import FSM_CACHE_SIZE, FSM_FLUSH_INTERVAL, FSM_FLUSH_THRESHOLD, FSM_STATE_TTL
+from utils.repository import repo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FSMRecord:
+    state: Optional[str] = None
+    data: Dict[str, Any] = field(default_factory=dict)
+    updated_at: float = 0.0
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище состояний FSM в базе бота.
+
+    Чтения обслуживает LRU-кэш в памяти (промах — один запрос через repo),
+    изменения копятся в кэше и записываются пачкой раз в flush_interval секунд
+    или по достижении flush_threshold измененных ключей. Состояние, которое не
+    менялось дольше ttl, считается сброшенным и периодически удаляется из базы.
+    """
+
+    def __init__(self, ttl: float = FSM_STATE_TTL, cache_size: int = FSM_CACHE_SIZE,
+                 flush_interval: float = FSM_FLUSH_INTERVAL, flush_threshold: int = FSM_FLUSH_THRESHOLD):
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache: "OrderedDict[str, FSMRecord]" = OrderedDict()
+        # Ключи, измененные после последней записи в базу
+        self._dirty: Set[str] = set()
+        # Ключи, которые сейчас записываются (их тоже нельзя вытеснять)
+        self._saving: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        # Внеочередные записи по порогу: ссылки держим, пока они не завершатся
+        self._threshold_flushes: Set[asyncio.Task] = set()
+        self._flush_lock = asyncio.Lock()
+        self._purged_at = 0.0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = await self._get(key)
+        record.state = state.state if isinstance(state, State) else state
+        self._touch(key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._get(key)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        record = await self._get(key)
+        record.data = data.copy()
+        self._touch(key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._get(key)).data.copy()
+
+    async def close(self) -> None:
+        """Останавливает фоновую запись и сохраняет оставшиеся изменения"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Записывает накопленные изменения одной транзакцией"""
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            keys, self._dirty = self._dirty, set()
+            self._saving = keys
+            records = [
+                (key, record.state, record.data.copy(), record.updated_at)
+                for key, record in ((key, self._cache[key]) for key in keys)
+            ]
+            try:
+                await repo.save_fsm_records(records)
+            except Exception as e:
+                logger.error(f"Ошибка сохранения состояний FSM: {e}")
+                # Попробуем записать эти ключи в следующий раз
+                self._dirty.update(keys)
+                return
+            finally:
+                self._saving = set()
+            self._evict()
+
+    async def purge(self) -> None:
+        """Удаляет из базы и кэша состояния, устаревшие по ttl"""
+        before = time.time() - self.ttl
+        removed = await repo.purge_fsm_records(before)
+        for key in [key for key, record in self._cache.items()
+                    if record.updated_at < before and key not in self._dirty]:
+            del self._cache[key]
+        self._purged_at = time.time()
+        if removed:
+            logger.info(f"Удалено устаревших состояний FSM: {removed}")
+
+    async def _get(self, key: StorageKey) -> FSMRecord:
+        """Запись из кэша или базы; устаревшая по ttl запись считается пустой"""
+        storage_key = self.key_builder.build(key)
+        record = self._cache.get(storage_key)
+        if record is None:
+            loaded = await repo.load_fsm_record(storage_key, time.time() - self.ttl)
+            # Пока шел запрос, запись могла появиться в кэше — она новее
+            record = self._cache.get(storage_key)
+            if record is None:
+                record = FSMRecord(*loaded) if loaded else FSMRecord()
+                self._cache[storage_key] = record
+                self._evict(keep=storage_key)
+        elif record.updated_at < time.time() - self.ttl and (record.state is not None or record.data):
+            record.state, record.data = None, {}
+            self._touch_key(storage_key, record)
+        self._cache.move_to_end(storage_key)
+        return record
+
+    def _touch(self, key: StorageKey, record: FSMRecord) -> None:
+        self._touch_key(self.key_builder.build(key), record)
+
+    def _touch_key(self, storage_key: str, record: FSMRecord) -> None:
+        """Помечает запись измененной и планирует запись в базу"""
+        record.updated_at = time.time()
+        self._dirty.add(storage_key)
+        if len(self._dirty) >= self.flush_threshold and not self._flush_lock.locked():
+            task = asyncio.create_task(self.flush())
+            self._threshold_flushes.add(task)
+            task.add_done_callback(self._threshold_flushes.discard)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        """Периодическая запись изменений и очистка устаревших состояний"""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if time.time() - self._purged_at >= min(self.ttl, 60 * 60):
+                try:
+                    await self.purge()
+                except Exception as e:
+                    logger.error(f"Ошибка очистки состояний FSM: {e}")
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Вытесняет давно не использованные записи, уже сохраненные в базе.
+
+        keep — только что загруженная запись: ее вернут вызывающему, и если ее
+        тут же изменят, она должна остаться в кэше до записи в базу.
+        """
+        while len(self._cache) > self.cache_size:
+            for key in self._cache:
+                if key not in self._dirty and key not in self._saving and key != keep:
+                    del self._cache[key]
+                    break
+            else:
+                break
@@ -1,5 +1,10 @@
 
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from typing import Optional
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
+
+# Ограничение Telegram на callback_data, байт
+CALLBACK_DATA_LIMIT = 64
 
 
 def get_main_menu():
@@ -26,3 +31,15 @@ def get_cancel_keyboard():
         one_time_keyboard=False
     )
 
+
+
+def get_pagination_keyboard(prev_data: Optional[str], next_data: Optional[str]) -> Optional[InlineKeyboardMarkup]:
+    """Кнопки «◀ ▶» для листания; None, если листать некуда"""
+    buttons = []
+    for text, data in (("◀", prev_data), ("▶", next_data)):
+        if data is None:
+            continue
+        if len(data.encode("utf-8")) > CALLBACK_DATA_LIMIT:
+            raise ValueError(f"callback_data длиннее {CALLBACK_DATA_LIMIT} байт: {data}")
+        buttons.append(InlineKeyboardButton(text=text, callback_data=data))
+    return InlineKeyboardMarkup(inline_keyboard=[buttons]) if buttons else None
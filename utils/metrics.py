@@ -0,0 +1,248 @@
+import abc
+import bisect
+import functools
+import itertools
+import json
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from aiohttp import web
+
+# Границы корзин гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    """Метрика в текстовом формате Prometheus; значения по наборам меток"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Обновляется и из event loop, и из потока базы
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(суффикс имени, метки, значение) для вывода"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [("", _format_labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(Metric):
+    """Значение, которое снимается функцией в момент чтения метрик"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], Dict[LabelValues, float]],
+                 labelnames: Sequence[str] = (), type_name: str = "gauge"):
+        super().__init__(name, documentation, labelnames)
+        self._collect = collect
+        # Счетчики, которые ведет сам объект (например, сборщик альбомов), выводятся как counter
+        self.type_name = type_name
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        return [("", _format_labels(self.labelnames, key), value)
+                for key, value in sorted(self._collect().items())]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # метки -> (счетчики корзин без накопления, сумма, количество)
+        self._values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def time(self, **labels: str) -> "_Timer":
+        """Контекстный менеджер, замеряющий длительность блока"""
+        return _Timer(self, labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        result = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames + ("le",), key + (_format_value(float(bound)),))
+                result.append(("_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            result.append(("_sum", labels, total))
+            result.append(("_count", labels, count))
+        return result
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus (version 0.0.4)"""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return registry.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return registry.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge(name: str, documentation: str, collect: Callable[[], Dict[LabelValues, float]],
+          labelnames: Sequence[str] = (), type_name: str = "gauge") -> Gauge:
+    return registry.register(Gauge(name, documentation, collect, labelnames, type_name))
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднимает HTTP-сервер с метриками на /metrics"""
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+# === Метрики хранилища ===
+
+STORAGE_DURATION = histogram(
+    "bot_storage_duration_seconds", "Storage call duration", ("operation", "function"),
+)
+STORAGE_ERRORS = counter(
+    "bot_storage_errors_total", "Storage calls that raised", ("operation", "function"),
+)
+STORAGE_BYTES_WRITTEN = counter(
+    "bot_storage_bytes_written_total", "Payload bytes passed to storage writes (sampled estimate)", ("function",),
+)
+
+# Объем оценивается по каждой PAYLOAD_SAMPLE_EVERY-й записи функции: сериализовать аргументы
+# каждой записи (update_user_stats — на каждое обновление) ради метрики слишком дорого
+PAYLOAD_SAMPLE_EVERY = 100
+
+
+def _payload_size(value) -> int:
+    """Размер записываемых данных: строки в UTF-8, словари и списки — в JSON"""
+    if value is None:
+        return 0
+    if isinstance(value, bytes):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (dict, list, tuple)):
+        return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+    return len(str(value))
+
+
+def storage_read(func: Callable) -> Callable:
+    """Замеряет длительность чтения из хранилища"""
+    return _instrument(func, "read")
+
+
+def storage_write(func: Callable) -> Callable:
+    """Замеряет длительность записи в хранилище и (выборочно) объем записываемых данных"""
+    return _instrument(func, "write")
+
+
+def _instrument(func: Callable, operation: str) -> Callable:
+    name = func.__name__
+    calls = itertools.count()
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            STORAGE_ERRORS.inc(operation=operation, function=name)
+            raise
+        finally:
+            STORAGE_DURATION.observe(time.perf_counter() - started, operation=operation, function=name)
+            if operation == "write" and next(calls) % PAYLOAD_SAMPLE_EVERY == 0:
+                size = sum(_payload_size(arg) for arg in args) + sum(_payload_size(arg) for arg in kwargs.values())
+                STORAGE_BYTES_WRITTEN.inc(size * PAYLOAD_SAMPLE_EVERY, function=name)
+
+    return wrapper
@@ -0,0 +1,33 @@
+import asyncio
+import cProfile
+import io
+import pstats
+
+# Одновременно работает только один профилировщик
+_profile_lock = asyncio.Lock()
+
+
+def is_profiling() -> bool:
+    return _profile_lock.locked()
+
+
+async def profile_for(seconds: float, limit: int = 50) -> str:
+    """Профилирует event loop seconds секунд и возвращает отчет pstats.
+
+    cProfile видит только поток, в котором включен, то есть все обработчики,
+    middleware и вызовы Bot API; запросы к базе в потоке repo видны как ожидание.
+    """
+    async with _profile_lock:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+
+    report = io.StringIO()
+    stats = pstats.Stats(profiler, stream=report)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+    report.write("\n")
+    stats.sort_stats(pstats.SortKey.TIME).print_stats(limit)
+    return report.getvalue()
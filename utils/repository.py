@@ -0,0 +1,168 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from config import STATS_FLUSH_INTERVAL, APPEALS_ARCHIVE_DAYS, APPEALS_ARCHIVE_INTERVAL
+from utils import database
+from utils.tracing import current_trace
+
+logger = logging.getLogger(__name__)
+
+
+class Repository:
+    """Асинхронный доступ к хранилищу.
+
+    Все вызовы utils.database выполняются в одном выделенном потоке, поэтому
+    работа с SQLite не блокирует event loop, а подключение и кэши в памяти
+    используются только из этого потока.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def _run(self, func, *args, **kwargs):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+        loop = asyncio.get_running_loop()
+        trace = current_trace.get()
+        if trace is None:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        # Время хранилища для трассировки медленных обновлений (вместе с ожиданием очереди потока)
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        finally:
+            trace.add_storage(time.perf_counter() - started)
+
+    # === Жизненный цикл ===
+
+    async def init(self) -> None:
+        await self._run(database.init_db)
+
+    async def close(self) -> None:
+        """Сбрасывает отложенные записи, закрывает базу и останавливает поток"""
+        if self._executor is None:
+            return
+        await self._run(database.close_db)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    async def run_stats_flusher(self, interval: float = STATS_FLUSH_INTERVAL) -> None:
+        """Периодически сбрасывает статистику в базу"""
+        while True:
+            await asyncio.sleep(interval)
+            await self._run(database.flush_stats)
+
+    async def run_appeals_archiver(self, days: int = APPEALS_ARCHIVE_DAYS,
+                                   interval: float = APPEALS_ARCHIVE_INTERVAL) -> None:
+        """Периодически переносит в архив обращения, отвеченные больше days дней назад"""
+        while True:
+            try:
+                await self.archive_answered_appeals(days)
+            except Exception as e:
+                logger.error(f"Ошибка архивации обращений: {e}")
+            await asyncio.sleep(interval)
+
+    # === Статистика ===
+
+    async def update_user_stats(self, user_id: int, username: Optional[str] = None,
+                                first_name: Optional[str] = None) -> None:
+        await self._run(database.update_user_stats, user_id, username, first_name)
+
+    async def get_stats_summary(self) -> str:
+        return await self._run(database.get_stats_summary)
+
+    # === Обращения ===
+
+    async def create_appeal(self, user_id: int, username: Optional[str],
+                            first_name: str, text: str, media_type: str = None,
+                            media_id: str = None) -> str:
+        return await self._run(database.create_appeal, user_id, username, first_name,
+                               text, media_type, media_id)
+
+    async def add_admin_message_ids(self, appeal_id: str, message_ids: Dict[int, int]) -> None:
+        await self._run(database.add_admin_message_ids, appeal_id, message_ids)
+
+    async def get_appeal(self, appeal_id: str) -> Optional[Dict]:
+        return await self._run(database.get_appeal, appeal_id)
+
+    async def get_appeal_by_message_id(self, message_id: int,
+                                       admin_chat_id: Optional[int] = None) -> Optional[tuple]:
+        return await self._run(database.get_appeal_by_message_id, message_id, admin_chat_id)
+
+    async def answer_appeal(self, appeal_id: str, answer_text: str,
+                            media_type: str = None, media_id: str = None) -> bool:
+        return await self._run(database.answer_appeal, appeal_id, answer_text, media_type, media_id)
+
+    async def get_admin_appeals_summary(self, cursor: Optional[Tuple[str, str]] = None,
+                                        direction: str = "older") -> Tuple[str, Optional[Tuple[str, str]],
+                                                                           Optional[Tuple[str, str]]]:
+        return await self._run(database.get_admin_appeals_summary, cursor, direction)
+
+    async def search_appeals(self, query: str, status: Optional[str] = None, since: Optional[str] = None,
+                             until: Optional[str] = None) -> List[Dict]:
+        return await self._run(database.search_appeals, query, status, since, until)
+
+    async def archive_answered_appeals(self, days: int) -> int:
+        """Переносит в архив обращения, отвеченные больше days дней назад.
+
+        Блоками по ARCHIVE_BLOCK_SIZE, каждый отдельным вызовом: между блоками
+        поток базы успевает обслужить обработчики.
+        """
+        before = (datetime.now() - timedelta(days=days)).isoformat()
+        total = 0
+        while True:
+            count = await self._run(database.archive_answered_appeals, before)
+            total += count
+            if count < database.ARCHIVE_BLOCK_SIZE:
+                return total
+
+    # === Индивидуальные достижения ===
+
+    async def create_achievement(self, reporter_id: int, reporter_name: str, reporter_role: str,
+                                 student_name: str, description: str, points: int,
+                                 course: str, education_level: str) -> str:
+        return await self._run(
+            database.create_achievement,
+            reporter_id=reporter_id, reporter_name=reporter_name, reporter_role=reporter_role,
+            student_name=student_name, description=description, points=points,
+            course=course, education_level=education_level
+        )
+
+    async def get_achievement(self, achievement_id: str) -> Optional[Dict]:
+        return await self._run(database.get_achievement, achievement_id)
+
+    async def get_pending_achievements_page(self, cursor: Optional[int] = None, direction: str = "next"
+                                            ) -> Tuple[List[Dict], int, Optional[int], Optional[int]]:
+        return await self._run(database.get_pending_achievements_page, cursor, direction)
+
+    async def update_achievement_status(self, achievement_id: str, status: str,
+                                        approver_id: int, approver_name: str,
+                                        expected_status: Optional[str] = None) -> bool:
+        return await self._run(database.update_achievement_status, achievement_id, status,
+                               approver_id, approver_name, expected_status)
+
+    async def get_student_achievements_summary(self, student_name: str) -> str:
+        return await self._run(database.get_student_achievements_summary, student_name)
+
+    async def get_leaderboard(self, education_level: Optional[str] = None,
+                              course: Optional[str] = None) -> List[Dict]:
+        return await self._run(database.get_leaderboard, education_level, course)
+
+    # === Состояния FSM ===
+
+    async def load_fsm_record(self, key: str, min_updated_at: float) -> Optional[Tuple[Optional[str], Dict, float]]:
+        return await self._run(database.load_fsm_record, key, min_updated_at)
+
+    async def save_fsm_records(self, records: List[Tuple[str, Optional[str], Dict, float]]) -> None:
+        await self._run(database.save_fsm_records, records)
+
+    async def purge_fsm_records(self, before: float) -> int:
+        return await self._run(database.purge_fsm_records, before)
+
+
+repo = Repository()
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from dotenv import dotenv_values
+
+logger = logging.getLogger(__name__)
+
+# Роли по старшинству: ключ -> название. ID берутся из переменных <КЛЮЧ>_IDS
+ROLE_NAMES: Dict[str, str] = {
+    "chairman": "Председатель",
+    "deputy_chairman": "Заместитель председателя",
+    "secretary": "Ответственный секретарь",
+    "info_head": "Руководитель Информационного отдела",
+    "info_deputy": "Заместитель руководителя Информационного отдела",
+    "culture_head": "Руководитель Культурного отдела",
+    "culture_deputy": "Заместитель руководителя Культурного отдела",
+    "science_head": "Руководитель Научного отдела",
+    "science_deputy": "Заместитель руководителя Научного отдела",
+    "volunteer_head": "Руководитель Волонтёрского отдела",
+    "volunteer_deputy": "Заместитель руководителя Волонтёрского отдела",
+    "international_head": "Руководитель Международного отдела",
+    "international_deputy": "Заместитель руководителя Международного отдела",
+    "social_head": "Заведующий Комитетом по быту",
+    "social_deputy": "Заместитель заведующего Комитетом по быту",
+    "education_head": "Заведующий Комитетом по образованию",
+    "education_deputy": "Заместитель заведующего Комитетом по образованию",
+    "sport_head": "Заведующий Комитетом по спорту",
+    "sport_deputy": "Заместитель заведующего Комитетом по спорту",
+    "sponsors_head": "Заведующий Комитетом по работе со спонсорами",
+    "sponsors_deputy": "Заместитель заведующего Комитетом по работе со спонсорами",
+    "interfaculty_head": "Заведующий Комитетом по Межфакультетским связям",
+    "interfaculty_deputy": "Заместитель заведующего Комитетом по Межфакультетским связям",
+    "tech_head": "Заведующий Комитетом по цифровому развитию и техническому обеспечению",
+    "tech_deputy": "Заместитель заведующего Комитетом по цифровому развитию и техническому обеспечению",
+}
+
+# Определение ролей руководства
+LEADERSHIP_ROLES = ("chairman", "deputy_chairman", "secretary")
+
+
+def parse_ids(value) -> List[int]:
+    """ID из строки "1,2,3" (как в .env) или из списка (как в файле ролей)"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [int(str(user_id).strip()) for user_id in value if str(user_id).strip()]
+
+
+@dataclass(frozen=True)
+class RoleSnapshot:
+    """Неизменяемый набор назначений ролей; при перезагрузке заменяется целиком"""
+
+    roles: Dict[str, FrozenSet[int]]
+    admins: FrozenSet[int]
+    leadership: FrozenSet[int]
+    # user_id -> роли по старшинству
+    by_user: Dict[int, Tuple[str, ...]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, roles: Mapping[str, List[int]]) -> "RoleSnapshot":
+        frozen = {role: frozenset(roles.get(role, ())) for role in ROLE_NAMES}
+        by_user: Dict[int, Tuple[str, ...]] = {}
+        for role, ids in frozen.items():
+            for user_id in ids:
+                by_user[user_id] = by_user.get(user_id, ()) + (role,)
+        return cls(
+            roles=frozen,
+            admins=frozenset(by_user),
+            leadership=frozenset(user_id for role in LEADERSHIP_ROLES for user_id in frozen[role]),
+            by_user=by_user,
+        )
+
+
+class RoleRegistry:
+    """Назначения ролей с перезагрузкой без перезапуска бота.
+
+    Источники по возрастанию приоритета: файл .env, переменные окружения
+    процесса (как у load_dotenv, они важнее .env), файл ролей (JSON
+    {"chairman": [id, ...], ...}). Перезагрузка строит новый
+    RoleSnapshot и подменяет его одной операцией присваивания: обновления,
+    которые уже в обработке, дорабатывают со старым набором.
+    """
+
+    def __init__(self, env_file: Optional[Path] = None, roles_file: Optional[Path] = None,
+                 environ: Optional[Mapping[str, str]] = None):
+        self.env_file = Path(env_file) if env_file else None
+        self.roles_file = Path(roles_file) if roles_file else None
+        # Окружение процесса до загрузки .env: заданные в нем роли из .env не перечитываются
+        self.environ = dict(os.environ if environ is None else environ)
+        # Перезагрузка идет в рабочих потоках (watcher и /reload_roles) — по одной за раз
+        self._reload_lock = threading.Lock()
+        self._mtimes: Tuple[Optional[float], ...] = self._current_mtimes()
+        self.snapshot = RoleSnapshot.build(self._read())
+
+    @staticmethod
+    def _mtime(path: Optional[Path]) -> Optional[float]:
+        try:
+            return path.stat().st_mtime if path else None
+        except OSError:
+            return None
+
+    def _current_mtimes(self) -> Tuple[Optional[float], ...]:
+        return self._mtime(self.env_file), self._mtime(self.roles_file)
+
+    def _read(self) -> Dict[str, List[int]]:
+        values = {f"{role.upper()}_IDS": None for role in ROLE_NAMES}
+        if self.env_file and self.env_file.exists():
+            values.update({key: value for key, value in dotenv_values(self.env_file).items() if key in values})
+        values.update({key: value for key, value in self.environ.items() if key in values})
+        roles = {role: parse_ids(values[f"{role.upper()}_IDS"]) for role in ROLE_NAMES}
+        if self.roles_file and self.roles_file.exists():
+            with open(self.roles_file, encoding="utf-8") as f:
+                for role, ids in json.load(f).items():
+                    if role not in ROLE_NAMES:
+                        logger.warning(f"Неизвестная роль в {self.roles_file}: {role}")
+                        continue
+                    roles[role] = parse_ids(ids)
+        return roles
+
+    # === Проверки (O(1) по текущему набору) ===
+
+    def is_admin(self, user_id: int) -> bool:
+        return user_id in self.snapshot.admins
+
+    def is_leadership(self, user_id: int) -> bool:
+        return user_id in self.snapshot.leadership
+
+    def role_of(self, user_id: int) -> Optional[str]:
+        """Старшая роль пользователя"""
+        roles = self.snapshot.by_user.get(user_id)
+        return roles[0] if roles else None
+
+    # === Перезагрузка ===
+
+    def reload(self) -> Tuple[FrozenSet[int], FrozenSet[int]]:
+        """Перечитывает источники; возвращает (добавленные, удаленные) админские ID.
+
+        При ошибке в файлах остается прежний набор, исключение пробрасывается.
+        Читает файлы — из event loop вызывать через asyncio.to_thread.
+        """
+        with self._reload_lock:
+            # Время изменения — до чтения (правка во время чтения вызовет еще одну
+            # перезагрузку), а запоминается после успеха: файл с ошибкой перечитается
+            mtimes = self._current_mtimes()
+            new = RoleSnapshot.build(self._read())
+            old, self.snapshot = self.snapshot, new
+            self._mtimes = mtimes
+        added, removed = new.admins - old.admins, old.admins - new.admins
+        if added or removed or new.by_user != old.by_user:
+            logger.info(f"Роли перезагружены: админов {len(new.admins)}, руководства {len(new.leadership)}, "
+                        f"добавлено {sorted(added)}, удалено {sorted(removed)}")
+        return added, removed
+
+    def reload_if_changed(self) -> bool:
+        """Перезагружает роли, если у .env или файла ролей сменилось время изменения.
+
+        Неудачная перезагрузка повторяется при следующей проверке.
+        """
+        if self._current_mtimes() == self._mtimes:
+            return False
+        try:
+            self.reload()
+        except Exception as e:
+            logger.error(f"Не удалось перезагрузить роли, остаются прежние: {e}")
+        return True
+
+    async def run_watcher(self, interval: float) -> None:
+        """Фоновая задача: проверяет файлы раз в interval секунд (stat и чтение — в рабочем потоке)"""
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(self.reload_if_changed)
@@ -0,0 +1,138 @@
+import math
+import re
+from collections import defaultdict
+from typing import Dict, List, Set, Tuple
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\w+")
+
+# Окончания для упрощенного стемминга: отрезается самое длинное подходящее
+_ENDINGS = sorted({
+    "иями", "ями", "ами", "иях", "ях", "ах", "ией", "ием", "ой", "ей", "ом", "ем", "ам", "ям",
+    "ого", "его", "ому", "ему", "ым", "ыми", "ими", "ых", "их", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие",
+    "ую", "юю", "ия", "ию", "ии", "ов", "ев",
+    "ться", "тся", "ется", "ются", "ить", "ать", "ять", "еть", "ть", "ишь", "ешь", "ит", "ет", "ут", "ют",
+    "ат", "ят", "ила", "ала", "ило", "али", "или", "ла", "ло", "ли", "ил", "ал", "ел",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+}, key=len, reverse=True)
+# Окончания прилагательных: после них отрезается и суффикс -ев-/-ов-,
+# чтобы «душевые», «душевой» сводились к «душ», как и само «душ»
+_ADJECTIVE_ENDINGS = frozenset({
+    "ой", "ый", "ий", "ая", "яя", "ое", "ее", "ые", "ие", "ого", "его", "ому", "ему",
+    "ым", "ыми", "ими", "ых", "их", "ую", "юю",
+})
+_ADJECTIVE_SUFFIXES = ("ев", "ов")
+# Короче этого основа не укорачивается: «душ», «вай-фай» остаются как есть
+_MIN_STEM = 3
+
+
+def normalize_text(text: str) -> str:
+    """Приводит текст к виду для сравнения: casefold, ё→е, одиночные пробелы"""
+    text = text.casefold().replace("ё", "е")
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def stem(word: str) -> str:
+    """Упрощенная основа русского слова: без одного окончания (у прилагательных —
+    и без суффикса -ев-/-ов-), не короче _MIN_STEM.
+
+    Остальные словообразовательные суффиксы не отрезаются: «спортивный» дает
+    «спортивн», и запрос с ним не находит «спорт» (обратное работает — поиск
+    идет по началу основы).
+    """
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            base = word[:-len(ending)]
+            if ending in _ADJECTIVE_ENDINGS:
+                for suffix in _ADJECTIVE_SUFFIXES:
+                    if base.endswith(suffix) and len(base) - len(suffix) >= _MIN_STEM:
+                        return base[:-len(suffix)]
+            return base
+    return word
+
+
+def search_terms(text: str) -> List[str]:
+    """Основы слов текста для полнотекстового поиска"""
+    return [stem(word) for word in _WORD_RE.findall(normalize_text(text))]
+
+
+def normalize_student_name(student_name: str) -> str:
+    """Ключ студента: нормализованные слова ФИО в алфавитном порядке"""
+    return " ".join(sorted(normalize_text(student_name).split()))
+
+
+def trigrams(key: str) -> Set[str]:
+    """Триграммы каждого слова ключа (с отступами по краям слова)"""
+    result = set()
+    for word in key.split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class TrigramIndex:
+    """Триграммный индекс ключей для подсказок «возможно, вы имели в виду»"""
+
+    common_posting_size = 256
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._trigrams: Dict[str, Set[str]] = {}
+        self._labels: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._labels
+
+    def add(self, key: str, label: str) -> None:
+        """Добавляет ключ с отображаемым названием (или обновляет название)"""
+        self._labels[key] = label
+        if key in self._trigrams:
+            return
+        grams = trigrams(key)
+        self._trigrams[key] = grams
+        for gram in grams:
+            self._postings[gram].add(key)
+
+    def discard(self, key: str) -> None:
+        """Удаляет ключ из индекса"""
+        self._labels.pop(key, None)
+        for gram in self._trigrams.pop(key, ()):
+            posting = self._postings[gram]
+            posting.discard(key)
+            if not posting:
+                del self._postings[gram]
+
+    def clear(self) -> None:
+        self._postings.clear()
+        self._trigrams.clear()
+        self._labels.clear()
+
+    def suggest(self, key: str, limit: int = 3, threshold: float = 0.5) -> List[Tuple[str, float]]:
+        """Возвращает похожие ключи с их названиями, по убыванию сходства (Dice)"""
+        grams = trigrams(key)
+        if not grams:
+            return []
+        # Чтобы набрать порог, кандидат должен совпасть хотя бы в min_common триграммах,
+        # значит он точно встретится в одном из (len - min_common + 1) самых редких списков
+        min_common = max(1, math.ceil(threshold * len(grams) / 2))
+        # Отсутствующие в индексе триграммы — пустые списки, они самые редкие.
+        # Слишком частые триграммы (окончания «-ович», «-ов») кандидатов не добавляют
+        postings = sorted((self._postings.get(gram, ()) for gram in grams), key=len)
+        max_posting = max(self.common_posting_size, len(self._labels) // 50)
+        candidates = set()
+        for posting in postings[:len(grams) - min_common + 1]:
+            if candidates and len(posting) > max_posting:
+                break
+            candidates.update(posting)
+
+        scored = []
+        for candidate in candidates:
+            candidate_grams = self._trigrams[candidate]
+            score = 2 * len(grams & candidate_grams) / (len(grams) + len(candidate_grams))
+            if score >= threshold:
+                scored.append((score, candidate))
+        scored.sort(reverse=True)
+        return [(self._labels[candidate], score) for score, candidate in scored[:limit]]
@@ -0,0 +1,31 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass
+class UpdateTrace:
+    """Куда ушло время обработки одного обновления.
+
+    Время вызовов, запущенных параллельно (например, рассылка админам), складывается,
+    поэтому сумма частей может превышать полное время обработки.
+    """
+    started: float = field(default_factory=time.perf_counter)
+    handler: Optional[str] = None
+    storage_time: float = 0.0
+    storage_calls: int = 0
+    api_time: float = 0.0
+    api_calls: int = 0
+
+    def add_storage(self, elapsed: float) -> None:
+        self.storage_time += elapsed
+        self.storage_calls += 1
+
+    def add_api(self, elapsed: float) -> None:
+        self.api_time += elapsed
+        self.api_calls += 1
+
+
+# Трассировка обновления, которое сейчас обрабатывается (наследуется дочерними задачами)
+current_trace: ContextVar[Optional[UpdateTrace]] = ContextVar("current_trace", default=None)